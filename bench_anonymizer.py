@@ -0,0 +1,131 @@
+"""
+Benchmark of the local anonymizer
+
+A synthetic text (MB scale) with people, customers, emails, phone numbers and
+URLs is generated and anonymized; the throughput (MB/sec) is reported for:
+patterns only, and patterns + gazetteer (Aho-Corasick).
+
+Usage:
+    python bench_anonymizer.py
+    python bench_anonymizer.py --mb 10 --names 50000
+"""
+
+import argparse
+import random
+import time
+
+from local_anonymizer import Gazetteer, LocalAnonymizer
+
+WORDS = (
+    "the project plan defines goals timelines and risks for the migration "
+    "of the platform to the cloud with a clear budget and owners"
+).split()
+
+FIRST_NAMES = ["John", "Mary", "Luigi", "Anna", "Paul", "Sara", "Marco", "Julia"]
+LAST_NAMES = ["Smith", "Rossi", "Brown", "Bianchi", "Miller", "Verdi", "Clark"]
+
+
+def generate_gazetteer(n_names, rnd):
+    """
+    Generate n_names people and customers
+    """
+    people = [
+        f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)}{i}"
+        for i in range(n_names // 2)
+    ]
+    customers = [f"Customer{i} Corp" for i in range(n_names - len(people))]
+
+    return {"PERSON": people, "CUSTOMER": customers}
+
+
+def generate_text(size_mb, entities, rnd):
+    """
+    Generate a text of about size_mb MB, with ~1 entity every 20 words
+    """
+    people, customers = entities["PERSON"], entities["CUSTOMER"]
+    target = int(size_mb * 1024 * 1024)
+    parts = []
+    size = 0
+
+    while size < target:
+        sentence = " ".join(rnd.choice(WORDS) for _ in range(20))
+
+        entity = rnd.randrange(5)
+        if entity == 0:
+            sentence += f" with {rnd.choice(people)}"
+        elif entity == 1:
+            sentence += f" for {rnd.choice(customers)}"
+        elif entity == 2:
+            sentence += f" mail user{rnd.randrange(10**6)}@example.com"
+        elif entity == 3:
+            sentence += f" call +39 02 {rnd.randrange(10**6, 10**7)}"
+        else:
+            sentence += f" see https://example.com/doc/{rnd.randrange(10**6)}"
+
+        sentence += ". "
+        parts.append(sentence)
+        size += len(sentence)
+
+    return "".join(parts)
+
+
+def bench(anonymizer, text, runs):
+    """
+    Return (best elapsed sec, n. of placeholders) of anonymizer on text
+    """
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        anonymizer.anonymize(text)
+        elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, len(anonymizer.mapping)
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Local anonymizer benchmark.")
+
+    parser.add_argument("--mb", type=float, default=2, help="size of the text (MB).")
+    parser.add_argument(
+        "--names", type=int, default=10000, help="names in the gazetteer."
+    )
+    parser.add_argument("--runs", type=int, default=3, help="runs (best is shown).")
+
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    entities = generate_gazetteer(args.names, rnd)
+    text = generate_text(args.mb, entities, rnd)
+
+    start = time.perf_counter()
+    gazetteer = Gazetteer(entities)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    size_mb = len(text) / (1024 * 1024)
+
+    print("")
+    print(f"Text: {size_mb:.1f} MB, gazetteer: {len(gazetteer)} names")
+    print(f"Gazetteer built in {build_ms:.0f} ms")
+    print("")
+    print(f"{'engine':<25} {'elapsed (s)':>12} {'MB/sec':>8} {'entities':>9}")
+
+    engines = {
+        "patterns": LocalAnonymizer(),
+        "patterns + gazetteer": LocalAnonymizer(gazetteer),
+    }
+
+    for name, anonymizer in engines.items():
+        elapsed, n_entities = bench(anonymizer, text, args.runs)
+
+        print(f"{name:<25} {elapsed:>12.2f} {size_mb / elapsed:>8.1f} {n_entities:>9}")
+
+    print("")
+
+
+if __name__ == "__main__":
+    main()
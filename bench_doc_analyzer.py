@@ -0,0 +1,123 @@
+"""
+Benchmark of the prompt layouts of the Document Analyzer
+
+For every layout (see doc_analyzer_prompts) it reports the number of calls,
+the input tokens sent and how many of them are in a prefix shared with a
+previous call (cacheable by the provider); then, unless --dry-run, the
+latency of the workflow (anonymization excluded).
+
+Usage:
+    python bench_doc_analyzer.py doc1.pdf --dry-run
+    python bench_doc_analyzer.py doc1.pdf --runs 3 --layouts separate prefix
+"""
+
+import argparse
+import time
+
+from doc_analyzer_prompts import PROMPT_LAYOUTS, build_requests
+from oci_models import create_prompt_budgeter
+
+
+def read_text(file_name):
+    """
+    Read the text of a PDF or of a text file
+    """
+    if file_name.lower().endswith(".pdf"):
+        # imported here: only needed for PDF
+        import pdfplumber
+
+        with pdfplumber.open(file_name) as pdf:
+            return "\n\n".join(page.extract_text() or "" for page in pdf.pages)
+
+    with open(file_name, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def count_tokens(budgeter, requests):
+    """
+    Return (input tokens, tokens in a prefix already sent) for the requests
+    """
+    tokens_in = 0
+    shared_tokens = 0
+    prefixes = set()
+
+    for request in requests:
+        tokens_in += budgeter.count(request)
+
+        # the first message (the document) can be shared between calls
+        if not isinstance(request, str):
+            prefix = request[0].content
+
+            if prefix in prefixes:
+                shared_tokens += budgeter.count([request[0]])
+            prefixes.add(prefix)
+
+    return tokens_in, shared_tokens
+
+
+def measure_latency(text, prompt_layout, runs):
+    """
+    Return the latencies (sec.) of the workflow with the layout
+    """
+    # imported here: not needed for --dry-run
+    from doc_analyzer_backend import build_workflow
+
+    workflow = build_workflow(anonymize_output=False, prompt_layout=prompt_layout)
+    latencies = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        workflow.invoke({"file_name": "bench", "file_text": text})
+        latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Prompt layouts benchmark.")
+
+    parser.add_argument("file_name", help="PDF or text file to analyze.")
+    parser.add_argument(
+        "--layouts", nargs="*", default=list(PROMPT_LAYOUTS), help="layouts."
+    )
+    parser.add_argument("--runs", type=int, default=1, help="runs for each layout.")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only count tokens, no LLM calls."
+    )
+
+    args = parser.parse_args()
+
+    text = read_text(args.file_name)
+    budgeter = create_prompt_budgeter()
+    text = budgeter.fit(text, reserved_tokens=2500)
+
+    print("")
+    print(f"Document: {args.file_name}, {budgeter.count(text)} tokens")
+    print("")
+    print(
+        f"{'layout':<10} {'calls':>6} {'tokens in':>10} {'shared prefix':>14} "
+        f"{'latency (s)':>12}"
+    )
+
+    for prompt_layout in args.layouts:
+        requests = build_requests(text, prompt_layout)
+        tokens_in, shared_tokens = count_tokens(budgeter, requests)
+
+        latency = "-"
+        if not args.dry_run:
+            latencies = measure_latency(text, prompt_layout, args.runs)
+            latency = f"{min(latencies):.1f}"
+
+        print(
+            f"{prompt_layout:<10} {len(requests):>6} {tokens_in:>10} "
+            f"{shared_tokens:>14} {latency:>12}"
+        )
+
+    print("")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark the import time of modules
+
+Every module is imported in a fresh interpreter with: python -X importtime
+(the best of several runs is reported) and the heaviest imports are listed.
+
+Usage:
+    python bench_import_time.py
+    python bench_import_time.py doc_analyzer_backend oci_models --runs 5 --top 10
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+# modules used at startup by the UI and CLI examples
+DEFAULT_MODULES = [
+    "config_reader",
+    "oci_models",
+    "doc_analyzer_backend",
+    "oci_custom_rag_agent",
+    "oci_vector_store",
+]
+
+
+def parse_importtime(stderr):
+    """
+    Parse the output of -X importtime
+
+    Returns:
+        list of (package, self_us, cumulative_us)
+    """
+    entries = []
+
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        fields = line[len("import time:") :].split("|")
+
+        if len(fields) != 3:
+            continue
+
+        self_us, cumulative_us, package = fields
+        entries.append((package.strip(), int(self_us), int(cumulative_us)))
+
+    return entries
+
+
+def measure_import(module, runs):
+    """
+    Import module in a new interpreter, runs times
+
+    Returns:
+        (wall_ms, entries) for the fastest run, entries is None on error
+    """
+    best_wall = None
+    best_entries = None
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        if result.returncode != 0:
+            last_line = result.stderr.strip().splitlines()[-1:]
+            print(f"{module}: import failed ({' '.join(last_line)})")
+            return None, None
+
+        if best_wall is None or wall_ms < best_wall:
+            best_wall = wall_ms
+            best_entries = parse_importtime(result.stderr)
+
+    return best_wall, best_entries
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Import time benchmark.")
+
+    parser.add_argument(
+        "modules", nargs="*", default=DEFAULT_MODULES, help="modules to import."
+    )
+    parser.add_argument("--runs", type=int, default=3, help="runs for each module.")
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports shown.")
+
+    args = parser.parse_args()
+
+    print("")
+    print(f"{'module':<30} {'import (ms)':>12} {'process (ms)':>13}")
+
+    details = {}
+
+    for module in args.modules:
+        wall_ms, entries = measure_import(module, args.runs)
+
+        if entries is None:
+            continue
+
+        cumulative = {package: cum for package, _, cum in entries}
+        import_ms = cumulative.get(module, 0) / 1000
+
+        print(f"{module:<30} {import_ms:>12.1f} {wall_ms:>13.1f}")
+        details[module] = entries
+
+    for module, entries in details.items():
+        print("")
+        print(f"Heaviest imports (self time) for {module}:")
+
+        for package, self_us, _ in sorted(entries, key=lambda e: e[1], reverse=True)[
+            : args.top
+        ]:
+            print(f"  {package:<50} {self_us / 1000:>8.1f} ms")
+
+    print("")
+
+
+if __name__ == "__main__":
+    main()
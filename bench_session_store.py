@@ -0,0 +1,147 @@
+"""
+Benchmark of the session stores
+
+For every backend it measures the latency of:
+    get: read the history of a session
+    append: add a turn (read, update and write the session)
+with realistic sessions (a history of several turns).
+
+Redis is used if a server is reachable at --redis-url, otherwise the
+in-process stand-in is measured (serialization cost only, no network).
+
+Usage:
+    python bench_session_store.py
+    python bench_session_store.py --sessions 1000 --ops 5000 --turns 6
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from chat_history import ChatHistoryManager
+from session_store import InProcessRedis, create_session_store
+
+ANSWER = (
+    "The retrieved documents describe the configuration of the service, "
+    "the steps to create the resources and the limits to consider. "
+) * 4
+
+
+def create_redis_store(url):
+    """
+    Return (name, store): a real Redis if reachable, else the stand-in
+    """
+    try:
+        import redis
+
+        client = redis.Redis.from_url(url, socket_connect_timeout=0.5)
+        client.ping()
+
+        return "redis", create_session_store("redis", client=client)
+    except Exception:
+        return "redis (stand-in)", create_session_store(
+            "redis", client=InProcessRedis()
+        )
+
+
+def percentiles(latencies):
+    """
+    Return (p50, p99) in microseconds
+    """
+    values = sorted(latencies)
+    p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+
+    return statistics.median(values) * 1e6, p99 * 1e6
+
+
+def run(store, n_sessions, n_ops, n_turns, seed=42):
+    """
+    Return the latencies (sec.) of get and append
+    """
+    rnd = random.Random(seed)
+    manager = ChatHistoryManager(max_tokens=4000, store=store)
+
+    session_ids = [manager.create_session() for _ in range(n_sessions)]
+    for session_id in session_ids:
+        for turn in range(n_turns):
+            manager.add_turn(session_id, f"Question {turn} on the service?", ANSWER)
+
+    get_latencies = []
+    append_latencies = []
+
+    for i in range(n_ops):
+        session_id = rnd.choice(session_ids)
+
+        start = time.perf_counter()
+        manager.get_messages(session_id)
+        get_latencies.append(time.perf_counter() - start)
+
+        # append a turn and then drop it, to keep the size of the sessions
+        start = time.perf_counter()
+        manager.add_turn(session_id, f"Question {i}?", ANSWER)
+        append_latencies.append(time.perf_counter() - start)
+
+        history = store.get(session_id)
+        del history.messages[-2:]
+        store.put(session_id, history)
+
+    return get_latencies, append_latencies
+
+
+def main():
+    """
+    Run the benchmark for all the backends
+    """
+    parser = argparse.ArgumentParser(description="Session store benchmark.")
+
+    parser.add_argument("--sessions", type=int, default=500, help="sessions.")
+    parser.add_argument("--ops", type=int, default=2000, help="get/append for each.")
+    parser.add_argument("--turns", type=int, default=6, help="turns in each session.")
+    parser.add_argument(
+        "--redis-url", default="redis://localhost:6379/15", help="Redis server."
+    )
+
+    args = parser.parse_args()
+
+    print("")
+    print(f"{args.sessions} sessions of {args.turns} turns, {args.ops} operations")
+    print("")
+    print(
+        f"{'backend':<18} {'get p50 (us)':>13} {'get p99 (us)':>13} "
+        f"{'append p50 (us)':>16} {'append p99 (us)':>16}"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stores = [
+            ("memory", create_session_store("memory", max_sessions=args.sessions)),
+            (
+                "sqlite",
+                create_session_store(
+                    "sqlite",
+                    db_path=os.path.join(tmp_dir, "bench_sessions.db"),
+                    max_sessions=args.sessions,
+                ),
+            ),
+            create_redis_store(args.redis_url),
+        ]
+
+        for name, store in stores:
+            get_latencies, append_latencies = run(
+                store, args.sessions, args.ops, args.turns
+            )
+            get_p50, get_p99 = percentiles(get_latencies)
+            append_p50, append_p99 = percentiles(append_latencies)
+
+            print(
+                f"{name:<18} {get_p50:>13.0f} {get_p99:>13.0f} "
+                f"{append_p50:>16.0f} {append_p99:>16.0f}"
+            )
+
+    print("")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark of the in-process vector mirror vs the search in the DB
+
+Without a collection, the mirror is built with random vectors
+(--rows x --dim): to choose vector_mirror_max_rows.
+With --collection, the mirror of the collection is built and the
+latency is compared with the same top-k search in 23AI.
+
+Usage:
+    python bench_vector_mirror.py --rows 100000 --dim 1024
+    python bench_vector_mirror.py --collection BOOKS --runs 50
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from vector_mirror import VectorMirror
+
+
+def percentiles(latencies):
+    """
+    Return (p50, p99) in milliseconds
+    """
+    values = sorted(latencies)
+    p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+
+    return statistics.median(values) * 1e3, p99 * 1e3
+
+
+def measure(search_fn, queries, k):
+    """
+    Latencies (sec.) of search_fn on the queries
+    """
+    latencies = []
+
+    for query_vector in queries:
+        start = time.perf_counter()
+        search_fn(query_vector, k)
+        latencies.append(time.perf_counter() - start)
+
+    return latencies
+
+
+def report(name, latencies):
+    """
+    Print p50/p99 of the latencies
+    """
+    p50, p99 = percentiles(latencies)
+
+    print(f"{name:<22} {p50:>10.2f} {p99:>10.2f}")
+
+
+def main():
+    """
+    Run the benchmark
+    """
+    parser = argparse.ArgumentParser(description="Vector mirror benchmark.")
+
+    parser.add_argument("--collection", help="23AI collection (else synthetic).")
+    parser.add_argument("--rows", type=int, default=50000, help="synthetic rows.")
+    parser.add_argument("--dim", type=int, default=1024, help="synthetic dim.")
+    parser.add_argument("-k", type=int, default=10, help="top k.")
+    parser.add_argument("--runs", type=int, default=100, help="queries.")
+
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+
+    with tempfile.TemporaryDirectory() as mirror_dir:
+        mirror = VectorMirror(
+            args.collection or "SYNTHETIC", mirror_dir=mirror_dir, max_rows=10**9
+        )
+
+        if args.collection:
+            # imported here: needed only to compare with the DB
+            from oci_vector_store import (
+                create_db_connection,
+                filtered_similarity_search,
+            )
+
+            connection = create_db_connection()
+            mirror.refresh(connection, force=True)
+        else:
+            mirror.save(
+                [str(i) for i in range(args.rows)],
+                [["", {}] for _ in range(args.rows)],
+                rng.standard_normal((args.rows, args.dim), dtype=np.float32),
+            )
+
+        n_rows, dim = mirror.data[0].shape
+        queries = rng.standard_normal((args.runs, dim), dtype=np.float32)
+
+        print("")
+        print(f"{n_rows} rows of dim {dim}, top {args.k}, {args.runs} queries")
+        print("")
+        print(f"{'search':<22} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+
+        report("mirror (ids)", measure(mirror.search_ids, queries, args.k))
+        report("mirror (documents)", measure(mirror.search, queries, args.k))
+
+        if args.collection:
+            report(
+                "23AI round trip",
+                measure(
+                    lambda query_vector, k: filtered_similarity_search(
+                        connection, args.collection, query_vector.tolist(), k, None
+                    ),
+                    queries,
+                    args.k,
+                ),
+            )
+            connection.close()
+
+    print("")
+
+
+if __name__ == "__main__":
+    main()
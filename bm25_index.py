@@ -0,0 +1,182 @@
+"""
+BM25 index
+
+A small keyword (BM25) index, in memory, without external dependencies
+other than NumPy. Used to rerank the chunks retrieved and as the keyword
+side of the hybrid search when Oracle Text is not available: in that case
+the index (built by the DB loader) keeps also the text of the chunks.
+
+Usage:
+    index = BM25Index()
+    index.add(ids, texts)
+    results = index.search("side effects of aspirin", k=10)
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+# words, and codes as "AB-1234" or "v2.1" (part numbers, versions...)
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+
+# very frequent words, that don't help the ranking
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it of on or that the "
+    "this to was what when where which who why will with".split()
+)
+
+
+def tokenize(text):
+    """
+    Lowercase words, without the stopwords
+    """
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS
+    ]
+
+
+def content_key(text):
+    """
+    Key of a chunk, from its text (the ids of the DB table are not stable)
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def bm25_index_path(index_dir, collection_name):
+    """
+    The file of the BM25 index of a collection
+    """
+    return os.path.join(index_dir, f"{collection_name}.bm25.json")
+
+
+class BM25Index:
+    """
+    BM25 (Okapi) keyword index
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        """
+        k1, b: the BM25 parameters (term frequency saturation, length norm.)
+        """
+        self.k1 = k1
+        self.b = b
+
+        self.ids = []
+        self.doc_lengths = []
+        # term -> list of (position of the doc, term frequency)
+        self.postings = defaultdict(list)
+        # id -> (text, metadata), only if metadatas are given in add
+        self.documents = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids, texts, metadatas=None):
+        """
+        Add documents to the index
+
+        metadatas: if given, text and metadata are kept in the index
+        """
+        if metadatas is not None:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                self.documents[doc_id] = (text, metadata)
+
+        for doc_id, text in zip(ids, texts):
+            tokens = tokenize(text)
+            position = len(self.ids)
+
+            self.ids.append(doc_id)
+            self.doc_lengths.append(len(tokens))
+
+            for term, freq in Counter(tokens).items():
+                self.postings[term].append((position, freq))
+
+    def scores(self, query):
+        """
+        BM25 score of every document for the query (NumPy array)
+        """
+        n_docs = len(self.ids)
+        scores = np.zeros(n_docs, dtype=np.float32)
+
+        if n_docs == 0:
+            return scores
+
+        doc_lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        avg_length = max(float(doc_lengths.mean()), 1.0)
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+
+            if not postings:
+                continue
+
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+
+            positions = np.fromiter((p for p, _ in postings), dtype=np.int64)
+            freqs = np.fromiter((f for _, f in postings), dtype=np.float32)
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[positions] / avg_length)
+
+            scores[positions] += idf * freqs * (self.k1 + 1) / (freqs + norm)
+
+        return scores
+
+    def search(self, query, k=10):
+        """
+        The k best documents for the query
+
+        :return: list of (id, score), best first (only score > 0)
+        """
+        scores = self.scores(query)
+
+        if len(scores) == 0:
+            return []
+
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+
+        return [(self.ids[i], float(scores[i])) for i in best if scores[i] > 0]
+
+    def save(self, path):
+        """
+        Save the index in a JSON file
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "k1": self.k1,
+                    "b": self.b,
+                    "ids": self.ids,
+                    "doc_lengths": self.doc_lengths,
+                    "postings": self.postings,
+                    "documents": self.documents,
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved with save
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        index = cls(k1=data["k1"], b=data["b"])
+        index.ids = data["ids"]
+        index.doc_lengths = data["doc_lengths"]
+        index.postings.update(
+            (term, [tuple(posting) for posting in postings])
+            for term, postings in data["postings"].items()
+        )
+        index.documents = {
+            doc_id: tuple(document)
+            for doc_id, document in data.get("documents", {}).items()
+        }
+
+        return index
@@ -0,0 +1,219 @@
+"""
+Chat history manager
+
+Keeps the chat history of every session bounded:
+    - only the most recent messages, within a token budget, are kept
+    - older turns are compacted in a rolling summary (if a summarize
+      function is provided, otherwise they're dropped)
+    - idle sessions expire (TTL) and, above max_sessions, the least
+      recently used session is evicted
+
+The sessions are kept in a session store (see session_store): in memory,
+or shared by several processes (SQLite, Redis). Every change of a session
+is an atomic update in the store: concurrent turns (also from other
+processes) are not lost.
+
+Usage:
+    manager = ChatHistoryManager(max_tokens=2000, summarize_fn=summarize)
+    session_id = manager.create_session()
+    messages = manager.get_messages(session_id)
+    manager.add_turn(session_id, question, answer)
+"""
+
+import threading
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from session_store import InMemorySessionStore, SessionHistory
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+# used when no count function is provided
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PREFIX = "Summary of the previous conversation:\n"
+
+
+def estimate_tokens(messages):
+    """
+    Estimate the tokens of messages from their length
+    """
+    return sum(len(msg.content) // CHARS_PER_TOKEN + 4 for msg in messages)
+
+
+class ChatHistoryManager:
+    """
+    Token-bounded, compacting chat history for many sessions
+    """
+
+    def __init__(
+        self,
+        max_tokens=2000,
+        keep_turns=2,
+        max_sessions=1000,
+        session_ttl=3600,
+        summarize_fn=None,
+        count_fn=None,
+        store=None,
+    ):
+        """
+        max_tokens (int): max tokens of the history sent to the LLM
+        keep_turns (int): last turns (question + answer) never compacted
+        max_sessions (int): above, the least recently used session is evicted
+        session_ttl (float): secs. of inactivity after which a session expires
+        summarize_fn: function (summary, messages) -> new summary (optional)
+        count_fn: function (messages) -> tokens (default: estimate)
+        store: SessionStore (default: in memory, with max_sessions and ttl)
+        """
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.summarize_fn = summarize_fn
+        self.count_fn = count_fn or estimate_tokens
+        self.store = store or InMemorySessionStore(max_sessions, session_ttl)
+
+        # only for the counters: the sessions are updated in the store
+        self.lock = threading.Lock()
+
+        self.n_compactions = 0
+
+    @staticmethod
+    def _touch(history):
+        """
+        Return the history (a new one if None) with the access time updated
+        """
+        history = history or SessionHistory()
+        history.last_access = time.time()
+
+        return history
+
+    def create_session(self, session_id=None):
+        """
+        Create a session (a new session id is created if not provided)
+        """
+        session_id = session_id or str(uuid.uuid4())
+
+        self.store.update(session_id, self._touch)
+
+        return session_id
+
+    def close_session(self, session_id):
+        """
+        Remove the session
+
+        :return: True if the session existed
+        """
+        return self.store.delete(session_id)
+
+    def __contains__(self, session_id):
+        return session_id in self.store
+
+    def get_messages(self, session_id):
+        """
+        Return the history to send to the LLM: summary (if any) and last messages
+
+        An unknown (or expired) session has an empty history.
+        """
+        history = self.store.get(session_id)
+
+        if history is None:
+            return []
+
+        messages = list(history.messages)
+
+        if history.summary:
+            messages.insert(0, SystemMessage(content=SUMMARY_PREFIX + history.summary))
+
+        return messages
+
+    def add_turn(self, session_id, question, answer):
+        """
+        Add a turn (question and answer) to the history, compacting if needed
+        """
+        # the messages compacted by the update that was saved
+        old_messages = []
+
+        def append_turn(history):
+            history = self._touch(history)
+
+            history.messages.append(HumanMessage(content=question))
+            history.messages.append(AIMessage(content=answer))
+            history.n_turns += 1
+            history.n_tokens = self.count_fn(history.messages)
+
+            # the update can be retried: only the last call counts
+            old_messages.clear()
+            if history.n_tokens > self.max_tokens:
+                old_messages.extend(self._pop_oldest(history))
+
+            return history
+
+        history = self.store.update(session_id, append_turn)
+
+        if not old_messages:
+            return
+
+        # the summary (a LLM call) is done without holding the lock
+        summary = history.summary
+        if self.summarize_fn is not None:
+            try:
+                summary = self.summarize_fn(summary, old_messages)
+            except Exception as e:
+                logger.error("Summary of session %s failed: %s", session_id, e)
+
+        def set_summary(history):
+            history = self._touch(history)
+            history.summary = summary
+
+            return history
+
+        history = self.store.update(session_id, set_summary)
+
+        with self.lock:
+            self.n_compactions += 1
+
+        logger.info(
+            "Session %s: %d messages compacted, %d tokens in history",
+            session_id,
+            len(old_messages),
+            history.n_tokens,
+        )
+
+    def _pop_oldest(self, history):
+        """
+        Remove the oldest turns, down to half of max_tokens
+        (so that the summary is not updated at every turn)
+
+        :return: the messages removed
+        """
+        n_kept = 2 * self.keep_turns
+        old_messages = []
+
+        while (
+            len(history.messages) > n_kept
+            and self.count_fn(history.messages) > self.max_tokens // 2
+        ):
+            old_messages.extend(history.messages[:2])
+            del history.messages[:2]
+
+        history.n_tokens = self.count_fn(history.messages)
+
+        return old_messages
+
+    def stats(self):
+        """
+        Metrics on the sessions and the size of the histories
+        """
+        histories = self.store.histories()
+
+        return {
+            "sessions": len(histories),
+            "messages": sum(len(h.messages) for h in histories),
+            "tokens": sum(h.n_tokens for h in histories),
+            "max_session_tokens": max((h.n_tokens for h in histories), default=0),
+            "summaries": sum(1 for h in histories if h.summary),
+            "compactions": self.n_compactions,
+            "evicted": self.store.n_evicted,
+        }
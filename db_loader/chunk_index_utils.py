@@ -5,17 +5,15 @@ This version is based on docling
 """
 
 import os
-from docling.document_converter import DocumentConverter
-from docling.chunking import HybridChunker
+from functools import lru_cache
 from langchain.docstore.document import Document
-from transformers import AutoTokenizer
-from config_reader import ConfigReader
+from config_reader import get_config
 from utils import get_console_logger
 
 
 # TODO: handle tokenizer_name
 logger = get_console_logger()
-config = ConfigReader("config.toml")
+config = get_config("config.toml")
 
 
 def get_page_num(_chunk):
@@ -30,12 +28,16 @@ def get_page_num(_chunk):
     return page_num
 
 
+@lru_cache(maxsize=1)
 def get_tokenizer():
     """
-    get the tokenizer.
+    get the tokenizer (loaded only once).
 
     name from config.toml
     """
+    # imported here: transformers is slow to import
+    from transformers import AutoTokenizer
+
     # to remove warning
     os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
@@ -44,14 +46,28 @@ def get_tokenizer():
     return _tokenizer
 
 
+@lru_cache(maxsize=1)
+def get_converter():
+    """
+    get the docling converter (created only once, it loads models)
+    """
+    # imported here: docling is slow to import
+    from docling.document_converter import DocumentConverter
+
+    return DocumentConverter()
+
+
 def load_book_and_split(books_dir, book_name, max_tokens):
     """
     read a book, split in chunks using docling
     """
+    # imported here: docling is slow to import
+    from docling.chunking import HybridChunker
+
     full_name = os.path.join(books_dir, book_name)
 
     logger.info("Docling converting: %s", book_name)
-    converter = DocumentConverter()
+    converter = get_converter()
     doc = converter.convert(source=full_name).document
 
     # the tokenizer
@@ -7,12 +7,12 @@ refactored to use oci_db_loader
 import argparse
 from oci_db_loader import OCIDBLoader
 
-from config_reader import ConfigReader
+from config_reader import get_config
 from utils import get_console_logger
 
 # handle input for collection_name from command line
 logger = get_console_logger()
-config = ConfigReader("config.toml")
+config = get_config("config.toml")
 
 parser = argparse.ArgumentParser(description="Document batch loading.")
 
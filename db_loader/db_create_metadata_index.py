@@ -0,0 +1,36 @@
+"""
+Create an index on a metadata key of an existing collection
+
+used by the search filtered on the metadata (e.g. by source)
+"""
+
+import argparse
+
+from oci_db_loader import OCIDBLoader
+from oraclevs_4_db_loading import OracleVS4DBLoading
+
+from utils import get_console_logger
+
+
+#
+# Main
+#
+
+logger = get_console_logger()
+
+parser = argparse.ArgumentParser(description="Create a metadata index.")
+
+parser.add_argument("collection_name", type=str, help="collection name to index.")
+parser.add_argument("key", type=str, help="metadata key (e.g. source).")
+parser.add_argument("--numeric", action="store_true", help="compared as number.")
+
+args = parser.parse_args()
+
+loader = OCIDBLoader()
+
+with loader.get_db_connection() as conn:
+    OracleVS4DBLoading.create_metadata_index(
+        conn, args.collection_name, args.key, numeric=args.numeric
+    )
+
+logger.info("")
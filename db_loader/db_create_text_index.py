@@ -0,0 +1,33 @@
+"""
+Create the Oracle Text index on an existing collection
+
+needed for the hybrid search (keyword_search = "oracle_text")
+"""
+
+import argparse
+
+from oci_db_loader import OCIDBLoader
+from oraclevs_4_db_loading import OracleVS4DBLoading
+
+from utils import get_console_logger
+
+
+#
+# Main
+#
+
+logger = get_console_logger()
+
+parser = argparse.ArgumentParser(description="Create the text index.")
+
+parser.add_argument("collection_name", type=str, help="collection name to index.")
+
+args = parser.parse_args()
+collection_name = args.collection_name
+
+loader = OCIDBLoader()
+
+with loader.get_db_connection() as conn:
+    OracleVS4DBLoading.create_text_index(conn, collection_name)
+
+logger.info("")
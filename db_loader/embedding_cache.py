@@ -0,0 +1,186 @@
+"""
+Embedding cache
+
+Wraps an Embeddings model (e.g. OCIGenAIEmbeddings) and caches the vectors:
+    - in memory, LRU, as NumPy float32 arrays (compact)
+    - optionally on disk, in a SQLite file (survives restarts, shared
+      by the processes on the host)
+
+The key is the model id and the normalized text, so the same question
+(or chunk) is embedded only once. Queries and documents are cached
+separately.
+
+Usage:
+    embed_model = CachedEmbeddings(OCIGenAIEmbeddings(...), model_id=model_id)
+    vector = embed_model.embed_query("What is Oracle 23AI?")
+"""
+
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+
+def normalize_text(text):
+    """
+    Normalize the text used as key: unicode NFC, collapsed whitespace
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings with an LRU cache in memory and an optional disk cache
+    """
+
+    def __init__(self, embed_model, model_id, max_entries=10000, cache_path=None):
+        """
+        embed_model (Embeddings): the model that computes the embeddings
+        model_id (str): part of the key (vectors of different models differ)
+        max_entries (int): vectors kept in memory
+        cache_path (str): SQLite file for the disk cache (None: only memory)
+        """
+        self.embed_model = embed_model
+        self.model_id = model_id
+        self.max_entries = max_entries
+
+        # key -> float32 vector, least recently used first
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.conn = None
+        if cache_path:
+            self.conn = sqlite3.connect(
+                cache_path, check_same_thread=False, isolation_level=None
+            )
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def _key(self, text, kind):
+        """
+        Key of the cache for the text
+
+        kind: "query" or "document" (a model can embed them differently)
+        """
+        data = f"{self.model_id}\x00{kind}\x00{normalize_text(text)}".encode("utf-8")
+
+        return hashlib.sha1(data).hexdigest()
+
+    def _lookup(self, key):
+        """
+        Return the cached vector (memory, then disk) or None
+        """
+        with self.lock:
+            vector = self.cache.get(key)
+
+            if vector is not None:
+                self.cache.move_to_end(key)
+                return vector
+
+            if self.conn is None:
+                return None
+
+            row = self.conn.execute(
+                "SELECT vector FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        vector = np.frombuffer(row[0], dtype=np.float32)
+        self._store(key, vector, to_disk=False)
+
+        return vector
+
+    def _store(self, key, vector, to_disk=True):
+        """
+        Add the vector to the cache
+        """
+        with self.lock:
+            self.cache[key] = vector
+            self.cache.move_to_end(key)
+
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+            if to_disk and self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    (key, vector.tobytes()),
+                )
+
+    def embed_documents(self, texts):
+        """
+        Embed the texts: only the ones not in cache are sent to the model
+        """
+        keys = [self._key(text, "document") for text in texts]
+        vectors = [self._lookup(key) for key in keys]
+
+        # the texts to embed, without duplicates
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None and key not in missing:
+                missing[key] = text
+
+        self.n_hits += len(texts) - len(missing)
+        self.n_misses += len(missing)
+
+        if missing:
+            new_vectors = self.embed_model.embed_documents(list(missing.values()))
+
+            computed = {}
+            for key, new_vector in zip(missing, new_vectors):
+                computed[key] = np.asarray(new_vector, dtype=np.float32)
+                self._store(key, computed[key])
+
+            vectors = [
+                computed[key] if vector is None else vector
+                for key, vector in zip(keys, vectors)
+            ]
+
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text):
+        """
+        Embed the query (from the cache, if already done)
+        """
+        key = self._key(text, "query")
+        vector = self._lookup(key)
+
+        if vector is None:
+            self.n_misses += 1
+            vector = np.asarray(self.embed_model.embed_query(text), dtype=np.float32)
+            self._store(key, vector)
+        else:
+            self.n_hits += 1
+
+        return vector.tolist()
+
+    def stats(self):
+        """
+        Metrics on the cache
+        """
+        with self.lock:
+            n_entries = len(self.cache)
+            n_bytes = sum(vector.nbytes for vector in self.cache.values())
+
+        return {
+            "hits": self.n_hits,
+            "misses": self.n_misses,
+            "entries": n_entries,
+            "memory_bytes": n_bytes,
+        }
@@ -11,8 +11,10 @@ import oracledb
 from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_community.embeddings import OCIGenAIEmbeddings
 
-from config_reader import ConfigReader
+from config_reader import get_config
+from embedding_cache import CachedEmbeddings
 from oraclevs_4_db_loading import OracleVS4DBLoading
+from bm25_index import BM25Index, bm25_index_path, content_key
 from chunk_index_utils import load_book_and_split
 from config_private import CONNECT_ARGS, COMPARTMENT_OCID
 from utils import get_console_logger, compute_stats
@@ -36,6 +38,8 @@ class OCIDBLoader:
     - chunk the documents
     - embeds using OCI Generative AI Ambeddings
     - load in 23AI DB
+    - update the local BM25 index and/or the Oracle Text index, used for
+      the hybrid (keyword + vector) search
     Usage:
 
     """
@@ -44,7 +48,7 @@ class OCIDBLoader:
         """
         Initialize the client
         """
-        self.config = ConfigReader("config.toml")
+        self.config = get_config("config.toml")
         self.logger = get_console_logger()
 
     def get_db_connection(self):
@@ -68,6 +72,9 @@ class OCIDBLoader:
     def get_embed_model(self):
         """
         get the Embeddings Model
+
+        with a disk cache (embed_cache_path), chunks already embedded
+        (e.g. a collection loaded again) are not sent again to the model
         """
         embed_model_id = self.config.find_key("embed_model_id")
         embed_model_endpoint = self.config.find_key("embed_model_endpoint")
@@ -83,7 +90,12 @@ class OCIDBLoader:
             compartment_id=COMPARTMENT_OCID,
         )
 
-        return embed_model
+        return CachedEmbeddings(
+            embed_model,
+            model_id=embed_model_id,
+            max_entries=self.config.find_key("embed_cache_size") or 10000,
+            cache_path=self.config.find_key("embed_cache_path") or None,
+        )
 
     def add_documents(self, books_dir, collection_name):
         """
@@ -182,6 +194,14 @@ class OCIDBLoader:
                     conn, docs, embed_model, collection_name, is_new=True
                 )
 
+                if self.config.find_key("create_text_index"):
+                    OracleVS4DBLoading.create_text_index(conn, collection_name)
+
+                for key in self.config.find_key("metadata_index_keys") or []:
+                    OracleVS4DBLoading.create_metadata_index(
+                        conn, collection_name, key, numeric=key == "page"
+                    )
+
                 self.logger.info("Loading completed.")
                 self.logger.info("")
 
@@ -218,8 +238,58 @@ class OCIDBLoader:
             )
             v_store.add_documents(docs)
 
+        self.update_bm25_index(collection_name, docs)
+
         self.logger.info("Operation completed for collection: %s", collection_name)
 
+    def update_bm25_index(self, collection_name, docs):
+        """
+        Add the docs to the local BM25 index of the collection
+        (disabled if bm25_index_dir is empty)
+        """
+        index_dir = self.config.find_key("bm25_index_dir")
+
+        if not index_dir:
+            return
+
+        os.makedirs(index_dir, exist_ok=True)
+        path = bm25_index_path(index_dir, collection_name)
+
+        index = BM25Index.load(path) if os.path.exists(path) else BM25Index()
+
+        texts = [doc.page_content for doc in docs]
+        index.add(
+            [content_key(text) for text in texts],
+            texts,
+            [doc.metadata for doc in docs],
+        )
+        index.save(path)
+
+        self.logger.info("BM25 index updated: %s (%d chunks)", path, len(index))
+
+    def remove_from_bm25_index(self, collection_name, doc_names):
+        """
+        Rebuild the BM25 index of the collection without the docs
+        """
+        index_dir = self.config.find_key("bm25_index_dir")
+
+        if not index_dir:
+            return
+
+        path = bm25_index_path(index_dir, collection_name)
+
+        if not os.path.exists(path):
+            return
+
+        old_index = BM25Index.load(path)
+        index = BM25Index(k1=old_index.k1, b=old_index.b)
+
+        for key, (text, metadata) in old_index.documents.items():
+            if metadata.get("source") not in doc_names:
+                index.add([key], [text], [metadata])
+
+        index.save(path)
+
     def close_db_connection(self, conn):
         """
         close the D connection
@@ -240,6 +310,8 @@ class OCIDBLoader:
                 )
                 OracleVS4DBLoading.delete_documents(conn, collection_name, doc_names)
 
+            self.remove_from_bm25_index(collection_name, doc_names)
+
     # helper
     def log_stats(self, n_chunks, mean, stdev, perc_75):
         """
@@ -102,3 +102,57 @@ class OracleVS4DBLoading(OracleVS):
         cur = connection.cursor()
 
         cur.execute(sql)
+
+    @classmethod
+    def create_text_index(cls, connection: Connection, collection_name: str):
+        """
+        create the Oracle Text index on the text of the chunks,
+        used by the hybrid (keyword + vector) search
+        synced on commit: new chunks are immediately searchable
+        """
+        sql = f"""
+              CREATE INDEX {collection_name}_text_idx ON {collection_name} (text)
+              INDEXTYPE IS CTXSYS.CONTEXT PARAMETERS ('SYNC (ON COMMIT)')
+              """
+
+        if VERBOSE:
+            logger.info(sql)
+
+        cur = connection.cursor()
+
+        cur.execute(sql)
+
+        cur.close()
+
+        logger.info("Text index created on collection %s", collection_name)
+
+    @classmethod
+    def create_metadata_index(
+        cls,
+        connection: Connection,
+        collection_name: str,
+        key: str = "source",
+        numeric: bool = False,
+    ):
+        """
+        create an index on a metadata key, used by the filtered search
+        (the expression is the same used in the filters, see metadata_filter)
+        numeric: for keys compared as numbers (e.g. page)
+        """
+        returning = " RETURNING NUMBER" if numeric else ""
+
+        sql = f"""
+              CREATE INDEX IF NOT EXISTS {collection_name}_{key}_idx
+              ON {collection_name} (json_value(METADATA, '$.{key}'{returning}))
+              """
+
+        if VERBOSE:
+            logger.info(sql)
+
+        cur = connection.cursor()
+
+        cur.execute(sql)
+
+        cur.close()
+
+        logger.info("Index on %s created on collection %s", key, collection_name)
@@ -9,10 +9,10 @@ from docling.document_converter import DocumentConverter
 from docling.chunking import HybridChunker
 from langchain.docstore.document import Document
 from transformers import AutoTokenizer
-from config_reader import ConfigReader
+from config_reader import get_config
 from chunk_index_utils import get_page_num
 
-config = ConfigReader("config.toml")
+config = get_config("config.toml")
 
 
 def file_list(directory):
@@ -7,7 +7,6 @@ Python Version: 3.11
 
 import logging
 import os
-import numpy as np
 
 
 def debug_bool(b_str):
@@ -69,6 +68,9 @@ def compute_stats(list_docs):
 
     list_docs: LangChain list of Documents
     """
+    # imported here: numpy is not needed by the other utilities
+    import numpy as np
+
     lengths = [len(d.page_content) for d in list_docs]
 
     mean_length = int(round(np.mean(lengths), 0))
@@ -1,5 +1,8 @@
 """
 Anonymizer
+
+The text is first anonymized locally (patterns and gazetteer, in milliseconds),
+then, if use_llm, the LLM handles the residual entities.
 """
 
 import sys
@@ -10,12 +13,31 @@ parent_dir = os.path.abspath(os.path.join(os.getcwd(), ".."))
 sys.path.append(parent_dir)
 
 from agent_base_node import BaseAgentNode
+from local_anonymizer import LocalAnonymizer, load_gazetteer
 
 
 class Anonymizer(BaseAgentNode):
+    def __init__(self, use_llm=True, gazetteer_path=None, **kwargs):
+        """
+        use_llm (bool): if True, the LLM pass is done after the local one
+        gazetteer_path (str): JSON file with known customers, people...
+        """
+        super().__init__(**kwargs)
+
+        self.use_llm = use_llm
+        self.gazetteer_path = gazetteer_path or os.path.join(
+            parent_dir, "anonymizer_gazetteer.json"
+        )
+
     def _run_impl(self, state):
         """LLM call to anonymize"""
 
+        local_anonymizer = LocalAnonymizer(load_gazetteer(self.gazetteer_path))
+        text = local_anonymizer.anonymize(state["combined_output"])
+
+        if not self.use_llm:
+            return {"final_output": text}
+
         # needs more tokens since works on the aggregation
         llm = self.get_llm_model(max_tokens=2048)
 
@@ -27,7 +49,8 @@ class Anonymizer(BaseAgentNode):
         * languages names
         Don't anonymize: the document name.
         Don't anonymize: the word Oracle,
-        Text: {state['combined_output']}.
+        Don't change: placeholders like [PERSON_1], already anonymized.
+        Text: {text}.
         """
 
         msg = llm.invoke(request)
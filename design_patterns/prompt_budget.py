@@ -0,0 +1,260 @@
+"""
+Prompt budget
+
+Counts the tokens of a prompt with a local tokenizer (no network round-trip),
+trims the document text to fit the context window of the model and reserves
+the tokens for the output. Requests too long are rejected locally, raising
+ContextBudgetExceeded, instead of failing after the call to the service.
+
+The tokenizer of each model is a local tokenizer.json (TOKENIZER_FILES, in
+tokenizer_dir): the files are not in the repository, download them once with
+    python download_tokenizers.py --token <Hugging Face token>
+If a tokenizer can't be loaded (the file or the package tokenizers are
+missing) a warning is logged and tokens are estimated from the number of
+characters.
+
+Usage:
+    budgeter = PromptBudgeter("meta.llama-3.3-70b-instruct", max_output_tokens=2048)
+    text = budgeter.fit(text, reserved_tokens=budgeter.count(instructions))
+    budgeter.check(prompt)
+"""
+
+import os
+import re
+from functools import lru_cache
+
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+# context window (tokens) of the models used
+CONTEXT_WINDOWS = {
+    "meta.llama-3.3-70b-instruct": 128000,
+    "meta.llama-3.1-70b-instruct": 128000,
+    "meta.llama-3.1-405b-instruct": 128000,
+    "meta.llama-3.2-90b-vision-instruct": 128000,
+    "cohere.command-r-plus-08-2024": 128000,
+    "cohere.command-r-08-2024": 128000,
+}
+DEFAULT_CONTEXT_WINDOW = 32000
+
+# tokenizer (tokenizer.json file, in tokenizer_dir) of the models used
+TOKENIZER_FILES = {
+    "meta.llama-3.3-70b-instruct": "llama-3.json",
+    "meta.llama-3.1-70b-instruct": "llama-3.json",
+    "meta.llama-3.1-405b-instruct": "llama-3.json",
+    "meta.llama-3.2-90b-vision-instruct": "llama-3.json",
+    "cohere.command-r-plus-08-2024": "command-r.json",
+    "cohere.command-r-08-2024": "command-r.json",
+}
+DEFAULT_TOKENIZER_DIR = "tokenizers"
+
+# where the tokenizer.json files are downloaded from (Hugging Face hub,
+# gated models: accept the license and use a token), see download_tokenizers.py
+TOKENIZER_SOURCES = {
+    "llama-3.json": "meta-llama/Llama-3.3-70B-Instruct",
+    "command-r.json": "CohereForAI/c4ai-command-r-plus-08-2024",
+}
+
+# used when the tokenizer is not available (and to estimate a cut)
+CHARS_PER_TOKEN = 4
+
+# tokenizers differ between models: keep a margin
+DEFAULT_SAFETY_MARGIN = 0.05
+
+# tokens added for every chat message (role, separators)
+TOKENS_PER_MESSAGE = 4
+
+TRUNCATION_MARKER = "\n[...]\n"
+
+
+class ContextBudgetExceeded(ValueError):
+    """
+    The prompt doesn't fit in the context window of the model
+    """
+
+
+def tokenizer_path(model_id, tokenizer_dir=DEFAULT_TOKENIZER_DIR):
+    """
+    The tokenizer.json of the model (None if the model is not known)
+    """
+    file_name = TOKENIZER_FILES.get(model_id)
+
+    return os.path.join(tokenizer_dir, file_name) if file_name else None
+
+
+@lru_cache(maxsize=8)
+def get_tokenizer(tokenizer_file):
+    """
+    Load (only once) the tokenizer from a local tokenizer.json
+
+    Returns None if it can't be loaded (tokens are then estimated).
+    """
+    if not tokenizer_file:
+        logger.warning("No tokenizer for the model, tokens estimated")
+        return None
+
+    if not os.path.exists(tokenizer_file):
+        logger.warning("Tokenizer %s not found, tokens estimated", tokenizer_file)
+        return None
+
+    try:
+        # imported here: optional, and slow to import
+        from tokenizers import Tokenizer
+
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+        return Tokenizer.from_file(tokenizer_file)
+    except Exception as e:
+        logger.warning(
+            "Tokenizer %s not loaded, tokens estimated: %s", tokenizer_file, e
+        )
+        return None
+
+
+def compact_text(text):
+    """
+    Remove redundant whitespace (frequent in text extracted from PDF)
+    """
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r" ?\n[\s]*\n\s*", "\n\n", text)
+
+    return text.strip()
+
+
+class PromptBudgeter:
+    """
+    Token budget for the prompts sent to a model
+    """
+
+    def __init__(
+        self,
+        model_id,
+        max_output_tokens=1024,
+        context_window=None,
+        tokenizer_file=None,
+        tokenizer_dir=DEFAULT_TOKENIZER_DIR,
+        safety_margin=DEFAULT_SAFETY_MARGIN,
+    ):
+        """
+        model_id (str): the model, to get the context window
+        max_output_tokens (int): tokens reserved for the output (max_tokens)
+        context_window (int): if None, from CONTEXT_WINDOWS
+        tokenizer_file (str): tokenizer.json to use (default: the one
+            of the model, from TOKENIZER_FILES)
+        tokenizer_dir (str): where the tokenizer.json of the models are
+        safety_margin (float): fraction of the context window not used
+        """
+        self.model_id = model_id
+        self.max_output_tokens = max_output_tokens
+        self.context_window = context_window or CONTEXT_WINDOWS.get(
+            model_id, DEFAULT_CONTEXT_WINDOW
+        )
+        self.tokenizer = get_tokenizer(
+            tokenizer_file or tokenizer_path(model_id, tokenizer_dir)
+        )
+
+        self.max_prompt_tokens = (
+            int(self.context_window * (1 - safety_margin)) - max_output_tokens
+        )
+
+    def count(self, prompt) -> int:
+        """
+        Count the tokens of a prompt (a string or a list of messages)
+        """
+        if isinstance(prompt, str):
+            if self.tokenizer is None:
+                return -(-len(prompt) // CHARS_PER_TOKEN)
+
+            return len(self.tokenizer.encode(prompt, add_special_tokens=False).ids)
+
+        return sum(self.count(msg.content) + TOKENS_PER_MESSAGE for msg in prompt)
+
+    def check(self, prompt) -> int:
+        """
+        Check that the prompt fits, with the output, in the context window
+
+        :return: the number of tokens of the prompt
+        :raises ContextBudgetExceeded: if it doesn't fit
+        """
+        n_tokens = self.count(prompt)
+
+        if n_tokens > self.max_prompt_tokens:
+            raise ContextBudgetExceeded(
+                f"Prompt of {n_tokens} tokens, max for {self.model_id} is "
+                f"{self.max_prompt_tokens} (with {self.max_output_tokens} for output)"
+            )
+
+        return n_tokens
+
+    def _cut(self, text, n_tokens, from_end=False):
+        """
+        Return the first (or last) n_tokens of text
+        """
+        if n_tokens <= 0:
+            return ""
+
+        if self.tokenizer is None:
+            n_chars = n_tokens * CHARS_PER_TOKEN
+            return text[-n_chars:] if from_end else text[:n_chars]
+
+        offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+
+        if len(offsets) <= n_tokens:
+            return text
+        if from_end:
+            return text[offsets[-n_tokens][0] :]
+
+        return text[: offsets[n_tokens - 1][1]]
+
+    def fit(self, text, reserved_tokens=0, keep_tail=0.0) -> str:
+        """
+        Compact and trim text to fit in the budget
+
+        text (str): the document text
+        reserved_tokens (int): tokens used by the rest of the prompt
+        keep_tail (float): fraction of the budget kept from the end of the text
+            (0: only the beginning is kept)
+        :raises ContextBudgetExceeded: if reserved_tokens leave no room
+        """
+        budget = self.max_prompt_tokens - reserved_tokens
+
+        if budget <= 0:
+            raise ContextBudgetExceeded(
+                f"No room for the text: {reserved_tokens} tokens reserved, "
+                f"max for {self.model_id} is {self.max_prompt_tokens}"
+            )
+
+        text = compact_text(text)
+        n_tokens = self.count(text)
+
+        if n_tokens <= budget:
+            return text
+
+        logger.warning(
+            "Text of %d tokens trimmed to %d for %s", n_tokens, budget, self.model_id
+        )
+
+        budget -= self.count(TRUNCATION_MARKER)
+        tail_tokens = int(budget * keep_tail)
+
+        head = self._cut(text, budget - tail_tokens)
+        tail = self._cut(text, tail_tokens, from_end=True)
+
+        return head + TRUNCATION_MARKER + tail
+
+    def fit_template(self, template, text_field="text", keep_tail=0.0, **kwargs):
+        """
+        Format template, with text (kwargs[text_field]) trimmed to fit
+
+        :return: the prompt
+        """
+        text = kwargs.pop(text_field)
+        reserved_tokens = self.count(template.format(**{text_field: ""}, **kwargs))
+
+        kwargs[text_field] = self.fit(text, reserved_tokens, keep_tail)
+        prompt = template.format(**kwargs)
+
+        self.check(prompt)
+
+        return prompt
@@ -0,0 +1,268 @@
+"""
+Persistent appointment store, based on SQLite
+
+It has the same interface of meetings_api.AppointmentStore, therefore it can be
+used with find_free_slots, find_common_free_slots and set_appointment.
+Conflicts are checked and the appointment is inserted in a single
+(immediate) transaction, using an index on (day, start_min, end_min):
+concurrent bookings, from threads or processes, can't double-book a slot.
+
+The store used by the agent nodes is selected with environment variables:
+    APPOINTMENTS_STORE: "sqlite" (default) or "memory"
+    APPOINTMENTS_DB: path of the SQLite file (default appointments.db)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+from meetings_api import (
+    SAMPLE_APPOINTMENTS,
+    AppointmentStore,
+    format_time,
+    parse_date,
+    parse_time,
+)
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS appointments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    day TEXT NOT NULL,
+    start_min INTEGER NOT NULL,
+    end_min INTEGER NOT NULL,
+    participants TEXT NOT NULL,
+    notes TEXT
+)
+"""
+
+# the interval index, used for range queries and conflict checks
+CREATE_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS appointments_interval_idx
+ON appointments (day, start_min, end_min)
+"""
+
+CONFLICT_SQL = """
+SELECT id FROM appointments
+WHERE day = ? AND start_min < ? AND end_min > ?
+LIMIT 1
+"""
+
+INSERT_SQL = """
+INSERT INTO appointments (day, start_min, end_min, participants, notes)
+VALUES (?, ?, ?, ?, ?)
+"""
+
+SELECT_SQL = """
+SELECT id, day, start_min, end_min, participants, notes FROM appointments
+"""
+
+# the store shared by the agent nodes, created on first use
+_store = None
+_store_lock = threading.Lock()
+
+
+class SQLiteAppointmentStore:
+    """
+    Calendar persisted in a SQLite database.
+
+    Every thread uses its own connection; the database is in WAL mode,
+    so reads don't block the (serialized) bookings.
+    """
+
+    def __init__(self, db_path="appointments.db", timeout=30.0):
+        """
+        db_path: path of the SQLite file
+        timeout: max wait (sec.) for the lock on the database
+        """
+        self.db_path = db_path
+        self.timeout = timeout
+        self.local = threading.local()
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(CREATE_TABLE_SQL)
+        conn.execute(CREATE_INDEX_SQL)
+
+    def _connection(self):
+        """
+        Return the connection for the current thread
+        """
+        conn = getattr(self.local, "conn", None)
+
+        if conn is None:
+            # autocommit mode: transactions are explicit (BEGIN IMMEDIATE)
+            conn = sqlite3.connect(
+                self.db_path, timeout=self.timeout, isolation_level=None
+            )
+            self.local.conn = conn
+
+        return conn
+
+    @staticmethod
+    def _to_row(appointment):
+        """
+        Convert an appointment dictionary in the values for INSERT_SQL
+        """
+        return (
+            parse_date(appointment["date"]).isoformat(),
+            parse_time(appointment["start_time"]),
+            parse_time(appointment["end_time"]),
+            json.dumps(appointment.get("participants") or []),
+            appointment.get("notes", ""),
+        )
+
+    @staticmethod
+    def _to_entry(row):
+        """
+        Convert a row in an entry (start_min, end_min, id, appointment)
+        """
+        app_id, day, start_min, end_min, participants, notes = row
+
+        appointment = {
+            "date": day,
+            "start_time": format_time(start_min),
+            "end_time": format_time(end_min),
+            "participants": json.loads(participants),
+            "notes": notes,
+        }
+
+        return (start_min, end_min, app_id, appointment)
+
+    def add(self, appointment):
+        """
+        Add an appointment (no check on conflicts)
+        """
+        self._connection().execute(INSERT_SQL, self._to_row(appointment))
+
+    def seed(self, appointments):
+        """
+        Add the appointments, in a single transaction, only if the store is empty
+
+        :return: True if the appointments have been added
+        """
+        conn = self._connection()
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            is_empty = (
+                conn.execute("SELECT 1 FROM appointments LIMIT 1").fetchone() is None
+            )
+
+            if is_empty:
+                conn.executemany(
+                    INSERT_SQL, [self._to_row(app) for app in appointments]
+                )
+
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+        return is_empty
+
+    def book(self, appointment):
+        """
+        Add the appointment only if it doesn't overlap existing ones.
+
+        :return: True if booked, False if the slot is taken
+        """
+        row = self._to_row(appointment)
+        conn = self._connection()
+
+        # takes the write lock immediately: check and insert are atomic
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conflict = conn.execute(CONFLICT_SQL, (row[0], row[2], row[1])).fetchone()
+
+            if conflict is None:
+                conn.execute(INSERT_SQL, row)
+
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+        return conflict is None
+
+    def on_date(self, day):
+        """
+        Return the entries for a day (datetime.date), sorted by start time
+        """
+        rows = self._connection().execute(
+            SELECT_SQL + " WHERE day = ? ORDER BY start_min, id", (day.isoformat(),)
+        )
+
+        return [self._to_entry(row) for row in rows]
+
+    def between(self, start_date, end_date=None):
+        """
+        Return the appointments between start_date and end_date (included)
+
+        :param start_date: datetime.date
+        :param end_date: datetime.date (optional, if None only start_date)
+        """
+        end_date = end_date or start_date
+
+        rows = self._connection().execute(
+            SELECT_SQL + " WHERE day BETWEEN ? AND ? ORDER BY day, start_min, id",
+            (start_date.isoformat(), end_date.isoformat()),
+        )
+
+        return [self._to_entry(row)[3] for row in rows]
+
+    def __len__(self):
+        return (
+            self._connection()
+            .execute("SELECT COUNT(*) FROM appointments")
+            .fetchone()[0]
+        )
+
+    def __iter__(self):
+        rows = (
+            self._connection()
+            .execute(SELECT_SQL + " ORDER BY day, start_min, id")
+            .fetchall()
+        )
+
+        return iter([self._to_entry(row)[3] for row in rows])
+
+
+def create_appointment_store(backend="sqlite", **kwargs):
+    """
+    Create an appointment store
+
+    :param backend: "sqlite" or "memory"
+    :param kwargs: passed to the store (e.g. db_path for sqlite)
+    """
+    if backend == "sqlite":
+        return SQLiteAppointmentStore(**kwargs)
+    if backend == "memory":
+        return AppointmentStore(**kwargs)
+
+    raise ValueError(f"Value {backend} is not valid: must be sqlite or memory")
+
+
+def get_appointment_store():
+    """
+    Return the store shared by the agent nodes (configured with env variables).
+
+    A new SQLite calendar is initialized with the sample appointments.
+    """
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            backend = os.environ.get("APPOINTMENTS_STORE", "sqlite")
+
+            if backend == "sqlite":
+                _store = SQLiteAppointmentStore(
+                    os.environ.get("APPOINTMENTS_DB", "appointments.db")
+                )
+                _store.seed(SAMPLE_APPOINTMENTS)
+            else:
+                _store = create_appointment_store(
+                    backend, appointments=SAMPLE_APPOINTMENTS
+                )
+
+    return _store
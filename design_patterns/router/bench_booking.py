@@ -0,0 +1,141 @@
+"""
+Benchmark of concurrent bookings on the appointment stores
+
+Several threads try to book random slots on the same calendar.
+For every backend it reports the throughput (bookings attempted per sec.)
+and checks that no slot has been double-booked.
+
+Usage:
+    python bench_booking.py
+    python bench_booking.py --threads 16 --bookings 500 --days 30
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from appointment_store import create_appointment_store
+from meetings_api import format_time, parse_date, parse_time, set_appointment
+
+
+def random_requests(n_requests, n_days, seed):
+    """
+    Generate random booking requests (30 or 60 minutes, working hours)
+    """
+    rnd = random.Random(seed)
+    first_day = date(2025, 3, 1)
+    requests = []
+
+    for _ in range(n_requests):
+        day = first_day + timedelta(days=rnd.randrange(n_days))
+        start = rnd.randrange(8 * 60, 17 * 60, 15)
+        end = start + rnd.choice([30, 60])
+
+        requests.append((day.isoformat(), format_time(start), format_time(end)))
+
+    return requests
+
+
+def count_overlaps(store):
+    """
+    Count the pairs of overlapping appointments (must be zero)
+    """
+    by_day = {}
+    for app in store:
+        by_day.setdefault(parse_date(app["date"]), []).append(
+            (parse_time(app["start_time"]), parse_time(app["end_time"]))
+        )
+
+    overlaps = 0
+    for intervals in by_day.values():
+        intervals.sort()
+        for (_, end), (next_start, _) in zip(intervals, intervals[1:]):
+            if next_start < end:
+                overlaps += 1
+
+    return overlaps
+
+
+def run(store, n_threads, n_bookings, n_days):
+    """
+    Run the bookings in n_threads threads
+
+    Returns:
+        (elapsed_sec, n_booked)
+    """
+    booked = []
+    barrier = threading.Barrier(n_threads)
+
+    def worker(worker_id):
+        requests = random_requests(n_bookings, n_days, seed=worker_id)
+        n_ok = 0
+
+        barrier.wait()
+        for day, start, end in requests:
+            msg = set_appointment(
+                day, start, end, [f"user{worker_id}"], notes="bench", store=store
+            )
+            n_ok += msg.startswith("✅")
+
+        booked.append(n_ok)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+
+    return elapsed, sum(booked)
+
+
+def main():
+    """
+    Run the benchmark for all the backends
+    """
+    parser = argparse.ArgumentParser(description="Concurrent booking benchmark.")
+
+    parser.add_argument("--threads", type=int, default=8, help="number of threads.")
+    parser.add_argument(
+        "--bookings", type=int, default=250, help="bookings for each thread."
+    )
+    parser.add_argument("--days", type=int, default=20, help="days in the calendar.")
+
+    args = parser.parse_args()
+
+    total = args.threads * args.bookings
+
+    print("")
+    print(f"{args.threads} threads, {total} booking requests on {args.days} days")
+    print("")
+    print(
+        f"{'backend':<10} {'elapsed (s)':>12} {'req/sec':>10} {'booked':>8} {'overlaps':>9}"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        backends = {
+            "memory": {},
+            "sqlite": {"db_path": os.path.join(tmp_dir, "bench_appointments.db")},
+        }
+
+        for backend, kwargs in backends.items():
+            store = create_appointment_store(backend, **kwargs)
+
+            elapsed, n_booked = run(store, args.threads, args.bookings, args.days)
+
+            print(
+                f"{backend:<10} {elapsed:>12.2f} {total / elapsed:>10.0f} "
+                f"{n_booked:>8} {count_overlaps(store):>9}"
+            )
+
+    print("")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,208 +1,460 @@
 """
 Simulate the get_meetings and free slot API
+
+Appointments are kept in an AppointmentStore: they are parsed only once,
+indexed by date and, for each day, sorted by start time.
+Therefore range queries and the computation of free slots don't need
+to scan (and parse) all the appointments.
+
+Free slots are computed with minute resolution, merging the busy intervals
+of one or more calendars (for example, one for each participant).
+
+A persistent store (SQLite) with the same interface is in appointment_store.py
 """
 
+import re
+import threading
+from bisect import bisect_left, bisect_right, insort
 from datetime import datetime, timedelta
 
+# times accepted by set_appointment: 24h, or 12h with AM/PM
+TIME_PATTERN = re.compile(r"^(\d{1,2}):(\d{2})\s*([AaPp][Mm])?$")
+
+# working hours
+WORK_START = "8:00"
+WORK_END = "18:00"
+
 # meetings sample data
-appointments_dict = {
-    "appointments": [
-        {
-            "date": "2025-02-01",
-            "start_time": "9:00",
-            "end_time": "10:00",
-            "participants": ["John Doe"],
-            "notes": "Training Session",
-        },
-        {
-            "date": "2025-02-03",
-            "start_time": "11:00",
-            "end_time": "13:00",
-            "participants": ["Alice Brown"],
-            "notes": "One-on-One",
-        },
-        {
-            "date": "2025-02-03",
-            "start_time": "11:00",
-            "end_time": "13:00",
-            "participants": ["Michael Wilson", "Robert Johnson"],
-            "notes": "Planning Session",
-        },
-        {
-            "date": "2025-02-06",
-            "start_time": "17:00",
-            "end_time": "18:00",
-            "participants": ["Robert Johnson", "John Doe"],
-            "notes": "One-on-One",
-        },
-        {
-            "date": "2025-02-07",
-            "start_time": "16:00",
-            "end_time": "18:00",
-            "participants": ["Emily Davis"],
-            "notes": "Client Call",
-        },
-        {
-            "date": "2025-02-13",
-            "start_time": "15:00",
-            "end_time": "18:00",
-            "participants": ["John Doe", "Robert Johnson", "Alice Brown"],
-            "notes": "Client Call",
-        },
-        {
-            "date": "2025-02-14",
-            "start_time": "17:00",
-            "end_time": "18:00",
-            "participants": ["Michael Wilson", "Jane Smith"],
-            "notes": "Team Meeting",
-        },
-        {
-            "date": "2025-02-15",
-            "start_time": "16:00",
-            "end_time": "18:00",
-            "participants": ["Emily Davis"],
-            "notes": "One-on-One",
-        },
-        {
-            "date": "2025-02-15",
-            "start_time": "8:00",
-            "end_time": "10:00",
-            "participants": ["Michael Wilson"],
-            "notes": "Planning Session",
-        },
-        {
-            "date": "2025-02-16",
-            "start_time": "9:00",
-            "end_time": "12:00",
-            "participants": ["John Doe"],
-            "notes": "Client Call",
-        },
-        {
-            "date": "2025-02-19",
-            "start_time": "9:00",
-            "end_time": "10:00",
-            "participants": ["Robert Johnson", "Alice Brown"],
-            "notes": "One-on-One",
-        },
-        {
-            "date": "2025-02-20",
-            "start_time": "14:00",
-            "end_time": "17:00",
-            "participants": ["Michael Wilson", "Emily Davis", "Jane Smith"],
-            "notes": "Team Meeting",
-        },
-        {
-            "date": "2025-02-25",
-            "start_time": "14:00",
-            "end_time": "16:00",
-            "participants": ["Emily Davis"],
-            "notes": "Project Review",
-        },
-        {
-            "date": "2025-02-26",
-            "start_time": "13:00",
-            "end_time": "15:00",
-            "participants": ["Michael Wilson", "Alice Brown"],
-            "notes": "Team Meeting",
-        },
-        {
-            "date": "2025-02-28",
-            "start_time": "10:00",
-            "end_time": "12:00",
-            "participants": ["Robert Johnson", "Michael Wilson", "John Doe"],
-            "notes": "Planning Session",
-        },
-        {
-            "date": "2025-03-09",
-            "start_time": "13:00",
-            "end_time": "15:00",
-            "participants": ["Michael Wilson", "Alice Brown"],
-            "notes": "Birthday party",
-        },
-    ]
-}
+SAMPLE_APPOINTMENTS = [
+    {
+        "date": "2025-02-01",
+        "start_time": "9:00",
+        "end_time": "10:00",
+        "participants": ["John Doe"],
+        "notes": "Training Session",
+    },
+    {
+        "date": "2025-02-03",
+        "start_time": "11:00",
+        "end_time": "13:00",
+        "participants": ["Alice Brown"],
+        "notes": "One-on-One",
+    },
+    {
+        "date": "2025-02-03",
+        "start_time": "11:00",
+        "end_time": "13:00",
+        "participants": ["Michael Wilson", "Robert Johnson"],
+        "notes": "Planning Session",
+    },
+    {
+        "date": "2025-02-06",
+        "start_time": "17:00",
+        "end_time": "18:00",
+        "participants": ["Robert Johnson", "John Doe"],
+        "notes": "One-on-One",
+    },
+    {
+        "date": "2025-02-07",
+        "start_time": "16:00",
+        "end_time": "18:00",
+        "participants": ["Emily Davis"],
+        "notes": "Client Call",
+    },
+    {
+        "date": "2025-02-13",
+        "start_time": "15:00",
+        "end_time": "18:00",
+        "participants": ["John Doe", "Robert Johnson", "Alice Brown"],
+        "notes": "Client Call",
+    },
+    {
+        "date": "2025-02-14",
+        "start_time": "17:00",
+        "end_time": "18:00",
+        "participants": ["Michael Wilson", "Jane Smith"],
+        "notes": "Team Meeting",
+    },
+    {
+        "date": "2025-02-15",
+        "start_time": "16:00",
+        "end_time": "18:00",
+        "participants": ["Emily Davis"],
+        "notes": "One-on-One",
+    },
+    {
+        "date": "2025-02-15",
+        "start_time": "8:00",
+        "end_time": "10:00",
+        "participants": ["Michael Wilson"],
+        "notes": "Planning Session",
+    },
+    {
+        "date": "2025-02-16",
+        "start_time": "9:00",
+        "end_time": "12:00",
+        "participants": ["John Doe"],
+        "notes": "Client Call",
+    },
+    {
+        "date": "2025-02-19",
+        "start_time": "9:00",
+        "end_time": "10:00",
+        "participants": ["Robert Johnson", "Alice Brown"],
+        "notes": "One-on-One",
+    },
+    {
+        "date": "2025-02-20",
+        "start_time": "14:00",
+        "end_time": "17:00",
+        "participants": ["Michael Wilson", "Emily Davis", "Jane Smith"],
+        "notes": "Team Meeting",
+    },
+    {
+        "date": "2025-02-25",
+        "start_time": "14:00",
+        "end_time": "16:00",
+        "participants": ["Emily Davis"],
+        "notes": "Project Review",
+    },
+    {
+        "date": "2025-02-26",
+        "start_time": "13:00",
+        "end_time": "15:00",
+        "participants": ["Michael Wilson", "Alice Brown"],
+        "notes": "Team Meeting",
+    },
+    {
+        "date": "2025-02-28",
+        "start_time": "10:00",
+        "end_time": "12:00",
+        "participants": ["Robert Johnson", "Michael Wilson", "John Doe"],
+        "notes": "Planning Session",
+    },
+    {
+        "date": "2025-03-09",
+        "start_time": "13:00",
+        "end_time": "15:00",
+        "participants": ["Michael Wilson", "Alice Brown"],
+        "notes": "Birthday party",
+    },
+]
+
+
+def parse_time(time_str):
+    """
+    Convert a time ("HH:MM") in minutes from midnight
+    """
+    hours, minutes = time_str.split(":")
+
+    return int(hours) * 60 + int(minutes)
+
+
+def normalize_time(time_str):
+    """
+    Normalize a time given by the user or by a LLM ("9:00", "14:30",
+    "2:00 PM") to "HH:MM"
+
+    :raises ValueError: if it is not a valid time
+    """
+    match = TIME_PATTERN.match(str(time_str).strip())
+
+    if match is None:
+        raise ValueError(f"Value {time_str} is not valid: must be a time HH:MM")
+
+    hours, minutes, am_pm = int(match[1]), int(match[2]), (match[3] or "").upper()
+
+    if am_pm:
+        if not 1 <= hours <= 12:
+            raise ValueError(f"Value {time_str} is not valid: must be a time HH:MM")
+        hours = hours % 12 + (12 if am_pm == "PM" else 0)
+
+    if hours > 23 or minutes > 59:
+        raise ValueError(f"Value {time_str} is not valid: must be a time HH:MM")
+
+    return f"{hours:02d}:{minutes:02d}"
+
+
+def parse_date(date_str):
+    """
+    Convert a date ("YYYY-MM-DD") in a datetime.date
+    """
+    try:
+        # much faster than strptime
+        return datetime.fromisoformat(date_str).date()
+    except ValueError:
+        # not zero padded (e.g. 2025-2-1)
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+
+
+class AppointmentStore:
+    """
+    In-memory calendar, indexed by date.
+
+    For each day the entries are tuples (start_min, end_min, seq, appointment),
+    sorted by start time (seq keeps the insertion order for equal times).
+    The dates with appointments are kept in a sorted list, for range queries
+    with bisect: a query costs O(log n + k).
+    It is thread-safe: book() checks conflicts and adds in a single step.
+    """
+
+    def __init__(self, appointments=None):
+        """
+        appointments: list of appointment dictionaries (optional)
+        """
+        # date -> sorted list of entries
+        self.days = {}
+        # sorted list of the dates with appointments
+        self.dates = []
+        self.seq = 0
+        self.lock = threading.RLock()
+
+        for appointment in appointments or []:
+            self.add(appointment)
+
+    def add(self, appointment):
+        """
+        Add an appointment (no check on conflicts)
+        """
+        day = parse_date(appointment["date"])
+        start = parse_time(appointment["start_time"])
+        end = parse_time(appointment["end_time"])
+
+        with self.lock:
+            entry = (start, end, self.seq, appointment)
+            self.seq += 1
+
+            if day not in self.days:
+                self.days[day] = []
+                insort(self.dates, day)
+
+            insort(self.days[day], entry)
+
+    def find_conflicts(self, day, start, end):
+        """
+        Return the appointments overlapping [start, end) (minutes) on day
+        """
+        with self.lock:
+            entries = self.days.get(day, [])
+            # only entries starting before end can overlap
+            last = bisect_left(entries, (end,))
+
+            return [entry[3] for entry in entries[:last] if entry[1] > start]
+
+    def book(self, appointment):
+        """
+        Add the appointment only if it doesn't overlap existing ones.
+
+        :return: True if booked, False if the slot is taken
+        """
+        day = parse_date(appointment["date"])
+        start = parse_time(appointment["start_time"])
+        end = parse_time(appointment["end_time"])
+
+        with self.lock:
+            if self.find_conflicts(day, start, end):
+                return False
+
+            self.add(appointment)
+
+        return True
+
+    def on_date(self, day):
+        """
+        Return the entries for a day (datetime.date), sorted by start time
+        """
+        with self.lock:
+            return list(self.days.get(day, []))
+
+    def between(self, start_date, end_date=None):
+        """
+        Return the appointments between start_date and end_date (included)
+
+        :param start_date: datetime.date
+        :param end_date: datetime.date (optional, if None only start_date)
+        """
+        end_date = end_date or start_date
+
+        with self.lock:
+            first = bisect_left(self.dates, start_date)
+            last = bisect_right(self.dates, end_date)
+
+            return [
+                entry[3] for day in self.dates[first:last] for entry in self.days[day]
+            ]
+
+    def __len__(self):
+        return self.seq
+
+    def __iter__(self):
+        with self.lock:
+            appointments = [entry[3] for day in self.dates for entry in self.days[day]]
+
+        return iter(appointments)
+
+
+# the calendar used by the agent
+appointments_store = AppointmentStore(SAMPLE_APPOINTMENTS)
+
+
+def as_store(appointments):
+    """
+    Accept a store or a list of appointment dictionaries
+    """
+    if isinstance(appointments, AppointmentStore):
+        return appointments
+
+    return AppointmentStore(appointments)
 
 
 def filter_appointments(appointments, start_date, end_date=None):
     """
     Filters appointments based on a specific date or a date range.
 
-    :param appointments: List of dictionaries containing appointments.
+    :param appointments: AppointmentStore or list of dictionaries containing appointments.
     :param start_date: Single date or start of range (string format 'YYYY-MM-DD').
     :param end_date: End date of range (optional, string format 'YYYY-MM-DD').
     :return: List of filtered appointments.
     """
-    start_date = datetime.strptime(start_date, "%Y-%m-%d")
-    if end_date:
-        end_date = datetime.strptime(end_date, "%Y-%m-%d")
-    else:
-        end_date = start_date  # If not specified, use only the start_date
+    start_date = parse_date(start_date)
+    # If not specified, use only the start_date
+    end_date = parse_date(end_date) if end_date else start_date
+
+    return as_store(appointments).between(start_date, end_date)
 
-    filtered_appointments = [
-        app
-        for app in appointments
-        if start_date <= datetime.strptime(app["date"], "%Y-%m-%d") <= end_date
-    ]
 
-    return filtered_appointments
+def format_time(minutes):
+    """
+    Convert minutes from midnight in a time ("H:MM")
+    """
+    return f"{minutes // 60}:{minutes % 60:02d}"
 
 
-def find_free_slots(appointments, start_date, end_date=None):
+def merge_intervals(intervals):
     """
-    Finds free time slots within a given date range.
+    Merge overlapping (or adjacent) intervals, with a sweep over the sorted list.
 
-    :param appointments: List of appointment dictionaries.
-    :param start_date: Start date (string format 'YYYY-MM-DD').
-    :param end_date: End date (optional, string format 'YYYY-MM-DD').
-    :return: Dictionary with dates as keys and lists of free slots as values.
+    :param intervals: iterable of (start, end) in minutes
+    :return: sorted list of disjoint [start, end]
     """
-    WORK_START = 8  # Work starts at 8:00 AM
-    WORK_END = 18  # Work ends at 6:00 PM
+    merged = []
 
-    # Parse start and end dates
-    start_date = datetime.strptime(start_date, "%Y-%m-%d")
-    if end_date:
-        end_date = datetime.strptime(end_date, "%Y-%m-%d")
-    else:
-        end_date = start_date  # Single day case
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
 
-    # Create a dictionary to store free slots for each day
-    free_slots = {}
+    return merged
 
-    # Loop through each day in the range
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.strftime("%Y-%m-%d")
 
-        # Get appointments for the current date
-        day_appointments = filter_appointments(appointments, date_str)
+def free_intervals(busy, work_start, work_end, min_duration=0, granularity=1):
+    """
+    Compute the free intervals in the working hours of a day.
 
-        # Sort appointments by start time
-        day_appointments.sort(key=lambda x: datetime.strptime(x["start_time"], "%H:%M"))
+    :param busy: iterable of (start, end) in minutes (not necessarily sorted)
+    :param work_start: start of the working hours (minutes)
+    :param work_end: end of the working hours (minutes)
+    :param min_duration: slots shorter than this (minutes) are discarded
+    :param granularity: slots are aligned to multiples of it (minutes)
+    :return: list of (start, end)
+    """
+    # busy time is extended and free time shrunk to the grid
+    aligned = (
+        (start // granularity * granularity, -(-end // granularity) * granularity)
+        for start, end in busy
+    )
+    work_start = -(-work_start // granularity) * granularity
+    work_end = work_end // granularity * granularity
 
-        # Initialize free slots with the first available time before the first appointment
-        free_time = []
-        previous_end = WORK_START
+    free = []
+    previous_end = work_start
 
-        for app in day_appointments:
-            start_time = int(
-                app["start_time"].split(":")[0]
-            )  # Convert "HH:MM" to hour integer
-            end_time = int(app["end_time"].split(":")[0])
+    for start, end in merge_intervals(aligned):
+        if start >= work_end:
+            break
+        if start > previous_end:
+            free.append((previous_end, start))
+        previous_end = max(previous_end, end)
 
-            if start_time > previous_end:
-                free_time.append(
-                    f"{previous_end}:00 - {start_time}:00"
-                )  # Free time slot
+    if previous_end < work_end:
+        free.append((previous_end, work_end))
 
-            previous_end = max(previous_end, end_time)  # Update last occupied time
+    return [(start, end) for start, end in free if end - start >= max(min_duration, 1)]
 
-        # Add final free slot if there's time after the last appointment
-        if previous_end < WORK_END:
-            free_time.append(f"{previous_end}:00 - {WORK_END}:00")
 
-        # Store the free slots for the current date
-        free_slots[date_str] = free_time
+def busy_intervals(store, day, participants=None):
+    """
+    Return the busy intervals (start, end) for a day in a calendar.
+
+    :param store: AppointmentStore
+    :param day: datetime.date
+    :param participants: if provided, only appointments involving
+        at least one of them are considered
+    """
+    if participants is None:
+        return [(start, end) for start, end, _, _ in store.on_date(day)]
+
+    participants = set(participants)
+
+    return [
+        (start, end)
+        for start, end, _, appointment in store.on_date(day)
+        if participants.intersection(appointment.get("participants") or [])
+    ]
+
+
+def find_common_free_slots(
+    calendars,
+    start_date,
+    end_date=None,
+    participants=None,
+    min_duration=30,
+    granularity=1,
+    work_start=WORK_START,
+    work_end=WORK_END,
+):
+    """
+    Finds the time slots, in a date range, free for all the calendars.
+
+    The busy intervals of all calendars are merged, for every day,
+    with a single sweep: the cost is O(m log m) where m is the number
+    of appointments in the day.
+
+    :param calendars: list of calendars (AppointmentStore or list of appointments),
+        for example one for each participant
+    :param start_date: Start date (string format 'YYYY-MM-DD').
+    :param end_date: End date (optional, string format 'YYYY-MM-DD').
+    :param participants: if provided, only appointments involving them are busy time
+        (to use a single shared calendar)
+    :param min_duration: minimum duration (minutes) of the slots returned.
+    :param granularity: slots are aligned to multiples of it (minutes).
+    :param work_start: start of working hours (string format 'HH:MM').
+    :param work_end: end of working hours (string format 'HH:MM').
+    :return: Dictionary with dates as keys and lists of free slots as values.
+    """
+    stores = [as_store(calendar) for calendar in calendars]
+    work_start = parse_time(work_start)
+    work_end = parse_time(work_end)
+
+    start_date = parse_date(start_date)
+    # Single day case
+    end_date = parse_date(end_date) if end_date else start_date
+
+    free_slots = {}
+
+    current_date = start_date
+    while current_date <= end_date:
+        busy = []
+        for store in stores:
+            busy.extend(busy_intervals(store, current_date, participants))
+
+        free_slots[current_date.strftime("%Y-%m-%d")] = [
+            f"{format_time(start)} - {format_time(end)}"
+            for start, end in free_intervals(
+                busy, work_start, work_end, min_duration, granularity
+            )
+        ]
 
         # Move to the next day
         current_date += timedelta(days=1)
@@ -210,34 +462,68 @@ def find_free_slots(appointments, start_date, end_date=None):
     return free_slots
 
 
-def set_appointment(date, start_time, end_time, participants, notes=""):
+def find_free_slots(
+    appointments, start_date, end_date=None, min_duration=0, granularity=1
+):
+    """
+    Finds free time slots within a given date range.
+
+    :param appointments: AppointmentStore or list of appointment dictionaries.
+    :param start_date: Start date (string format 'YYYY-MM-DD').
+    :param end_date: End date (optional, string format 'YYYY-MM-DD').
+    :param min_duration: minimum duration (minutes) of the slots returned.
+    :param granularity: slots are aligned to multiples of it (minutes).
+    :return: Dictionary with dates as keys and lists of free slots as values.
+    """
+    return find_common_free_slots(
+        [appointments],
+        start_date,
+        end_date,
+        min_duration=min_duration,
+        granularity=granularity,
+    )
+
+
+def set_appointment(date, start_time, end_time, participants, notes="", store=None):
     """
     Adds a new appointment if the time slot is free.
 
+    The check for conflicts and the insert are done atomically by the store,
+    so concurrent requests can't book the same slot.
+
     :param date: The date of the appointment (YYYY-MM-DD).
-    :param start_time: The start time (HH:MM).
-    :param end_time: The end time (HH:MM).
+    :param start_time: The start time (HH:MM, or with AM/PM).
+    :param end_time: The end time (HH:MM, or with AM/PM).
     :param participants: List of participants.
     :param notes: Additional notes (optional).
+    :param store: the calendar (optional, default appointments_store).
     :return: Confirmation message.
     """
-    # Convert times to integers for easier comparison
-    new_start = int(start_time.split(":")[0])
-    new_end = int(end_time.split(":")[0])
+    if store is None:
+        store = appointments_store
+
+    # the values can come from a LLM: missing (None) or in other formats
+    if not date or not start_time or not end_time:
+        return (
+            f"❌ Cannot book appointment: date ({date}), start time ({start_time}) "
+            f"and end time ({end_time}) are all needed."
+        )
 
-    # Get existing appointments for the date
-    day_appointments = filter_appointments(appointments_dict["appointments"], date)
+    try:
+        date = parse_date(str(date).strip()).isoformat()
+    except ValueError:
+        return f"❌ Cannot book appointment: date {date} is not YYYY-MM-DD."
 
-    # Check for conflicts
-    for app in day_appointments:
-        existing_start = int(app["start_time"].split(":")[0])
-        existing_end = int(app["end_time"].split(":")[0])
+    try:
+        start_time = normalize_time(start_time)
+        end_time = normalize_time(end_time)
+    except ValueError as e:
+        return f"❌ Cannot book appointment: {e}"
 
-        if not (new_end <= existing_start or new_start >= existing_end):
-            return f"❌ Cannot book appointment on {date} from {start_time} to {end_time}. Slot is taken."
+    if parse_time(end_time) <= parse_time(start_time):
+        return f"❌ Cannot book appointment on {date}: end time {end_time} is not after start time {start_time}."
 
-    # Add the new appointment
-    appointments_dict["appointments"].append(
+    booked = store.book(
         {
             "date": date,
             "start_time": start_time,
@@ -247,4 +533,7 @@ def set_appointment(date, start_time, end_time, participants, notes=""):
         }
     )
 
+    if not booked:
+        return f"❌ Cannot book appointment on {date} from {start_time} to {end_time}. Slot is taken."
+
     return f"✅ Appointment set on {date} from {start_time} to {end_time}."
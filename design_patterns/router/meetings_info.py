@@ -17,7 +17,8 @@ from typing import Optional
 
 from agent_base_node import BaseAgentNode
 from structured_llm import StructuredLLM
-from meetings_api import appointments_dict, find_free_slots
+from meetings_api import find_free_slots
+from appointment_store import get_appointment_store
 
 
 class MeetingsInfoState(BaseModel):
@@ -68,7 +69,7 @@ class MeetingsInfo(BaseAgentNode):
 
         # call the meetings api to find free slots
         free_slots = find_free_slots(
-            appointments_dict["appointments"], result.start_date, result.end_date
+            get_appointment_store(), result.start_date, result.end_date
         )
 
         state.output = str(free_slots)
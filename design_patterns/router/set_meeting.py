@@ -15,7 +15,8 @@ from langchain_core.messages import HumanMessage, SystemMessage
 
 from agent_base_node import BaseAgentNode
 from structured_llm import StructuredLLM
-from meetings_api import appointments_dict, set_appointment
+from meetings_api import set_appointment
+from appointment_store import get_appointment_store
 from utils import extract_meeting_details
 
 
@@ -68,14 +69,14 @@ class SetMeeting(BaseAgentNode):
 
         print(result)
 
-        set_appointment(
+        # the shared (persistent) store checks conflicts atomically
+        state.output = set_appointment(
             result.date,
             result.start_hour,
             result.end_hour,
-            participants="",
+            participants=[],
             notes="Set by AI",
+            store=get_appointment_store(),
         )
 
-        state.output = f"meeting set on {result.date} from {result.start_hour} to {result.end_hour}"
-
         return state
@@ -19,6 +19,7 @@ parent_dir = os.path.abspath(os.path.join(os.getcwd(), ".."))
 sys.path.append(parent_dir)
 
 from config_private import COMPARTMENT_OCID
+from prompt_budget import PromptBudgeter
 
 
 class StructuredLLM:
@@ -72,6 +73,7 @@ class StructuredLLM:
         llm_endpoint: str = "https://inference.generativeai.eu-frankfurt-1.oci.oraclecloud.com",
         general_instructions: str = "",
         few_shot_examples: Optional[List[dict]] = None,
+        max_tokens: int = 1024,
     ):
         """
         Initializes an LLM with structured output support.
@@ -84,6 +86,7 @@ class StructuredLLM:
           Each example must have:
             - "input": Example user input.
             - "output": Example expected structured response.
+        - max_tokens (int, optional): max tokens in output. Defaults to 1024.
         """
         self.parser = PydanticOutputParser(pydantic_object=model)
         self.general_instructions = general_instructions
@@ -91,6 +94,9 @@ class StructuredLLM:
         # info regarding the LLM used
         self.llm_model_name = llm_model_name
         self.llm_endpoint = llm_endpoint
+        self.max_tokens = max_tokens
+        # to check locally that the prompt fits in the context window
+        self.budgeter = PromptBudgeter(llm_model_name, max_output_tokens=max_tokens)
 
         # Process few-shot examples into a formatted string
         self.few_shot_examples = ""
@@ -135,7 +141,7 @@ class StructuredLLM:
             compartment_id=COMPARTMENT_OCID,
             service_endpoint=self.llm_endpoint,
             # for deterministic outut temp=0
-            model_kwargs={"temperature": 0, "max_tokens": 1024},
+            model_kwargs={"temperature": 0, "max_tokens": self.max_tokens},
         )
 
         # Create the LCEL pipeline
@@ -152,7 +158,12 @@ class StructuredLLM:
 
         Returns:
         - Parsed structured response based on the given Pydantic model.
+
+        Raises:
+        - ContextBudgetExceeded: if the prompt doesn't fit in the context window.
         """
+        self.budgeter.check(self.prompt.format(input=user_input))
+
         return self.get_chain().invoke({"input": user_input})
 
     def get_prompt(self):
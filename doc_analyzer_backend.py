@@ -5,18 +5,62 @@ Functions for the Document Analyzer
 from typing_extensions import TypedDict
 from langgraph.graph import StateGraph, START, END
 
-from oci_models import create_model_for_answer_directly
+from oci_models import create_model_for_answer_directly, create_prompt_budgeter
 from oci_summarizer import OCISummarizer
-from oci_anonymizer import OCIAnonymizer
-from notification_queue import send_notification
+from oci_anonymizer import OCIAnonymizer, create_local_anonymizer
+from local_anonymizer import deanonymize
+from doc_analyzer_prompts import (
+    PROMPT_LAYOUTS,
+    TASKS,
+    build_combined_messages,
+    build_prefix_messages,
+    build_separate_prompt,
+    combined_parser,
+)
+from notification_queue import notify_progress, progress_config, send_notification
 from utils import get_console_logger
 
 logger = get_console_logger()
 
-# here we create the LLM. A single LLM is used
-# but, if needed, every tool can use a different LLM.
-# Every tool has a dedicated, focused prompt
-llm = create_model_for_answer_directly()
+# A single LLM is used but, if needed, every tool can use a different LLM.
+# Every tool has a dedicated, focused prompt (see doc_analyzer_prompts).
+# The LLM is not created at import: create_model_for_answer_directly
+# returns a new model for every call, on the OCI client shared by endpoint.
+
+
+# tokens left, in every prompt, for the instructions around the document
+# (all the tasks, in the combined layout)
+INSTRUCTIONS_TOKENS = 2500
+
+# tokens in output of every analysis call (the default of the model)
+TASK_MAX_TOKENS = 2048
+# tokens in output for the combined layout (all the analysis in one answer)
+COMBINED_MAX_TOKENS = 4000
+# the document is trimmed with the output tokens of the layout
+LAYOUT_MAX_TOKENS = {
+    "separate": TASK_MAX_TOKENS,
+    "prefix": TASK_MAX_TOKENS,
+    "combined": COMBINED_MAX_TOKENS,
+}
+
+# sections of the final report, in order: (node, title, state key)
+SECTIONS = [
+    ("call_llm_4", "Summary", "output4"),
+    ("call_llm_2", "Clarity", "output2"),
+    ("call_llm_3", "Goals", "output3"),
+    ("call_llm_5", "Timelines", "output5"),
+    ("call_llm_1", "Spelling errors", "output1"),
+]
+
+
+def format_header(file_name: str) -> str:
+    """Header of the report"""
+    return f"## Analysis of the document: {file_name}\n\n"
+
+
+def format_section(title: str, text: str) -> str:
+    """A section of the report"""
+    return f"### {title}:\n{text}\n\n"
 
 
 # Graph state
@@ -25,6 +69,9 @@ class State(TypedDict):
     The state of the workflow
     """
 
+    # id of the run, to publish progress events (optional)
+    run_id: str
+
     # user request, in UI not used
     request: str
     file_name: str
@@ -42,212 +89,176 @@ class State(TypedDict):
 
     final_output: str
 
+    # placeholder -> original entity (if the source is anonymized)
+    anonymization_mapping: dict
+
 
 # utility function
-def invoke_llm(task_name: str, request: str):
+def invoke_llm(task_name: str, request: str, run_id: str = None):
     """
     Function to handle LLM call
+
+    run_id: if provided, tokens and completion are notified on its channel
     """
     logger.info("Calling %s...", task_name)
 
     try:
-        msg = llm.invoke(request)
+        # too long requests are rejected here, before calling the service
+        create_prompt_budgeter(max_output_tokens=TASK_MAX_TOKENS).check(request)
+
+        llm = create_model_for_answer_directly(max_tokens=TASK_MAX_TOKENS)
+        msg = llm.invoke(request, config=progress_config(run_id, task_name))
         response = msg.content if msg else "Error: No response from LLM"
     except Exception as e:
         logger.error("%s failed: %s", task_name, e)
         response = "Error: Unable to process request"
 
-    send_notification(f"{task_name} completed!")
+    send_notification(f"{task_name} completed!", run_id=run_id)
     return response
 
 
 # Nodes/tools
-def call_llm_0(state: State) -> dict:
+def create_fit_node(prompt_layout: str):
     """
-    Extract the file name and read it
-
-    in the UI version this is not really needed
-    because the input is the uploaded file
+    Create the node that reads the document and trims it to fit, with the
+    output tokens of the analysis calls of the prompt layout
     """
-    logger.info("Calling llm_0...")
-
-    return {}
-
-
-def call_llm_1(state: State) -> dict:
-    """First LLM call to generate spelling errors list"""
-    top_e = 10
-    request = f"""
-    You are an expert proofreader with a keen eye for spelling accuracy. 
-    Your task is to identify and analyze the most frequent or impactful spelling errors in the provided text.
-
-    ### Instructions:
-    1. Identify the **top {top_e} most frequent or impactful spelling errors**.
-    2. List each error along with its **corrected form**.
-    3. If possible, explain any recurring spelling patterns or common mistakes found in the text.
-    4. Provide a **spelling accuracy score** from **1 to 10**, where:
-    - **10** means "no spelling errors detected."
-    - **1** means "severe spelling issues throughout the text."
-
-    ### Text for Analysis:
-    {state['file_text']}
-
-    ### Expected Response Format:
-    **Top {top_e} Spelling Errors:**
-    1. ...
-    2. ...
-    ...
-    
-    **Spelling Accuracy Score:** X/10  
-    **Observations:** [Brief analysis of error patterns, if applicable]  
-    """
-
-    response = invoke_llm("Check spelling errors", request)
-
-    return {"output1": response}
 
+    @notify_progress("call_llm_0")
+    def call_llm_0(state: State) -> dict:
+        """
+        Extract the file name and read it
 
-def call_llm_2(state: State) -> dict:
-    """Second LLM call to analyze clarity"""
-    request = f"""
-    You are an expert document reviewer with a strong focus on clarity and readability. 
-    Your task is to evaluate the following text based on clarity, coherence, and ease of understanding.
+        in the UI version this is not really needed
+        because the input is the uploaded file
+        """
+        logger.info("Calling llm_0...")
 
-    ### Evaluation Criteria:
-    1. **Clarity**: Is the text straightforward and free of ambiguity?
-    2. **Coherence**: Does the text flow logically from one idea to the next?
-    3. **Conciseness**: Is the information presented in a precise and to-the-point manner?
-    4. **Readability**: Would an average reader easily comprehend the content?
+        # the text is trimmed (once, for all the analysis) to fit in the context
+        budgeter = create_prompt_budgeter(
+            max_output_tokens=LAYOUT_MAX_TOKENS[prompt_layout]
+        )
+        file_text = budgeter.fit(
+            state["file_text"], reserved_tokens=INSTRUCTIONS_TOKENS
+        )
 
-    ### Instructions:
-    - Provide a clarity score from **1 to 10**, where **10** means "extremely clear" and **1** means "very unclear."
-    - Briefly **justify** your rating in 2-3 sentences.
-    - If the text has major issues, suggest **suggest specific improvements in a bullet-point list**.
+        return {"file_text": file_text}
 
-    ### Text for Evaluation:
-    {state['file_text']}
+    return call_llm_0
 
-    ### Expected Response Format:
-    **Clarity Score:** X/10  
-    **Justification:** [1-2 sentence explanation]  
-    **Suggested Improvements (if any):** [Specific ways to enhance clarity]  
-    """
 
-    response = invoke_llm("Check clarity", request)
+# the node of every task (in the state, output<n> is set by call_llm_<n>)
+TASK_NODES = {task_key: f"call_llm_{task_key[-1]}" for task_key in TASKS}
 
-    return {"output2": response}
 
+def create_task_node(task_key: str, prompt_layout: str):
+    """
+    Create the node for a task, with the prompt layout
+    """
+    task = TASKS[task_key]
 
-def call_llm_3(state: State) -> dict:
-    """Third LLM call to analyze goals"""
-    request = f"""
-    You are an expert in goal-setting and document evaluation. 
-    Your task is to assess whether the following text clearly defines **specific, measurable, and actionable goals**.
+    @notify_progress(TASK_NODES[task_key])
+    def call_llm(state: State) -> dict:
+        """LLM call for the task"""
+        if prompt_layout == "separate":
+            if task_key == "output4":
+                # the summarizer has its own prompt
+                logger.info("Calling summarizer...")
+                return {task_key: OCISummarizer().summarize(state["file_text"])}
 
-    ### **Evaluation Criteria:**
-    1. **Clarity**: Are the goals explicitly stated and easy to understand?
-    2. **Measurability**: Can the success of these goals be **quantified or objectively evaluated**?
-    3. **Actionability**: Do the goals provide clear steps or strategies for achieving them?
-    4. **Relevance**: Are the goals aligned with the overall purpose of the text?
+            request = build_separate_prompt(task_key, state["file_text"])
+        else:
+            request = build_prefix_messages(task_key, state["file_text"])
 
-    ### **Instructions:**
-    - Provide a **goal clarity score** from **1 to 10**, where:
-    - **10** = "Goals are exceptionally clear, measurable, and actionable."
-    - **1** = "Goals are vague, missing, or entirely unclear."
-    - Justify your rating in **2-3 sentences**.
-    - If the goals are unclear or lacking, **suggest specific improvements in a bullet-point list**.
+        response = invoke_llm(task["name"], request, state.get("run_id"))
 
-    ### **Text for Evaluation:**
-    {state['file_text']}
+        return {task_key: response}
 
-    ### **Expected Response Format:**
-    **Goal Clarity Score:** X/10  
-    **Justification:**  
-    [2-3 sentence explanation]  
+    return call_llm
 
-    **Suggested Improvements:**  
-    - [First improvement suggestion]  
-    - [Second improvement suggestion]  
-    - [Third improvement suggestion] (if applicable)  
-    """
 
-    response = invoke_llm("Check goals", request)
+@notify_progress("call_llm_combined")
+def call_llm_combined(state: State) -> dict:
+    """A single LLM call for all the tasks"""
+    logger.info("Calling combined analysis...")
 
-    return {"output3": response}
+    messages = build_combined_messages(state["file_text"])
 
+    try:
+        create_prompt_budgeter(max_output_tokens=COMBINED_MAX_TOKENS).check(messages)
 
-def call_llm_4(state: State) -> dict:
-    """Fourth LLM call to summarize"""
-    logger.info("Calling summarizer...")
+        llm = create_model_for_answer_directly(max_tokens=COMBINED_MAX_TOKENS)
+        msg = llm.invoke(
+            messages, config=progress_config(state.get("run_id"), "combined")
+        )
+        analysis = combined_parser.parse(msg.content)
 
-    summarizer = OCISummarizer()
+        outputs = analysis.model_dump()
+    except Exception as e:
+        logger.error("Combined analysis failed: %s", e)
+        outputs = {task_key: "Error: Unable to process request" for task_key in TASKS}
 
-    response = summarizer.summarize(state["file_text"])
+    send_notification("Combined analysis completed!", run_id=state.get("run_id"))
 
-    return {"output4": response}
+    return outputs
 
 
-def call_llm_5(state: State) -> dict:
-    """Fifth llm call to analyze timelines"""
-    request = f"""
-    You are an expert in project planning and deadline analysis.  
-    Your task is to evaluate the **timelines and deadlines** defined in the following document.
+@notify_progress("anonymizer")
+def call_llm_anonymize(state: State) -> dict:
+    """LLM call to anonymize"""
+    logger.info("Calling anonymizer...")
 
-    ### **Evaluation Criteria:**
-    1. **Clarity** - Are the timelines clearly stated and easy to follow?
-    2. **Realism** - Are the deadlines achievable based on the document's context?
-    3. **Consistency** -Do the timelines align with the overall objectives?
-    4. **Completeness** - Are key milestones, start dates, and end dates clearly outlined?
+    anonymizer = OCIAnonymizer()
 
-    ### **Instructions:**
-    - Identify any **gaps, inconsistencies, or unrealistic deadlines**.
-    - Provide a **timeline clarity score from 1 to 10**, where:
-    - **10** = "Timelines are clear, realistic, and well-structured."
-    - **1** = "Timelines are vague, inconsistent, or missing."
-    - If improvements are needed, list **specific suggestions in a bullet-point format**.
+    # anonimization is done on the aggregator's output
+    response = anonymizer.anonymize(state["combined_output"])
 
-    ### **Text for Analysis:**
-    {state['file_text']}
+    return {"final_output": response}
 
-    ### **Expected Response Format:**
-    **Timeline Clarity Score:** X/10  
-    **Observations:**  
-    [2-3 sentence explanation of findings]  
 
-    **Suggested Improvements:**  
-    - [First improvement suggestion]  
-    - [Second improvement suggestion]  
-    - [Third improvement suggestion] (if applicable)  
+@notify_progress("source_anonymizer")
+def call_source_anonymizer(state: State) -> dict:
     """
-    response = invoke_llm("Analyze timelines", request)
+    Anonymize the document once, before the analysis (local, reversible)
+    """
+    logger.info("Anonymizing the document...")
 
-    return {"output5": response}
+    anonymizer = create_local_anonymizer()
+    file_text = anonymizer.anonymize(state["file_text"])
 
+    return {"file_text": file_text, "anonymization_mapping": anonymizer.mapping}
 
-def call_llm_anonymize(state: State) -> dict:
-    """LLM call to anonymize"""
-    logger.info("Calling anonymizer...")
 
-    anonymizer = OCIAnonymizer()
+def create_restore_node(fields):
+    """
+    Create the node restoring the original entities in fields of the state
+    """
 
-    # anonimization is done on the aggregator's output
-    response = anonymizer.anonymize(state["combined_output"])
+    @notify_progress("restore")
+    def restore(state: State) -> dict:
+        """De-anonymize the selected fields"""
+        mapping = state.get("anonymization_mapping") or {}
 
-    return {"final_output": response}
+        return {
+            field: deanonymize(state[field], mapping)
+            for field in fields
+            if state.get(field)
+        }
+
+    return restore
 
 
+@notify_progress("aggregator")
 def aggregator(state: State) -> dict:
     """Combine all the outputs from steps into a single output"""
 
     logger.info("Aggregating outputs...")
 
     # here we can add whatever logic we want,
-    combined = f"## Analysis of the document: {state['file_name']}\n\n"
-    combined += f"### Summary:\n{state['output4']}\n\n"
-    combined += f"### Clarity:\n{state['output2']}\n\n"
-    combined += f"### Goals:\n{state['output3']}\n\n"
-    combined += f"### Timelines:\n{state['output5']}\n\n"
-    combined += f"### Spelling errors:\n{state['output1']}\n\n"
+    combined = format_header(state["file_name"])
+
+    for _, title, key in SECTIONS:
+        combined += format_section(title, state[key])
 
     return {"combined_output": combined}
 
@@ -255,42 +266,74 @@ def aggregator(state: State) -> dict:
 #
 # Here we build the graph
 #
-def build_workflow():
+def build_workflow(
+    anonymize_output: bool = True,
+    anonymize_source: bool = False,
+    restore_fields: tuple = (),
+    prompt_layout: str = "prefix",
+):
     """
     Build the workflow
+
+    anonymize_output: if False the anonymizer node is not added and the output
+    is combined_output (the caller anonymizes, e.g. while streaming)
+    anonymize_source: if True the document is anonymized (locally, with a
+    reversible mapping) before the analysis, so no LLM call sees the entities
+    in the gazetteer or matched by patterns. With it, anonymize_output can
+    be False, unless the LLM pass is needed for residual entities
+    restore_fields: with anonymize_source, fields of the state de-anonymized
+    at the end (e.g. ("combined_output",) to show the report with the names)
+    prompt_layout: "separate", "prefix" (the document first, shared by all the
+    calls, to exploit prompt caching) or "combined" (a single call)
     """
+    if prompt_layout not in PROMPT_LAYOUTS:
+        raise ValueError(
+            f"Value {prompt_layout} is not valid: must be one of {PROMPT_LAYOUTS}"
+        )
+
     # Build workflow
     parallel_builder = StateGraph(State)
 
     # Add nodes
-    parallel_builder.add_node("call_llm_0", call_llm_0)
-    parallel_builder.add_node("call_llm_1", call_llm_1)
-    parallel_builder.add_node("call_llm_2", call_llm_2)
-    parallel_builder.add_node("call_llm_3", call_llm_3)
-    parallel_builder.add_node("call_llm_4", call_llm_4)
-    parallel_builder.add_node("call_llm_5", call_llm_5)
-    parallel_builder.add_node("anonymizer", call_llm_anonymize)
+    parallel_builder.add_node("call_llm_0", create_fit_node(prompt_layout))
     parallel_builder.add_node("aggregator", aggregator)
 
     # Add edges to connect nodes
     parallel_builder.add_edge(START, "call_llm_0")
 
-    # parallel calls to work on different focused tasks
-    parallel_builder.add_edge("call_llm_0", "call_llm_1")
-    parallel_builder.add_edge("call_llm_0", "call_llm_2")
-    parallel_builder.add_edge("call_llm_0", "call_llm_3")
-    parallel_builder.add_edge("call_llm_0", "call_llm_4")
-    parallel_builder.add_edge("call_llm_0", "call_llm_5")
-
-    # to aggregator
-    parallel_builder.add_edge("call_llm_1", "aggregator")
-    parallel_builder.add_edge("call_llm_2", "aggregator")
-    parallel_builder.add_edge("call_llm_3", "aggregator")
-    parallel_builder.add_edge("call_llm_4", "aggregator")
-    parallel_builder.add_edge("call_llm_5", "aggregator")
-
-    parallel_builder.add_edge("aggregator", "anonymizer")
-    parallel_builder.add_edge("anonymizer", END)
+    fan_out_node = "call_llm_0"
+
+    if anonymize_source:
+        parallel_builder.add_node("source_anonymizer", call_source_anonymizer)
+        parallel_builder.add_edge("call_llm_0", "source_anonymizer")
+        fan_out_node = "source_anonymizer"
+
+    if prompt_layout == "combined":
+        task_nodes = ["call_llm_combined"]
+        parallel_builder.add_node("call_llm_combined", call_llm_combined)
+    else:
+        task_nodes = list(TASK_NODES.values())
+        for task_key, node in TASK_NODES.items():
+            parallel_builder.add_node(node, create_task_node(task_key, prompt_layout))
+
+    # parallel calls to work on different focused tasks, then to aggregator
+    for node in task_nodes:
+        parallel_builder.add_edge(fan_out_node, node)
+        parallel_builder.add_edge(node, "aggregator")
+
+    last_node = "aggregator"
+
+    if anonymize_output:
+        parallel_builder.add_node("anonymizer", call_llm_anonymize)
+        parallel_builder.add_edge(last_node, "anonymizer")
+        last_node = "anonymizer"
+
+    if anonymize_source and restore_fields:
+        parallel_builder.add_node("restore", create_restore_node(restore_fields))
+        parallel_builder.add_edge(last_node, "restore")
+        last_node = "restore"
+
+    parallel_builder.add_edge(last_node, END)
 
     parallel_workflow = parallel_builder.compile()
 
@@ -0,0 +1,237 @@
+"""
+Prompts for the Document Analyzer
+
+Every analysis (task) has its instructions and the expected response format.
+The prompts can be assembled with different layouts:
+    separate: one prompt for each task, with the document inside the
+        instructions (the original layout)
+    prefix: one call for each task, the document is in a system message,
+        identical in all the calls, followed by the instructions of the task:
+        the shared prefix can be cached by the provider
+    combined: a single call, the document in the system message and all the
+        tasks in one request, with a JSON output (DocAnalysis)
+"""
+
+from pydantic import BaseModel, Field
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.output_parsers import PydanticOutputParser
+
+from oci_summarizer import SUMMARIZER_INSTRUCTIONS, SUMMARIZER_RESPONSE_FORMAT
+
+PROMPT_LAYOUTS = ("separate", "prefix", "combined")
+
+TOP_ERRORS = 10
+
+# the tasks, by the key of the output in the state
+TASKS = {
+    "output1": {
+        "name": "Check spelling errors",
+        "instructions": f"""
+    You are an expert proofreader with a keen eye for spelling accuracy.
+    Your task is to identify and analyze the most frequent or impactful spelling errors in the provided text.
+
+    ### Instructions:
+    1. Identify the **top {TOP_ERRORS} most frequent or impactful spelling errors**.
+    2. List each error along with its **corrected form**.
+    3. If possible, explain any recurring spelling patterns or common mistakes found in the text.
+    4. Provide a **spelling accuracy score** from **1 to 10**, where:
+    - **10** means "no spelling errors detected."
+    - **1** means "severe spelling issues throughout the text."
+""",
+        "response_format": f"""
+    ### Expected Response Format:
+    **Top {TOP_ERRORS} Spelling Errors:**
+    1. ...
+    2. ...
+    ...
+
+    **Spelling Accuracy Score:** X/10
+    **Observations:** [Brief analysis of error patterns, if applicable]
+    """,
+    },
+    "output2": {
+        "name": "Check clarity",
+        "instructions": """
+    You are an expert document reviewer with a strong focus on clarity and readability.
+    Your task is to evaluate the following text based on clarity, coherence, and ease of understanding.
+
+    ### Evaluation Criteria:
+    1. **Clarity**: Is the text straightforward and free of ambiguity?
+    2. **Coherence**: Does the text flow logically from one idea to the next?
+    3. **Conciseness**: Is the information presented in a precise and to-the-point manner?
+    4. **Readability**: Would an average reader easily comprehend the content?
+
+    ### Instructions:
+    - Provide a clarity score from **1 to 10**, where **10** means "extremely clear" and **1** means "very unclear."
+    - Briefly **justify** your rating in 2-3 sentences.
+    - If the text has major issues, suggest **suggest specific improvements in a bullet-point list**.
+""",
+        "response_format": """
+    ### Expected Response Format:
+    **Clarity Score:** X/10
+    **Justification:** [1-2 sentence explanation]
+    **Suggested Improvements (if any):** [Specific ways to enhance clarity]
+    """,
+    },
+    "output3": {
+        "name": "Check goals",
+        "instructions": """
+    You are an expert in goal-setting and document evaluation.
+    Your task is to assess whether the following text clearly defines **specific, measurable, and actionable goals**.
+
+    ### **Evaluation Criteria:**
+    1. **Clarity**: Are the goals explicitly stated and easy to understand?
+    2. **Measurability**: Can the success of these goals be **quantified or objectively evaluated**?
+    3. **Actionability**: Do the goals provide clear steps or strategies for achieving them?
+    4. **Relevance**: Are the goals aligned with the overall purpose of the text?
+
+    ### **Instructions:**
+    - Provide a **goal clarity score** from **1 to 10**, where:
+    - **10** = "Goals are exceptionally clear, measurable, and actionable."
+    - **1** = "Goals are vague, missing, or entirely unclear."
+    - Justify your rating in **2-3 sentences**.
+    - If the goals are unclear or lacking, **suggest specific improvements in a bullet-point list**.
+""",
+        "response_format": """
+    ### **Expected Response Format:**
+    **Goal Clarity Score:** X/10
+    **Justification:**
+    [2-3 sentence explanation]
+
+    **Suggested Improvements:**
+    - [First improvement suggestion]
+    - [Second improvement suggestion]
+    - [Third improvement suggestion] (if applicable)
+    """,
+    },
+    "output4": {
+        "name": "Summarize",
+        "instructions": SUMMARIZER_INSTRUCTIONS,
+        "response_format": SUMMARIZER_RESPONSE_FORMAT,
+    },
+    "output5": {
+        "name": "Analyze timelines",
+        "instructions": """
+    You are an expert in project planning and deadline analysis.
+    Your task is to evaluate the **timelines and deadlines** defined in the following document.
+
+    ### **Evaluation Criteria:**
+    1. **Clarity** - Are the timelines clearly stated and easy to follow?
+    2. **Realism** - Are the deadlines achievable based on the document's context?
+    3. **Consistency** -Do the timelines align with the overall objectives?
+    4. **Completeness** - Are key milestones, start dates, and end dates clearly outlined?
+
+    ### **Instructions:**
+    - Identify any **gaps, inconsistencies, or unrealistic deadlines**.
+    - Provide a **timeline clarity score from 1 to 10**, where:
+    - **10** = "Timelines are clear, realistic, and well-structured."
+    - **1** = "Timelines are vague, inconsistent, or missing."
+    - If improvements are needed, list **specific suggestions in a bullet-point format**.
+""",
+        "response_format": """
+    ### **Expected Response Format:**
+    **Timeline Clarity Score:** X/10
+    **Observations:**
+    [2-3 sentence explanation of findings]
+
+    **Suggested Improvements:**
+    - [First improvement suggestion]
+    - [Second improvement suggestion]
+    - [Third improvement suggestion] (if applicable)
+    """,
+    },
+}
+
+# the shared prefix: must not depend on the task
+DOCUMENT_PREFIX_TEMPLATE = """
+You are an expert reviewer of documents.
+The document to analyze is between the <document> tags.
+The analysis to do is described in the next message.
+
+<document>
+{text}
+</document>
+"""
+
+
+class DocAnalysis(BaseModel):
+    """
+    Output of the combined layout: all the analyses, in markdown
+    """
+
+    output1: str = Field(description=f"{TASKS['output1']['name']}: the analysis")
+    output2: str = Field(description=f"{TASKS['output2']['name']}: the analysis")
+    output3: str = Field(description=f"{TASKS['output3']['name']}: the analysis")
+    output4: str = Field(description=f"{TASKS['output4']['name']}: the summary")
+    output5: str = Field(description=f"{TASKS['output5']['name']}: the analysis")
+
+
+combined_parser = PydanticOutputParser(pydantic_object=DocAnalysis)
+
+
+def build_separate_prompt(task_key, text):
+    """
+    The prompt with the document inside the instructions
+    """
+    task = TASKS[task_key]
+
+    return (
+        task["instructions"]
+        + f"""
+    ### Text for Analysis:
+    {text}
+"""
+        + task["response_format"]
+    )
+
+
+def build_prefix_messages(task_key, text):
+    """
+    The messages: document (shared prefix), then the task
+    """
+    task = TASKS[task_key]
+
+    return [
+        SystemMessage(content=DOCUMENT_PREFIX_TEMPLATE.format(text=text)),
+        HumanMessage(content=task["instructions"] + task["response_format"]),
+    ]
+
+
+def build_combined_messages(text):
+    """
+    The messages for all the tasks in a single call
+    """
+    request = "Do all the following analyses of the document.\n"
+
+    for task_key, task in TASKS.items():
+        request += f"\n## Analysis {task_key}: {task['name']}\n"
+        request += task["instructions"] + task["response_format"]
+
+    request += (
+        "\nReturn a JSON object, with the markdown of every analysis in the "
+        "field with the same name (output1...output5).\n"
+        + combined_parser.get_format_instructions()
+    )
+
+    return [
+        SystemMessage(content=DOCUMENT_PREFIX_TEMPLATE.format(text=text)),
+        HumanMessage(content=request),
+    ]
+
+
+def build_requests(text, prompt_layout="prefix"):
+    """
+    All the requests sent for a document with a layout
+
+    :return: list of prompts (str or list of messages)
+    """
+    if prompt_layout == "separate":
+        return [build_separate_prompt(task_key, text) for task_key in TASKS]
+    if prompt_layout == "prefix":
+        return [build_prefix_messages(task_key, text) for task_key in TASKS]
+    if prompt_layout == "combined":
+        return [build_combined_messages(text)]
+
+    raise ValueError(
+        f"Value {prompt_layout} is not valid: must be one of {PROMPT_LAYOUTS}"
+    )
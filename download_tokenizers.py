@@ -0,0 +1,56 @@
+"""
+Download the tokenizers used to count the tokens of the prompts
+
+Every tokenizer.json in TOKENIZER_SOURCES (prompt_budget.py) is downloaded
+from the Hugging Face hub and saved, with its name, in the tokenizer dir
+(budget_tokenizer_dir in config.toml). The models are gated: accept their
+license on the hub and use a token (or HF_TOKEN).
+
+Usage:
+    python download_tokenizers.py --token hf_xxx
+    python download_tokenizers.py --dir design_patterns/tokenizers
+"""
+
+import argparse
+import os
+import shutil
+
+from config_reader import get_config
+from prompt_budget import TOKENIZER_SOURCES
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+
+def main():
+    """
+    Download the tokenizers
+    """
+    parser = argparse.ArgumentParser(description="Download the tokenizers.")
+
+    parser.add_argument("--dir", help="where to save (default: from config).")
+    parser.add_argument("--token", help="Hugging Face token (or HF_TOKEN).")
+
+    args = parser.parse_args()
+
+    # imported here: needed only to download
+    from huggingface_hub import hf_hub_download
+
+    tokenizer_dir = (
+        args.dir
+        or get_config("config.toml").find_key("budget_tokenizer_dir")
+        or "tokenizers"
+    )
+    os.makedirs(tokenizer_dir, exist_ok=True)
+
+    for file_name, repo_id in TOKENIZER_SOURCES.items():
+        path = hf_hub_download(
+            repo_id, "tokenizer.json", token=args.token or os.getenv("HF_TOKEN")
+        )
+        shutil.copyfile(path, os.path.join(tokenizer_dir, file_name))
+
+        logger.info("Tokenizer of %s saved as %s", repo_id, file_name)
+
+
+if __name__ == "__main__":
+    main()
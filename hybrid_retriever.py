@@ -0,0 +1,276 @@
+"""
+Hybrid retriever: keyword + vector search on a 23AI collection
+
+The vector search alone misses queries with codes (product codes, part
+numbers...). The two rankings are combined with reciprocal rank fusion
+(RRF): score = sum(1 / (rrf_k + rank)).
+
+Keyword search:
+    oracle_text: CONTAINS on an Oracle Text index on the text column
+        (see OracleVS4DBLoading.create_text_index in db_loader).
+        Keyword search, vector search and fusion are done in a single
+        SQL statement (one round trip)
+    bm25: a local BM25 index, built by the DB loader when the documents
+        are loaded (bm25_index_dir), fused with the vector search
+
+Usage:
+    retriever = HybridRetriever(connection, "BOOKS", keyword_search="oracle_text")
+    docs_and_scores = retriever.search(question, query_vector, k=10)
+
+Both searches can be restricted with metadata filters (see metadata_filter).
+"""
+
+import array
+import json
+import os
+from functools import lru_cache
+
+from langchain_core.documents import Document
+
+from bm25_index import BM25Index, bm25_index_path, content_key, tokenize
+from metadata_filter import build_metadata_filter, matches_filter
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+KEYWORD_SEARCHES = ("oracle_text", "bm25")
+
+# RRF constant: reduces the weight of the first positions
+DEFAULT_RRF_K = 60
+
+HYBRID_SQL = """
+WITH vec AS (
+    SELECT id, ROW_NUMBER() OVER (
+        ORDER BY VECTOR_DISTANCE(embedding, :query_vector, COSINE)) AS rnk
+    FROM {table}
+    {where}
+    ORDER BY VECTOR_DISTANCE(embedding, :query_vector, COSINE)
+    FETCH FIRST :n_candidates ROWS ONLY
+),
+txt AS (
+    SELECT id, ROW_NUMBER() OVER (ORDER BY SCORE(1) DESC) AS rnk
+    FROM {table}
+    WHERE CONTAINS(text, :keywords, 1) > 0 {and_filter}
+    ORDER BY SCORE(1) DESC
+    FETCH FIRST :n_candidates ROWS ONLY
+)
+SELECT t.text, t.metadata,
+    NVL(1 / (:rrf_k + vec.rnk), 0) + NVL(1 / (:rrf_k + txt.rnk), 0) AS score
+FROM vec FULL OUTER JOIN txt ON vec.id = txt.id
+JOIN {table} t ON t.id = NVL(vec.id, txt.id)
+ORDER BY score DESC
+FETCH FIRST :k ROWS ONLY
+"""
+
+VECTOR_SQL = """
+SELECT text, metadata
+FROM {table}
+{where}
+ORDER BY VECTOR_DISTANCE(embedding, :query_vector, COSINE)
+FETCH FIRST :n_candidates ROWS ONLY
+"""
+
+
+@lru_cache(maxsize=8)
+def _load_bm25_index(path, mtime):
+    # mtime is in the key: the index is loaded again if the file changes
+    logger.info("Loading BM25 index %s", path)
+
+    return BM25Index.load(path)
+
+
+def load_bm25_index(path):
+    """
+    Load the BM25 index (cached, until the file changes)
+    """
+    return _load_bm25_index(path, os.path.getmtime(path))
+
+
+def to_oracle_text_query(question):
+    """
+    The query for CONTAINS: the words of the question, escaped, in ACCUM
+    (the more words a chunk contains, the higher the score)
+    """
+    # in braces the special chars (as "-") are not operators
+    return " ACCUM ".join(f"{{{token}}}" for token in dict.fromkeys(tokenize(question)))
+
+
+def to_document(text, metadata):
+    """
+    Build the Document from a row (LOBs and JSON as text are read)
+    """
+    if hasattr(text, "read"):
+        text = text.read()
+    if hasattr(metadata, "read"):
+        metadata = metadata.read()
+    if isinstance(metadata, (str, bytes)):
+        metadata = json.loads(metadata)
+
+    return Document(page_content=text, metadata=metadata or {})
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=DEFAULT_RRF_K):
+    """
+    Fuse rankings (lists of keys, best first)
+
+    :return: dict key -> RRF score
+    """
+    scores = {}
+
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+
+    return scores
+
+
+class HybridRetriever:
+    """
+    Keyword + vector search, fused with RRF
+    """
+
+    def __init__(
+        self,
+        connection,
+        collection_name,
+        keyword_search="oracle_text",
+        bm25_index_dir="bm25_indexes",
+        n_candidates=50,
+        rrf_k=DEFAULT_RRF_K,
+    ):
+        """
+        connection: an oracledb connection
+        collection_name: the table of the collection
+        keyword_search (str): oracle_text or bm25
+        bm25_index_dir (str): where the DB loader saves the BM25 indexes
+        n_candidates (int): results of each search, before the fusion
+        rrf_k (int): the RRF constant
+        """
+        if keyword_search not in KEYWORD_SEARCHES:
+            raise ValueError(
+                f"Value {keyword_search} is not valid: must be one of "
+                f"{KEYWORD_SEARCHES}"
+            )
+
+        self.connection = connection
+        self.collection_name = collection_name
+        self.keyword_search = keyword_search
+        self.bm25_index_dir = bm25_index_dir
+        self.n_candidates = n_candidates
+        self.rrf_k = rrf_k
+
+    def search(self, question, query_vector, k=10, filters=None):
+        """
+        Return the k best chunks (among the ones matching the filters)
+
+        :return: list of (Document, RRF score), best first
+        """
+        if self.keyword_search == "oracle_text":
+            return self._search_oracle_text(question, query_vector, k, filters)
+
+        return self._search_bm25(question, query_vector, k, filters)
+
+    def _vector_search(self, query_vector, filters=None):
+        """
+        The candidates of the vector search: list of Document
+        """
+        condition, binds = build_metadata_filter(filters)
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                VECTOR_SQL.format(
+                    table=self.collection_name,
+                    where=f"WHERE {condition}" if condition else "",
+                ),
+                query_vector=array.array("f", query_vector),
+                n_candidates=self.n_candidates,
+                **binds,
+            )
+
+            return [to_document(text, metadata) for text, metadata in cursor]
+
+    def _vector_only(self, query_vector, k, filters):
+        """
+        Only the vector search (no keywords): the scores are RRF of the rank,
+        on the same scale as the ones of the fused results
+        """
+        docs = self._vector_search(query_vector, filters)[:k]
+        scores = reciprocal_rank_fusion([range(len(docs))], rrf_k=self.rrf_k)
+
+        return [(doc, scores[i]) for i, doc in enumerate(docs)]
+
+    def _search_oracle_text(self, question, query_vector, k, filters):
+        """
+        Oracle Text + vector search in a single SQL statement
+        """
+        keywords = to_oracle_text_query(question)
+
+        if not keywords:
+            return self._vector_only(query_vector, k, filters)
+
+        condition, binds = build_metadata_filter(filters)
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                HYBRID_SQL.format(
+                    table=self.collection_name,
+                    where=f"WHERE {condition}" if condition else "",
+                    and_filter=f"AND {condition}" if condition else "",
+                ),
+                query_vector=array.array("f", query_vector),
+                keywords=keywords,
+                n_candidates=self.n_candidates,
+                rrf_k=self.rrf_k,
+                k=k,
+                **binds,
+            )
+
+            return [
+                (to_document(text, metadata), float(score))
+                for text, metadata, score in cursor
+            ]
+
+    def _search_bm25(self, question, query_vector, k, filters):
+        """
+        Local BM25 index + vector search, fused here
+        """
+        path = bm25_index_path(self.bm25_index_dir, self.collection_name)
+
+        if not os.path.exists(path):
+            logger.warning("BM25 index %s not found, only vector search", path)
+            return self._vector_only(query_vector, k, filters)
+
+        index = load_bm25_index(path)
+
+        vector_docs = {
+            content_key(doc.page_content): doc
+            for doc in self._vector_search(query_vector, filters)
+        }
+        if filters:
+            # all the results, then only the ones matching the filters
+            keyword_keys = [
+                key
+                for key, _ in index.search(question, k=len(index))
+                if matches_filter(index.documents[key][1], filters)
+            ][: self.n_candidates]
+        else:
+            keyword_keys = [
+                key for key, _ in index.search(question, k=self.n_candidates)
+            ]
+
+        scores = reciprocal_rank_fusion(
+            [list(vector_docs), keyword_keys], rrf_k=self.rrf_k
+        )
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+
+        results = []
+        for key in best:
+            doc = vector_docs.get(key)
+
+            if doc is None:
+                text, metadata = index.documents[key]
+                doc = Document(page_content=text, metadata=dict(metadata))
+
+            results.append((doc, scores[key]))
+
+        return results
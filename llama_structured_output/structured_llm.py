@@ -2,11 +2,19 @@
 Prototype for structured output with Llama 3.3
 """
 
+import sys
+import os
 from typing import List, Optional
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_community.chat_models import ChatOCIGenAI
+
+# to be able to import from parent directory
+parent_dir = os.path.abspath(os.path.join(os.getcwd(), ".."))
+sys.path.append(parent_dir)
+
 from config_private import COMPARTMENT_OCID
+from prompt_budget import PromptBudgeter
 
 
 class StructuredLLM:
@@ -59,6 +67,7 @@ class StructuredLLM:
         llm_model_name: str = "meta.llama-3.3-70b-instruct",
         llm_endpoint: str = "https://inference.generativeai.eu-frankfurt-1.oci.oraclecloud.com",
         few_shot_examples: Optional[List[dict]] = None,
+        max_tokens: int = 1024,
     ):
         """
         Initializes an LLM with structured output support.
@@ -71,11 +80,15 @@ class StructuredLLM:
           Each example must have:
             - "input": Example user input.
             - "output": Example expected structured response.
+        - max_tokens (int, optional): max tokens in output. Defaults to 1024.
         """
         self.parser = PydanticOutputParser(pydantic_object=model)
         self.format_instructions = self.parser.get_format_instructions()
         self.llm_model_name = llm_model_name
         self.llm_endpoint = llm_endpoint
+        self.max_tokens = max_tokens
+        # to check locally that the prompt fits in the context window
+        self.budgeter = PromptBudgeter(llm_model_name, max_output_tokens=max_tokens)
 
         # Process few-shot examples into a formatted string
         self.few_shot_examples = ""
@@ -117,7 +130,7 @@ class StructuredLLM:
             model_id=self.llm_model_name,
             compartment_id=COMPARTMENT_OCID,
             service_endpoint=self.llm_endpoint,
-            model_kwargs={"temperature": 0, "max_tokens": 1024},
+            model_kwargs={"temperature": 0, "max_tokens": self.max_tokens},
         )
 
         # Create the LCEL pipeline
@@ -134,5 +147,10 @@ class StructuredLLM:
 
         Returns:
         - Parsed structured response based on the given Pydantic model.
+
+        Raises:
+        - ContextBudgetExceeded: if the prompt doesn't fit in the context window.
         """
+        self.budgeter.check(self.prompt.format(input=user_input))
+
         return self.get_chain().invoke({"input": user_input})
@@ -0,0 +1,332 @@
+"""
+Local (deterministic) anonymizer
+
+Replaces PII with placeholders, without calling a LLM:
+    - emails, URLs and phone numbers, with regular expressions
+    - names of known people, customers, companies... from a gazetteer
+      (a JSON file: {"PERSON": ["John Smith", ...], "COMPANY": [...]}),
+      matched in a single pass with an Aho-Corasick automaton
+
+The same entity gets always the same placeholder (e.g. [PERSON_1]), so the
+text stays readable and can be restored with deanonymize.
+
+Usage:
+    anonymizer = LocalAnonymizer(load_gazetteer("anonymizer_gazetteer.json"))
+    text = anonymizer.anonymize(text)
+"""
+
+import json
+import os
+import re
+from collections import deque
+from functools import lru_cache
+
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+# entities found with regular expressions (in order of priority)
+PATTERNS = [
+    (
+        "URL",
+        re.compile(r"\b(?:https?://|www\.)[^\s<>()\"']*[^\s<>()\"'.,;:!?]"),
+    ),
+    ("EMAIL", re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b")),
+    (
+        "PHONE",
+        re.compile(
+            r"(?<![\w+.,/:-])(?:"
+            # international: +39 06 1234 5678, 0039 333 1234567, +1 (555) 123-4567
+            r"(?:\+|00)\d{1,3}(?:[ .-]?(?:\(\d{1,4}\)|\d{2,8})){2,5}"
+            # national, in groups: (555) 123-4567, 333 1234567, 02-1234-5678
+            r"|(?:\(\d{2,4}\) ?|\d{2,4}[ .-])\d{3,8}(?:[ .-]\d{2,4}){0,2}"
+            r")(?![\w(]|[.,:/-]\d)"
+        ),
+    ),
+]
+
+# a phone number has 9..15 digits (shorter sequences are dates, numbers...)
+MIN_PHONE_DIGITS = 9
+MAX_PHONE_DIGITS = 15
+
+# not phones, even if shaped as phones: dates and years, amounts
+DATE_PATTERN = re.compile(
+    r"^(?:\d{4}[-/.]\d{1,2}[-/.]\d{1,2}|\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4})"
+)
+YEARS = range(1900, 2100)
+
+# the text is matched by tokens: words or single punctuation chars
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+PLACEHOLDER_PATTERN = re.compile(r"\[([A-Z][A-Z_]*)_(\d+)\]")
+
+DEFAULT_KEEP_WORDS = ("Oracle",)
+
+
+def is_phone(candidate):
+    """
+    Check a match of the PHONE pattern: digits, and not a date, a list of
+    years or an amount
+    """
+    groups = re.findall(r"\d+", candidate)
+    n_digits = sum(len(group) for group in groups)
+
+    if not MIN_PHONE_DIGITS <= n_digits <= MAX_PHONE_DIGITS:
+        return False
+
+    if DATE_PATTERN.match(candidate):
+        return False
+
+    # e.g. "2023 2024 2025"
+    if all(len(group) == 4 and int(group) in YEARS for group in groups):
+        return False
+
+    # thousands, e.g. "123.456.789" or "123 456 789"
+    if (
+        candidate[0].isdigit()
+        and not candidate.startswith("00")
+        and len(groups[0]) <= 3
+        and all(len(group) == 3 for group in groups[1:])
+    ):
+        return False
+
+    return True
+
+
+def tokenize(text):
+    """
+    Return the tokens of text as (lowercase token, start, end)
+    """
+    return [
+        (match.group().lower(), match.start(), match.end())
+        for match in TOKEN_PATTERN.finditer(text)
+    ]
+
+
+class Gazetteer:
+    """
+    Dictionary of entities, matched with an Aho-Corasick automaton.
+
+    The alphabet of the automaton is made of tokens (lowercase words),
+    so matches are case insensitive and respect word boundaries.
+    """
+
+    def __init__(self, entities=None):
+        """
+        entities: dict label -> list of names
+        """
+        # the trie: goto[state] is a dict token -> state
+        self.goto = [{}]
+        self.fail = [0]
+        # output[state]: list of (n_tokens, label) of the names ending in state
+        self.output = [[]]
+        self.n_names = 0
+
+        for label, names in (entities or {}).items():
+            for name in names:
+                self.add(name, label)
+
+        self.build()
+
+    def add(self, name, label):
+        """
+        Add a name to the trie (build() must be called before matching)
+        """
+        tokens = [token for token, _, _ in tokenize(name)]
+
+        if not tokens:
+            return
+
+        state = 0
+        for token in tokens:
+            next_state = self.goto[state].get(token)
+
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][token] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+
+            state = next_state
+
+        self.output[state].append((len(tokens), label))
+        self.n_names += 1
+
+    def build(self):
+        """
+        Compute the failure links (breadth first)
+        """
+        queue = deque(self.goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+
+            for token, next_state in self.goto[state].items():
+                queue.append(next_state)
+
+                fail = self.fail[state]
+                while fail and token not in self.goto[fail]:
+                    fail = self.fail[fail]
+
+                self.fail[next_state] = self.goto[fail].get(token, 0)
+                self.output[next_state] = (
+                    self.output[next_state] + self.output[self.fail[next_state]]
+                )
+
+    def find(self, text):
+        """
+        Find all the names in text
+
+        :return: list of (start, end, label), overlapping matches included
+        """
+        if not self.n_names:
+            return []
+
+        lower_text = text.lower()
+        if len(lower_text) != len(text):
+            # rare: lowercase changes the length, positions would be wrong
+            lower_text = "".join(c if len(c.lower()) > 1 else c.lower() for c in text)
+
+        goto, fail, output = self.goto, self.fail, self.output
+        starts = []
+        matches = []
+
+        state = 0
+        for match in TOKEN_PATTERN.finditer(lower_text):
+            token = match.group()
+            starts.append(match.start())
+
+            while state and token not in goto[state]:
+                state = fail[state]
+
+            state = goto[state].get(token, 0)
+
+            for n_tokens, label in output[state]:
+                matches.append((starts[-n_tokens], match.end(), label))
+
+        return matches
+
+    def __len__(self):
+        return self.n_names
+
+
+@lru_cache(maxsize=8)
+def load_gazetteer(file_path):
+    """
+    Load (once) the gazetteer from a JSON file {label: [names]}.
+
+    If the file doesn't exist the gazetteer is empty.
+    """
+    if not file_path or not os.path.exists(file_path):
+        logger.warning("Gazetteer %s not found, only patterns are used", file_path)
+        return Gazetteer()
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        return Gazetteer(json.load(f))
+
+
+def deanonymize(text, mapping):
+    """
+    Restore the entities in text, using mapping (placeholder -> entity).
+
+    Unknown placeholders are left unchanged.
+    """
+    return PLACEHOLDER_PATTERN.sub(
+        lambda match: mapping.get(match.group(), match.group()), text
+    )
+
+
+class LocalAnonymizer:
+    """
+    Anonymizer based on patterns and gazetteer, with consistent placeholders
+    """
+
+    def __init__(self, gazetteer=None, keep_words=DEFAULT_KEEP_WORDS):
+        """
+        gazetteer: Gazetteer with the known entities (optional)
+        keep_words: words never anonymized (e.g. Oracle)
+        """
+        self.gazetteer = gazetteer or Gazetteer()
+        self.keep_words = {word.lower() for word in keep_words}
+
+        # (label, normalized entity) -> placeholder, and the reverse mapping
+        self.placeholders = {}
+        self.originals = {}
+        self.counters = {}
+
+    def _placeholder(self, label, entity):
+        """
+        Return the placeholder for entity (the same for the same entity)
+        """
+        key = (label, " ".join(entity.lower().split()))
+        placeholder = self.placeholders.get(key)
+
+        if placeholder is None:
+            self.counters[label] = self.counters.get(label, 0) + 1
+            placeholder = f"[{label}_{self.counters[label]}]"
+
+            self.placeholders[key] = placeholder
+            self.originals[placeholder] = entity
+
+        return placeholder
+
+    def find_entities(self, text):
+        """
+        Find the entities to anonymize
+
+        :return: list of (start, end, label), sorted and not overlapping
+        """
+        candidates = []
+
+        for label, pattern in PATTERNS:
+            for match in pattern.finditer(text):
+                if label == "PHONE" and not is_phone(match.group()):
+                    continue
+
+                candidates.append((match.start(), match.end(), label))
+
+        for start, end, label in self.gazetteer.find(text):
+            if text[start:end].lower() not in self.keep_words:
+                candidates.append((start, end, label))
+
+        # leftmost, then longest match wins
+        candidates.sort(key=lambda c: (c[0], c[0] - c[1]))
+
+        entities = []
+        last_end = 0
+        for start, end, label in candidates:
+            if start >= last_end:
+                entities.append((start, end, label))
+                last_end = end
+
+        return entities
+
+    def anonymize(self, text: str) -> str:
+        """
+        Replace the entities in text with placeholders
+        """
+        parts = []
+        position = 0
+
+        for start, end, label in self.find_entities(text):
+            parts.append(text[position:start])
+            parts.append(self._placeholder(label, text[start:end]))
+            position = end
+
+        parts.append(text[position:])
+
+        return "".join(parts)
+
+    def deanonymize(self, text: str) -> str:
+        """
+        Restore the original entities (unknown placeholders are left unchanged)
+        """
+        return deanonymize(text, self.originals)
+
+    @property
+    def mapping(self):
+        """
+        The placeholders used so far: placeholder -> original entity
+        """
+        return dict(self.originals)
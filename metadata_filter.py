@@ -0,0 +1,194 @@
+"""
+Metadata filters for the search in the 23AI collections
+
+A filter is a dict on the metadata of the chunks:
+    {"source": "manual.pdf"}                    equal
+    {"source": ["manual.pdf", "guide.pdf"]}     one of
+    {"page": {"gte": 10, "lte": 20}}            range (gt, gte, lt, lte, ne)
+
+The filter is translated in a SQL WHERE clause (with binds), so that
+only the chunks that match are compared with the query vector. The
+expressions are the ones of the metadata indexes
+(see OracleVS4DBLoading.create_metadata_index in db_loader).
+"""
+
+import re
+from operator import eq, ge, gt, le, lt, ne
+
+# metadata keys: used in the JSON path, can't be a bind
+KEY_PATTERN = re.compile(r"^[A-Za-z_]\w*$")
+
+OPERATORS = {"eq": "=", "ne": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+COMPARE = {"eq": eq, "ne": ne, "gt": gt, "gte": ge, "lt": lt, "lte": le}
+
+
+def json_value_expr(key, value):
+    """
+    The SQL expression of a metadata key (numeric if the value is a number)
+    """
+    if not KEY_PATTERN.match(key):
+        raise ValueError(f"Value {key} is not valid: must be a metadata key")
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"json_value(metadata, '$.{key}' RETURNING NUMBER)"
+
+    return f"json_value(metadata, '$.{key}')"
+
+
+def build_metadata_filter(filters, bind_prefix="f"):
+    """
+    Translate the filters in a SQL condition
+
+    :return: (condition, binds): condition is "" if there are no filters
+    """
+    conditions = []
+    binds = {}
+
+    def add_bind(value):
+        name = f"{bind_prefix}{len(binds)}"
+        binds[name] = value
+        return f":{name}"
+
+    for key, value in (filters or {}).items():
+        if isinstance(value, dict):
+            for operator, operand in value.items():
+                if operator not in OPERATORS:
+                    raise ValueError(
+                        f"Value {operator} is not valid: must be one of "
+                        f"{list(OPERATORS)}"
+                    )
+                conditions.append(
+                    f"{json_value_expr(key, operand)} {OPERATORS[operator]} "
+                    f"{add_bind(operand)}"
+                )
+        elif isinstance(value, (list, tuple, set)):
+            values = list(value)
+
+            if not values:
+                conditions.append("1 = 0")
+                continue
+
+            names = ", ".join(add_bind(item) for item in values)
+            conditions.append(f"{json_value_expr(key, values[0])} IN ({names})")
+        else:
+            conditions.append(f"{json_value_expr(key, value)} = {add_bind(value)}")
+
+    return " AND ".join(conditions), binds
+
+
+def matches_filter(metadata, filters):
+    """
+    Check the filters on the metadata of a chunk (for the local indexes)
+    """
+    for key, value in (filters or {}).items():
+        actual = metadata.get(key)
+
+        if isinstance(value, dict):
+            for operator, operand in value.items():
+                try:
+                    if actual is None or not COMPARE[operator](actual, operand):
+                        return False
+                except TypeError:
+                    return False
+        elif isinstance(value, (list, tuple, set)):
+            if actual not in value:
+                return False
+        elif actual != value:
+            return False
+
+    return True
+
+
+def metadata_columns(metadatas):
+    """
+    The metadata of many chunks as NumPy columns, one for each key,
+    to check the filters on all the chunks at once (see filter_mask)
+
+    :return: dict key -> (kind, values, present), kind is number, text or
+        object (mixed types, checked row by row)
+    """
+    # imported here: not needed to build the SQL filters
+    import numpy as np
+
+    keys = {key for metadata in metadatas for key in metadata}
+    columns = {}
+
+    for key in keys:
+        values = [metadata.get(key) for metadata in metadatas]
+        present = np.fromiter(
+            (value is not None for value in values), dtype=bool, count=len(values)
+        )
+        types = {type(value) for value in values if value is not None}
+
+        if types <= {int, float, bool}:
+            column = np.array(
+                [np.nan if value is None else value for value in values],
+                dtype=np.float64,
+            )
+            columns[key] = ("number", column, present)
+        elif types == {str}:
+            column = np.array(["" if value is None else value for value in values])
+            columns[key] = ("text", column, present)
+        else:
+            columns[key] = ("object", values, present)
+
+    return columns
+
+
+def filter_mask(columns, n_rows, filters):
+    """
+    The chunks matching the filters (same result as matches_filter)
+
+    columns: from metadata_columns
+    :return: NumPy bool array
+    """
+    # imported here: not needed to build the SQL filters
+    import numpy as np
+
+    mask = np.ones(n_rows, dtype=bool)
+
+    for key, value in (filters or {}).items():
+        if key not in columns:
+            # no chunk has the key
+            return np.zeros(n_rows, dtype=bool)
+
+        kind, column, present = columns[key]
+
+        if isinstance(value, dict):
+            conditions = list(value.items())
+        elif isinstance(value, (list, tuple, set)):
+            conditions = [("in", list(value))]
+        else:
+            conditions = [("eq", value)]
+
+        for operator, operand in conditions:
+            if operator != "in" and operator not in OPERATORS:
+                raise ValueError(
+                    f"Value {operator} is not valid: must be one of "
+                    f"{list(OPERATORS)}"
+                )
+
+            if kind == "object":
+                # mixed types: checked row by row
+                condition = {key: operand if operator == "in" else {operator: operand}}
+                mask &= np.fromiter(
+                    (matches_filter({key: item}, condition) for item in column),
+                    dtype=bool,
+                    count=n_rows,
+                )
+                continue
+
+            # a number and a text are never equal, and can't be ordered
+            column_type = str if kind == "text" else (int, float)
+
+            if operator == "in":
+                operands = [item for item in operand if isinstance(item, column_type)]
+                mask &= present & np.isin(column, operands)
+            elif not isinstance(operand, column_type):
+                mask &= present if operator == "ne" else False
+            else:
+                # operators (not ufuncs): they work also on text columns
+                mask &= present & COMPARE[operator](column, operand)
+
+    return mask
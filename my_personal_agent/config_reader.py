@@ -6,7 +6,9 @@ Python Version: 3.11
 
 Description:
     This file provide a class to handle the configuration
-    read from a toml file
+    read from a toml file.
+    Use get_config() to get a process-wide instance: the file is parsed
+    only once and keys are found with a lookup in a flat index.
 
 Inspired by:
 
@@ -27,22 +29,45 @@ Warnings:
     This module is in development, may change in future versions.
 """
 
+import os
+import threading
+import time
 import toml
 from utils import get_console_logger
 
+# ConfigReader instances shared in the process, by absolute file path
+_configs = {}
+_configs_lock = threading.Lock()
+
 
 class ConfigReader:
     """
     Read the configuration from a toml file
+
+    All the keys (in any section) are stored in a flat index,
+    so that find_key is a dictionary lookup.
+    If auto_reload is enabled the file is parsed again when modified
+    (the modification time is checked at most every reload_interval secs).
     """
 
-    def __init__(self, file_path):
+    def __init__(self, file_path, auto_reload=False, reload_interval=1.0):
         """
         Initializes the TOML reader and loads the file into memory.
         :param file_path: Path to the TOML file
+        :param auto_reload: if True, reload the file when it changes
+        :param reload_interval: min interval (sec.) between checks on the file
         """
         self.file_path = file_path
+        self.auto_reload = auto_reload
+        self.reload_interval = reload_interval
         self.data = None
+        # flat index: key name -> value
+        self.index = {}
+        # keys defined in more than one section
+        self.ambiguous_keys = {}
+        self.mtime = None
+        self.last_check = time.monotonic()
+        self.lock = threading.Lock()
         self.logger = get_console_logger()
         self.load_file()
 
@@ -51,14 +76,81 @@ class ConfigReader:
         Reads the TOML file and stores it in a dictionary.
         """
         try:
+            mtime = os.path.getmtime(self.file_path)
             with open(self.file_path, "r", encoding="utf-8") as f:
-                self.data = toml.load(f)
+                data = toml.load(f)
         except FileNotFoundError:
             self.logger.error("Error: The file %s does not exist.", self.file_path)
-            self.data = {}
+            mtime = None
+            data = {}
         except Exception as e:
             self.logger.error("Error while reading the TOML file: %s", e)
-            self.data = {}
+            mtime = None
+            data = {}
+
+        index, ambiguous_keys = self._build_index(data)
+
+        # swap all together, readers never see a partial update
+        self.data, self.index, self.ambiguous_keys = data, index, ambiguous_keys
+        self.mtime = mtime
+
+    def _build_index(self, data):
+        """
+        Build the flat index of all the keys.
+
+        Keys are visited in the same order of a depth-first search, therefore,
+        for keys defined more than once, the first definition wins.
+        :return: (index, ambiguous_keys)
+        """
+        index = {}
+        # key -> section where it is used
+        sections = {}
+        ambiguous_keys = {}
+
+        def visit(dictionary, section):
+            for k, v in dictionary.items():
+                if k not in index:
+                    index[k] = v
+                    sections[k] = section
+                else:
+                    ambiguous_keys.setdefault(k, [sections[k]]).append(section)
+
+                if isinstance(v, dict):
+                    visit(v, f"{section}.{k}" if section else k)
+
+        visit(data, "")
+
+        for k, where in ambiguous_keys.items():
+            self.logger.warning(
+                "Key %s is defined in more than one section (%s): using the first.",
+                k,
+                ", ".join(w or "<root>" for w in where),
+            )
+
+        return index, ambiguous_keys
+
+    def _reload_if_changed(self):
+        """
+        Reload the file if its modification time has changed.
+        """
+        now = time.monotonic()
+
+        if now - self.last_check < self.reload_interval:
+            return
+
+        with self.lock:
+            if now - self.last_check < self.reload_interval:
+                return
+            self.last_check = now
+
+            try:
+                mtime = os.path.getmtime(self.file_path)
+            except OSError:
+                return
+
+            if mtime != self.mtime:
+                self.logger.info("Reloading config file %s", self.file_path)
+                self.load_file()
 
     def find_key(self, key_name):
         """
@@ -66,19 +158,33 @@ class ConfigReader:
         :param key_name: Name of the key to search for
         :return: The value associated with the key if found, otherwise None
         """
+        if self.auto_reload:
+            self._reload_if_changed()
 
-        def recursive_search(dictionary, target_key):
-            for k, v in dictionary.items():
-                if k == target_key:
-                    return v
-                if isinstance(v, dict):
-                    result = recursive_search(v, target_key)
-                    if result is not None:
-                        return result
-            return None
-
-        # Search for the key in the already loaded file
-        if self.data is None:
-            self.logger.error("Error: No TOML file loaded.")
-            return None
-        return recursive_search(self.data, key_name)
+        return self.index.get(key_name)
+
+
+def get_config(file_path="config.toml", auto_reload=False):
+    """
+    Return the ConfigReader shared in the process for file_path.
+
+    The file is parsed only on the first call.
+    :param file_path: Path to the TOML file
+    :param auto_reload: if True, enable reload of the file when it changes
+    """
+    key = os.path.abspath(file_path)
+
+    config = _configs.get(key)
+
+    if config is None:
+        with _configs_lock:
+            config = _configs.get(key)
+
+            if config is None:
+                config = ConfigReader(file_path, auto_reload=auto_reload)
+                _configs[key] = config
+
+    if auto_reload:
+        config.auto_reload = True
+
+    return config
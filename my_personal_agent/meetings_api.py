@@ -1,210 +1,417 @@
 """
 Simulate the get_meetings and free slot API
+
+Appointments are kept in an AppointmentStore: they are parsed only once,
+indexed by date and, for each day, sorted by start time.
+Therefore range queries and the computation of free slots don't need
+to scan (and parse) all the appointments.
+
+Free slots are computed with minute resolution, merging the busy intervals
+of one or more calendars (for example, one for each participant).
 """
 
+from bisect import bisect_left, bisect_right, insort
 from datetime import datetime, timedelta
 
+# working hours
+WORK_START = "8:00"
+WORK_END = "18:00"
+
 # meetings sample data
-appointments_dict = {
-    "appointments": [
-        {
-            "date": "2025-02-01",
-            "start_time": "9:00",
-            "end_time": "10:00",
-            "participants": ["John Doe"],
-            "notes": "Training Session",
-        },
-        {
-            "date": "2025-02-03",
-            "start_time": "11:00",
-            "end_time": "13:00",
-            "participants": ["Alice Brown"],
-            "notes": "One-on-One",
-        },
-        {
-            "date": "2025-02-03",
-            "start_time": "11:00",
-            "end_time": "13:00",
-            "participants": ["Michael Wilson", "Robert Johnson"],
-            "notes": "Planning Session",
-        },
-        {
-            "date": "2025-02-06",
-            "start_time": "17:00",
-            "end_time": "18:00",
-            "participants": ["Robert Johnson", "John Doe"],
-            "notes": "One-on-One",
-        },
-        {
-            "date": "2025-02-07",
-            "start_time": "16:00",
-            "end_time": "18:00",
-            "participants": ["Emily Davis"],
-            "notes": "Client Call",
-        },
-        {
-            "date": "2025-02-13",
-            "start_time": "15:00",
-            "end_time": "18:00",
-            "participants": ["John Doe", "Robert Johnson", "Alice Brown"],
-            "notes": "Client Call",
-        },
-        {
-            "date": "2025-02-14",
-            "start_time": "17:00",
-            "end_time": "18:00",
-            "participants": ["Michael Wilson", "Jane Smith"],
-            "notes": "Team Meeting",
-        },
-        {
-            "date": "2025-02-15",
-            "start_time": "16:00",
-            "end_time": "18:00",
-            "participants": ["Emily Davis"],
-            "notes": "One-on-One",
-        },
-        {
-            "date": "2025-02-15",
-            "start_time": "8:00",
-            "end_time": "10:00",
-            "participants": ["Michael Wilson"],
-            "notes": "Planning Session",
-        },
-        {
-            "date": "2025-02-16",
-            "start_time": "9:00",
-            "end_time": "12:00",
-            "participants": ["John Doe"],
-            "notes": "Client Call",
-        },
-        {
-            "date": "2025-02-19",
-            "start_time": "9:00",
-            "end_time": "10:00",
-            "participants": ["Robert Johnson", "Alice Brown"],
-            "notes": "One-on-One",
-        },
-        {
-            "date": "2025-02-20",
-            "start_time": "14:00",
-            "end_time": "17:00",
-            "participants": ["Michael Wilson", "Emily Davis", "Jane Smith"],
-            "notes": "Team Meeting",
-        },
-        {
-            "date": "2025-02-25",
-            "start_time": "14:00",
-            "end_time": "16:00",
-            "participants": ["Emily Davis"],
-            "notes": "Project Review",
-        },
-        {
-            "date": "2025-02-26",
-            "start_time": "13:00",
-            "end_time": "15:00",
-            "participants": ["Michael Wilson", "Alice Brown"],
-            "notes": "Team Meeting",
-        },
-        {
-            "date": "2025-02-28",
-            "start_time": "10:00",
-            "end_time": "12:00",
-            "participants": ["Robert Johnson", "Michael Wilson", "John Doe"],
-            "notes": "Planning Session",
-        },
-        {
-            "date": "2025-03-09",
-            "start_time": "13:00",
-            "end_time": "15:00",
-            "participants": ["Michael Wilson", "Alice Brown"],
-            "notes": "Birthday party",
-        },
-    ]
-}
+SAMPLE_APPOINTMENTS = [
+    {
+        "date": "2025-02-01",
+        "start_time": "9:00",
+        "end_time": "10:00",
+        "participants": ["John Doe"],
+        "notes": "Training Session",
+    },
+    {
+        "date": "2025-02-03",
+        "start_time": "11:00",
+        "end_time": "13:00",
+        "participants": ["Alice Brown"],
+        "notes": "One-on-One",
+    },
+    {
+        "date": "2025-02-03",
+        "start_time": "11:00",
+        "end_time": "13:00",
+        "participants": ["Michael Wilson", "Robert Johnson"],
+        "notes": "Planning Session",
+    },
+    {
+        "date": "2025-02-06",
+        "start_time": "17:00",
+        "end_time": "18:00",
+        "participants": ["Robert Johnson", "John Doe"],
+        "notes": "One-on-One",
+    },
+    {
+        "date": "2025-02-07",
+        "start_time": "16:00",
+        "end_time": "18:00",
+        "participants": ["Emily Davis"],
+        "notes": "Client Call",
+    },
+    {
+        "date": "2025-02-13",
+        "start_time": "15:00",
+        "end_time": "18:00",
+        "participants": ["John Doe", "Robert Johnson", "Alice Brown"],
+        "notes": "Client Call",
+    },
+    {
+        "date": "2025-02-14",
+        "start_time": "17:00",
+        "end_time": "18:00",
+        "participants": ["Michael Wilson", "Jane Smith"],
+        "notes": "Team Meeting",
+    },
+    {
+        "date": "2025-02-15",
+        "start_time": "16:00",
+        "end_time": "18:00",
+        "participants": ["Emily Davis"],
+        "notes": "One-on-One",
+    },
+    {
+        "date": "2025-02-15",
+        "start_time": "8:00",
+        "end_time": "10:00",
+        "participants": ["Michael Wilson"],
+        "notes": "Planning Session",
+    },
+    {
+        "date": "2025-02-16",
+        "start_time": "9:00",
+        "end_time": "12:00",
+        "participants": ["John Doe"],
+        "notes": "Client Call",
+    },
+    {
+        "date": "2025-02-19",
+        "start_time": "9:00",
+        "end_time": "10:00",
+        "participants": ["Robert Johnson", "Alice Brown"],
+        "notes": "One-on-One",
+    },
+    {
+        "date": "2025-02-20",
+        "start_time": "14:00",
+        "end_time": "17:00",
+        "participants": ["Michael Wilson", "Emily Davis", "Jane Smith"],
+        "notes": "Team Meeting",
+    },
+    {
+        "date": "2025-02-25",
+        "start_time": "14:00",
+        "end_time": "16:00",
+        "participants": ["Emily Davis"],
+        "notes": "Project Review",
+    },
+    {
+        "date": "2025-02-26",
+        "start_time": "13:00",
+        "end_time": "15:00",
+        "participants": ["Michael Wilson", "Alice Brown"],
+        "notes": "Team Meeting",
+    },
+    {
+        "date": "2025-02-28",
+        "start_time": "10:00",
+        "end_time": "12:00",
+        "participants": ["Robert Johnson", "Michael Wilson", "John Doe"],
+        "notes": "Planning Session",
+    },
+    {
+        "date": "2025-03-09",
+        "start_time": "13:00",
+        "end_time": "15:00",
+        "participants": ["Michael Wilson", "Alice Brown"],
+        "notes": "Birthday party",
+    },
+]
+
+
+def parse_time(time_str):
+    """
+    Convert a time ("HH:MM") in minutes from midnight
+    """
+    hours, minutes = time_str.split(":")
+
+    return int(hours) * 60 + int(minutes)
+
+
+def parse_date(date_str):
+    """
+    Convert a date ("YYYY-MM-DD") in a datetime.date
+    """
+    try:
+        # much faster than strptime
+        return datetime.fromisoformat(date_str).date()
+    except ValueError:
+        # not zero padded (e.g. 2025-2-1)
+        return datetime.strptime(date_str, "%Y-%m-%d").date()
+
+
+class AppointmentStore:
+    """
+    In-memory calendar, indexed by date.
+
+    For each day the entries are tuples (start_min, end_min, seq, appointment),
+    sorted by start time (seq keeps the insertion order for equal times).
+    The dates with appointments are kept in a sorted list, for range queries
+    with bisect: a query costs O(log n + k).
+    """
+
+    def __init__(self, appointments=None):
+        """
+        appointments: list of appointment dictionaries (optional)
+        """
+        # date -> sorted list of entries
+        self.days = {}
+        # sorted list of the dates with appointments
+        self.dates = []
+        self.seq = 0
+
+        for appointment in appointments or []:
+            self.add(appointment)
+
+    def add(self, appointment):
+        """
+        Add an appointment (no check on conflicts)
+        """
+        day = parse_date(appointment["date"])
+        entry = (
+            parse_time(appointment["start_time"]),
+            parse_time(appointment["end_time"]),
+            self.seq,
+            appointment,
+        )
+        self.seq += 1
+
+        if day not in self.days:
+            self.days[day] = []
+            insort(self.dates, day)
+
+        insort(self.days[day], entry)
+
+    def on_date(self, day):
+        """
+        Return the entries for a day (datetime.date), sorted by start time
+        """
+        return self.days.get(day, [])
+
+    def between(self, start_date, end_date=None):
+        """
+        Return the appointments between start_date and end_date (included)
+
+        :param start_date: datetime.date
+        :param end_date: datetime.date (optional, if None only start_date)
+        """
+        end_date = end_date or start_date
+
+        first = bisect_left(self.dates, start_date)
+        last = bisect_right(self.dates, end_date)
+
+        return [entry[3] for day in self.dates[first:last] for entry in self.days[day]]
+
+    def __len__(self):
+        return self.seq
+
+    def __iter__(self):
+        for day in self.dates:
+            for entry in self.days[day]:
+                yield entry[3]
+
+
+# the calendar used by the agent
+appointments_store = AppointmentStore(SAMPLE_APPOINTMENTS)
+
+
+def as_store(appointments):
+    """
+    Accept a store or a list of appointment dictionaries
+    """
+    if isinstance(appointments, AppointmentStore):
+        return appointments
+
+    return AppointmentStore(appointments)
 
 
 def filter_appointments(appointments, start_date, end_date=None):
     """
     Filters appointments based on a specific date or a date range.
 
-    :param appointments: List of dictionaries containing appointments.
+    :param appointments: AppointmentStore or list of dictionaries containing appointments.
     :param start_date: Single date or start of range (string format 'YYYY-MM-DD').
     :param end_date: End date of range (optional, string format 'YYYY-MM-DD').
     :return: List of filtered appointments.
     """
-    start_date = datetime.strptime(start_date, "%Y-%m-%d")
-    if end_date:
-        end_date = datetime.strptime(end_date, "%Y-%m-%d")
-    else:
-        end_date = start_date  # If not specified, use only the start_date
+    start_date = parse_date(start_date)
+    # If not specified, use only the start_date
+    end_date = parse_date(end_date) if end_date else start_date
+
+    return as_store(appointments).between(start_date, end_date)
 
-    filtered_appointments = [
-        app
-        for app in appointments
-        if start_date <= datetime.strptime(app["date"], "%Y-%m-%d") <= end_date
-    ]
 
-    return filtered_appointments
+def format_time(minutes):
+    """
+    Convert minutes from midnight in a time ("H:MM")
+    """
+    return f"{minutes // 60}:{minutes % 60:02d}"
 
 
-def find_free_slots(appointments, start_date, end_date=None):
+def merge_intervals(intervals):
     """
-    Finds free time slots within a given date range.
+    Merge overlapping (or adjacent) intervals, with a sweep over the sorted list.
 
-    :param appointments: List of appointment dictionaries.
-    :param start_date: Start date (string format 'YYYY-MM-DD').
-    :param end_date: End date (optional, string format 'YYYY-MM-DD').
-    :return: Dictionary with dates as keys and lists of free slots as values.
+    :param intervals: iterable of (start, end) in minutes
+    :return: sorted list of disjoint [start, end]
     """
-    WORK_START = 8  # Work starts at 8:00 AM
-    WORK_END = 18  # Work ends at 6:00 PM
+    merged = []
 
-    # Parse start and end dates
-    start_date = datetime.strptime(start_date, "%Y-%m-%d")
-    if end_date:
-        end_date = datetime.strptime(end_date, "%Y-%m-%d")
-    else:
-        end_date = start_date  # Single day case
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
 
-    # Create a dictionary to store free slots for each day
-    free_slots = {}
+    return merged
 
-    # Loop through each day in the range
-    current_date = start_date
-    while current_date <= end_date:
-        date_str = current_date.strftime("%Y-%m-%d")
 
-        # Get appointments for the current date
-        day_appointments = filter_appointments(appointments, date_str)
+def free_intervals(busy, work_start, work_end, min_duration=0, granularity=1):
+    """
+    Compute the free intervals in the working hours of a day.
+
+    :param busy: iterable of (start, end) in minutes (not necessarily sorted)
+    :param work_start: start of the working hours (minutes)
+    :param work_end: end of the working hours (minutes)
+    :param min_duration: slots shorter than this (minutes) are discarded
+    :param granularity: slots are aligned to multiples of it (minutes)
+    :return: list of (start, end)
+    """
+    # busy time is extended and free time shrunk to the grid
+    aligned = (
+        (start // granularity * granularity, -(-end // granularity) * granularity)
+        for start, end in busy
+    )
+    work_start = -(-work_start // granularity) * granularity
+    work_end = work_end // granularity * granularity
+
+    free = []
+    previous_end = work_start
+
+    for start, end in merge_intervals(aligned):
+        if start >= work_end:
+            break
+        if start > previous_end:
+            free.append((previous_end, start))
+        previous_end = max(previous_end, end)
+
+    if previous_end < work_end:
+        free.append((previous_end, work_end))
+
+    return [(start, end) for start, end in free if end - start >= max(min_duration, 1)]
+
+
+def busy_intervals(store, day, participants=None):
+    """
+    Return the busy intervals (start, end) for a day in a calendar.
+
+    :param store: AppointmentStore
+    :param day: datetime.date
+    :param participants: if provided, only appointments involving
+        at least one of them are considered
+    """
+    if participants is None:
+        return [(start, end) for start, end, _, _ in store.on_date(day)]
+
+    participants = set(participants)
+
+    return [
+        (start, end)
+        for start, end, _, appointment in store.on_date(day)
+        if participants.intersection(appointment.get("participants") or [])
+    ]
 
-        # Sort appointments by start time
-        day_appointments.sort(key=lambda x: datetime.strptime(x["start_time"], "%H:%M"))
 
-        # Initialize free slots with the first available time before the first appointment
-        free_time = []
-        previous_end = WORK_START
+def find_common_free_slots(
+    calendars,
+    start_date,
+    end_date=None,
+    participants=None,
+    min_duration=30,
+    granularity=1,
+    work_start=WORK_START,
+    work_end=WORK_END,
+):
+    """
+    Finds the time slots, in a date range, free for all the calendars.
 
-        for app in day_appointments:
-            start_time = int(
-                app["start_time"].split(":")[0]
-            )  # Convert "HH:MM" to hour integer
-            end_time = int(app["end_time"].split(":")[0])
+    The busy intervals of all calendars are merged, for every day,
+    with a single sweep: the cost is O(m log m) where m is the number
+    of appointments in the day.
+
+    :param calendars: list of calendars (AppointmentStore or list of appointments),
+        for example one for each participant
+    :param start_date: Start date (string format 'YYYY-MM-DD').
+    :param end_date: End date (optional, string format 'YYYY-MM-DD').
+    :param participants: if provided, only appointments involving them are busy time
+        (to use a single shared calendar)
+    :param min_duration: minimum duration (minutes) of the slots returned.
+    :param granularity: slots are aligned to multiples of it (minutes).
+    :param work_start: start of working hours (string format 'HH:MM').
+    :param work_end: end of working hours (string format 'HH:MM').
+    :return: Dictionary with dates as keys and lists of free slots as values.
+    """
+    stores = [as_store(calendar) for calendar in calendars]
+    work_start = parse_time(work_start)
+    work_end = parse_time(work_end)
 
-            if start_time > previous_end:
-                free_time.append(
-                    f"{previous_end}:00 - {start_time}:00"
-                )  # Free time slot
+    start_date = parse_date(start_date)
+    # Single day case
+    end_date = parse_date(end_date) if end_date else start_date
 
-            previous_end = max(previous_end, end_time)  # Update last occupied time
+    free_slots = {}
 
-        # Add final free slot if there's time after the last appointment
-        if previous_end < WORK_END:
-            free_time.append(f"{previous_end}:00 - {WORK_END}:00")
+    current_date = start_date
+    while current_date <= end_date:
+        busy = []
+        for store in stores:
+            busy.extend(busy_intervals(store, current_date, participants))
 
-        # Store the free slots for the current date
-        free_slots[date_str] = free_time
+        free_slots[current_date.strftime("%Y-%m-%d")] = [
+            f"{format_time(start)} - {format_time(end)}"
+            for start, end in free_intervals(
+                busy, work_start, work_end, min_duration, granularity
+            )
+        ]
 
         # Move to the next day
         current_date += timedelta(days=1)
 
     return free_slots
+
+
+def find_free_slots(
+    appointments, start_date, end_date=None, min_duration=0, granularity=1
+):
+    """
+    Finds free time slots within a given date range.
+
+    :param appointments: AppointmentStore or list of appointment dictionaries.
+    :param start_date: Start date (string format 'YYYY-MM-DD').
+    :param end_date: End date (optional, string format 'YYYY-MM-DD').
+    :param min_duration: minimum duration (minutes) of the slots returned.
+    :param granularity: slots are aligned to multiples of it (minutes).
+    :return: Dictionary with dates as keys and lists of free slots as values.
+    """
+    return find_common_free_slots(
+        [appointments],
+        start_date,
+        end_date,
+        min_duration=min_duration,
+        granularity=granularity,
+    )
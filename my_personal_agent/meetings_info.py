@@ -5,12 +5,12 @@ Class to handle request for meeting info
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from agent_base_node import BaseAgentNode
-from config_reader import ConfigReader
+from config_reader import get_config
 from prompts_library import PROMPT_MEETINGS_INFO
 from utils import extract_dates_from_json_string
-from meetings_api import appointments_dict, find_free_slots
+from meetings_api import appointments_store, find_free_slots
 
-config = ConfigReader("config.toml")
+config = get_config("config.toml")
 AD_MODEL_ID = config.find_key("ad_model_id")
 
 
@@ -37,8 +37,6 @@ class MeetingsInfo(BaseAgentNode):
 
         start_date, end_date = extract_dates_from_json_string(result.content)
 
-        free_slots = find_free_slots(
-            appointments_dict["appointments"], start_date, end_date
-        )
+        free_slots = find_free_slots(appointments_store, start_date, end_date)
 
         return {"output": str(free_slots), "output_tool": "meetings_info"}
@@ -5,10 +5,10 @@ Class to handle the not_defined case
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from agent_base_node import BaseAgentNode
-from config_reader import ConfigReader
+from config_reader import get_config
 from prompts_library import PROMPT_NOT_DEFINED
 
-config = ConfigReader("config.toml")
+config = get_config("config.toml")
 AD_MODEL_ID = config.find_key("ad_model_id")
 
 
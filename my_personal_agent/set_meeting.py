@@ -5,9 +5,9 @@ Class to handle set_meeting command
 from langchain_core.messages import HumanMessage, SystemMessage
 
 from agent_base_node import BaseAgentNode
-from config_reader import ConfigReader
+from config_reader import get_config
 
-config = ConfigReader("config.toml")
+config = get_config("config.toml")
 AD_MODEL_ID = config.find_key("ad_model_id")
 
 
@@ -4,7 +4,7 @@ to enable tracing to APM
 """
 
 import requests
-from config_reader import ConfigReader
+from config_reader import get_config
 from utils import get_console_logger
 
 from config_private import APM_PUBLIC_KEY
@@ -23,8 +23,8 @@ def http_transport(encoded_span):
         requests.Response or None: The response from the APM service or None if tracing is disabled.
     """
     try:
-        # Load config inside the function to avoid global dependency issues
-        config = ConfigReader("config.toml")
+        # shared config: the file is parsed only once in the process
+        config = get_config("config.toml")
 
         base_url = config.find_key("apm_base_url")
         content_type = config.find_key("apm_content_type")
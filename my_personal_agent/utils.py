@@ -9,7 +9,6 @@ import json
 import re
 import logging
 import os
-import numpy as np
 
 
 def debug_bool(b_str):
@@ -71,6 +70,9 @@ def compute_stats(list_docs):
 
     list_docs: LangChain list of Documents
     """
+    # imported here: numpy is not needed by the other utilities
+    import numpy as np
+
     lengths = [len(d.page_content) for d in list_docs]
 
     mean_length = int(round(np.mean(lengths), 0))
@@ -1,14 +1,275 @@
 """
-Provide notification from backend in a queue
+Provide notification from backend, with a channel for each run
+
+Every run (for example: a document processed for a user session) publishes
+its events in its own channel. Channels are bounded: when a channel is full
+the oldest events are dropped, so a slow (or missing) consumer can't make
+memory grow. Events published for a run without an open channel are dropped.
+
+Events:
+    message: a notification (as send_notification)
+    node_started, node_finished: progress of the workflow (with elapsed ms)
+    token: a token streamed by a LLM
+
+Usage:
+    channel = hub.open_channel()
+    workflow.invoke({..., "run_id": channel.run_id})
+    for event in channel.drain():
+        ...
+    hub.close_channel(channel.run_id)
 """
 
-# notification_queue.py
-import queue
+import asyncio
+import functools
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import ensure_config, merge_configs
+
+# max number of events buffered for each run
+DEFAULT_MAX_EVENTS = 1000
+
+
+@dataclass
+class NotificationEvent:
+    """
+    An event published for a run
+    """
+
+    run_id: str
+    kind: str
+    message: str = ""
+    level: str = "info"
+    node: Optional[str] = None
+    elapsed_ms: Optional[float] = None
+    data: dict = field(default_factory=dict)
+    timestamp: float = field(default_factory=time.time)
+
+
+class NotificationChannel:
+    """
+    Bounded buffer of the events of a run (drop-oldest policy)
+    """
+
+    def __init__(self, run_id, max_events=DEFAULT_MAX_EVENTS):
+        """
+        run_id (str): the id of the run
+        max_events (int): max number of events buffered
+        """
+        self.run_id = run_id
+        self.events = deque(maxlen=max_events)
+        self.dropped = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def publish(self, event):
+        """
+        Add an event, dropping the oldest if the channel is full
+        """
+        with self.condition:
+            if self.closed:
+                return
+
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+
+            self.events.append(event)
+            self.condition.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Return the next event, waiting at most timeout secs.
+
+        Returns None on timeout or if the channel is closed and empty.
+        """
+        with self.condition:
+            if not self.events and not self.closed:
+                self.condition.wait(timeout)
+
+            if self.events:
+                return self.events.popleft()
+
+        return None
+
+    def drain(self):
+        """
+        Return (and remove) all the buffered events, without waiting
+        """
+        with self.condition:
+            events = list(self.events)
+            self.events.clear()
+
+        return events
+
+    def close(self):
+        """
+        No more events will be accepted, waiting consumers are woken up
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __iter__(self):
+        """
+        Iterate on the events until the channel is closed
+        """
+        while True:
+            event = self.get(timeout=0.5)
+
+            if event is not None:
+                yield event
+            elif self.closed:
+                return
+
+    async def __aiter__(self):
+        """
+        Async iteration on the events until the channel is closed
+        """
+        while True:
+            # waits in a worker thread, doesn't block the event loop
+            event = await asyncio.to_thread(self.get, 0.5)
+
+            if event is not None:
+                yield event
+            elif self.closed:
+                return
+
+
+class NotificationHub:
+    """
+    Publish/subscribe hub, with a channel for each run
+    """
+
+    def __init__(self, max_events=DEFAULT_MAX_EVENTS):
+        """
+        max_events (int): size of the buffer of each channel
+        """
+        self.max_events = max_events
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def open_channel(self, run_id=None):
+        """
+        Open the channel for a run (a new run id is created if not provided)
+        """
+        run_id = run_id or str(uuid.uuid4())
+
+        with self.lock:
+            if run_id not in self.channels:
+                self.channels[run_id] = NotificationChannel(run_id, self.max_events)
+
+            return self.channels[run_id]
+
+    def get_channel(self, run_id):
+        """
+        Return the channel for the run, or None
+        """
+        return self.channels.get(run_id)
+
+    def close_channel(self, run_id):
+        """
+        Close the channel and remove it from the hub
+        """
+        with self.lock:
+            channel = self.channels.pop(run_id, None)
+
+        if channel is not None:
+            channel.close()
+
+    def publish(self, run_id, kind, message="", level="info", **kwargs):
+        """
+        Publish an event for the run (dropped if the run has no channel)
+        """
+        channel = self.channels.get(run_id) if run_id else None
+
+        if channel is not None:
+            channel.publish(NotificationEvent(run_id, kind, message, level, **kwargs))
+
+
+# the hub used by the backend
+hub = NotificationHub()
+
+
+def send_notification(message, level="info", run_id=None):
+    """Send a notification message to the channel of the run."""
+    hub.publish(run_id, "message", message, level)
+
+
+def notify_progress(node_name):
+    """
+    Decorator for workflow nodes (functions of the state):
+    publish node_started and node_finished (with elapsed ms) for state["run_id"]
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(state):
+            run_id = state.get("run_id")
+            hub.publish(run_id, "node_started", f"{node_name} started", node=node_name)
+
+            start_time = time.perf_counter()
+            try:
+                return func(state)
+            finally:
+                elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+                hub.publish(
+                    run_id,
+                    "node_finished",
+                    f"{node_name} finished",
+                    node=node_name,
+                    elapsed_ms=elapsed_ms,
+                )
+
+        return wrapper
+
+    return decorator
+
+
+class TokenNotificationHandler(BaseCallbackHandler):
+    """
+    Publish the tokens streamed by a LLM as token events
+    """
+
+    def __init__(self, run_id, node_name):
+        """
+        run_id (str): the id of the run
+        node_name (str): the node calling the LLM
+        """
+        self.run_id = run_id
+        self.node_name = node_name
+        self.n_tokens = 0
+        self.start_time = time.perf_counter()
+
+    def on_llm_new_token(self, token, **kwargs):
+        """Publish a token event."""
+        self.n_tokens += 1
+
+        hub.publish(
+            self.run_id,
+            "token",
+            token,
+            node=self.node_name,
+            elapsed_ms=(time.perf_counter() - self.start_time) * 1000,
+            data={"n_tokens": self.n_tokens},
+        )
 
-# Create a global in-memory queue
-notification_queue = queue.Queue()
 
+def progress_config(run_id, node_name):
+    """
+    Return the config for a LLM call inside a node, adding the token handler
+    to the callbacks inherited from the workflow (streaming keeps working).
+    Returns None if nobody is listening for the run.
+    """
+    if not run_id or hub.get_channel(run_id) is None:
+        return None
 
-def send_notification(message, level="info"):
-    """Send a notification message to the queue."""
-    notification_queue.put((message, level))
+    return merge_configs(
+        ensure_config(),
+        {"callbacks": [TokenNotificationHandler(run_id, node_name)]},
+    )
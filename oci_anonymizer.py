@@ -3,9 +3,23 @@ OCI Anonymizer
 
 Usage: to customize the list of entity you want to anonymize (and then replace)
 change the prompt
+
+The text is first anonymized locally (local_anonymizer: patterns and
+gazetteer, in milliseconds); the LLM pass, for the residual entities,
+is optional (anonymizer_use_llm in config.toml).
+
+IncrementalAnonymizer anonymizes a stream of text (e.g. the tokens of a LLM)
+sentence by sentence, so that anonymized output can be shown while streaming.
+It uses the local anonymizer: a LLM call for every chunk would block the stream
+and give different placeholders to the same entity in different chunks.
 """
 
-from oci_models import create_model_for_answer_directly
+import re
+
+from config_reader import get_config
+from local_anonymizer import DEFAULT_KEEP_WORDS, LocalAnonymizer, load_gazetteer
+from oci_models import create_model_for_answer_directly, create_prompt_budgeter
+from prompt_budget import ContextBudgetExceeded
 from utils import get_console_logger
 
 logger = get_console_logger()
@@ -21,34 +35,151 @@ PROMPT_ANONYMIZER_TEMPLATE = """
     Do NOT anonymize:
     - The word Oracle
     - The document name
+    - Placeholders like [PERSON_1], already anonymized
 
     Text to anonymize:
     {text}
     """
 
+# the text is rewritten by the LLM: the output is as long as the input
+ANONYMIZER_MAX_TOKENS = 4000
+
+# where a chunk of the stream can be cut: end of a sentence or of a line
+SENTENCE_END = re.compile(r"[.!?:](?=\s)|\n")
+
+
+def create_local_anonymizer():
+    """
+    Create the local anonymizer, with the gazetteer in config
+    """
+    config = get_config("config.toml")
+
+    return LocalAnonymizer(
+        load_gazetteer(config.find_key("anonymizer_gazetteer")),
+        keep_words=config.find_key("anonymizer_keep_words") or DEFAULT_KEEP_WORDS,
+    )
+
 
 class OCIAnonymizer:
     """
     This class provides an anonymizer
     """
 
-    def __init__(self):
+    def __init__(self, use_llm=None, local_anonymizer=None):
         """
         Init
+
+        use_llm: if True, after the local pass the text is sent to the LLM
+            (default: anonymizer_use_llm in config)
+        local_anonymizer: LocalAnonymizer, share it to have the same
+            placeholders in different texts (default: a new one)
         """
-        self.llm = create_model_for_answer_directly()
+        if use_llm is None:
+            use_llm = bool(get_config("config.toml").find_key("anonymizer_use_llm"))
+
+        self.use_llm = use_llm
+        self.local_anonymizer = local_anonymizer or create_local_anonymizer()
+        self.llm = None
+        self.budgeter = None
+
+        if use_llm:
+            self.llm = create_model_for_answer_directly(
+                max_tokens=ANONYMIZER_MAX_TOKENS
+            )
+            self.budgeter = create_prompt_budgeter(
+                max_output_tokens=ANONYMIZER_MAX_TOKENS
+            )
 
     def anonymize(self, text: str) -> str:
         """
         anonymize
         """
+        text = self.local_anonymizer.anonymize(text)
+
+        if not self.use_llm:
+            return text
+
         PROMPT_ANONYMIZER = PROMPT_ANONYMIZER_TEMPLATE.format(text=text)
 
+        try:
+            # the text is rewritten: it can't be trimmed and must fit in output
+            if self.budgeter.count(text) > self.budgeter.max_output_tokens:
+                raise ContextBudgetExceeded("Text longer than the max output tokens")
+            self.budgeter.check(PROMPT_ANONYMIZER)
+        except ContextBudgetExceeded as e:
+            logger.warning("LLM pass skipped, only local anonymization: %s", e)
+            return text
+
         try:
             msg = self.llm.invoke(PROMPT_ANONYMIZER)
             response = msg.content if msg else "Error: No response from LLM"
         except Exception as e:
-            logger.error("Summarizer failed: %s", e)
+            logger.error("Anonymizer failed: %s", e)
             response = "Error: Unable to process request"
 
         return response
+
+
+class IncrementalAnonymizer:
+    """
+    Anonymize a stream of text, sentence by sentence.
+
+    Text is buffered until at least min_chars are available, then it is
+    anonymized up to the last sentence boundary.
+    """
+
+    def __init__(self, anonymize_fn=None, min_chars=300):
+        """
+        anonymize_fn: function str -> str (default: the local anonymizer)
+        min_chars: min length of the chunks anonymized (but the last one)
+        """
+        self.anonymize_fn = anonymize_fn or create_local_anonymizer().anonymize
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def _anonymize(self, text: str) -> str:
+        """
+        anonymize a chunk, preserving leading and trailing whitespace
+        """
+        core = text.strip()
+
+        if not core:
+            return text
+
+        head = text[: len(text) - len(text.lstrip())]
+        tail = text[len(text.rstrip()) :]
+
+        return head + self.anonymize_fn(core) + tail
+
+    def feed(self, text: str) -> str:
+        """
+        Add text to the stream
+
+        :return: the anonymized text ready (can be empty)
+        """
+        self.buffer += text
+
+        if len(self.buffer) < self.min_chars:
+            return ""
+
+        boundary = None
+        for boundary in SENTENCE_END.finditer(self.buffer, self.min_chars - 1):
+            pass
+
+        if boundary is None:
+            return ""
+
+        ready, self.buffer = (
+            self.buffer[: boundary.end()],
+            self.buffer[boundary.end() :],
+        )
+
+        return self._anonymize(ready)
+
+    def flush(self) -> str:
+        """
+        End of the stream: anonymize and return the remaining text
+        """
+        ready, self.buffer = self.buffer, ""
+
+        return self._anonymize(ready)
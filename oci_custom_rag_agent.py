@@ -2,16 +2,31 @@
 Custom RAG agent based on Langchain and OCI GenAI
 """
 
-import uuid
+import asyncio
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
-from langchain.chains import create_history_aware_retriever
-from langchain.chains import create_retrieval_chain
+from langchain_core.output_parsers import StrOutputParser
 from langchain.chains.combine_documents import create_stuff_documents_chain
 
-from oci_vector_store import create_vector_store
-from oci_models import create_model_for_custom_rag
-from config_reader import ConfigReader
+from oci_vector_store import (
+    create_embedding_model,
+    create_db_connection,
+    get_db_pool,
+    filtered_similarity_search,
+    mirror_similarity_search,
+)
+from oci_models import create_model_for_custom_rag, create_prompt_budgeter
+from chat_history import ChatHistoryManager
+from question_condenser import QuestionCondenser
+from semantic_cache import create_semantic_cache, fingerprint_chunks
+from reranker import Reranker
+from hybrid_retriever import HybridRetriever, reciprocal_rank_fusion
+from session_store import create_session_store
+from config_reader import get_config
 from utils import get_console_logger
 
 CONTEXT_Q_SYSTEM_PROMPT = """Given a chat history and the latest user question \
@@ -44,96 +59,517 @@ QA_PROMPT = ChatPromptTemplate.from_messages(
     ]
 )
 
+#
+# The prompt to compact the older messages of the history
+#
+SUMMARY_PROMPT_TEMPLATE = """Progressively summarize the lines of conversation \
+provided, adding onto the previous summary and returning a new summary. \
+Keep names, facts and questions that could be referenced later. Be concise.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+
+
+def summarize_history(summary, messages):
+    """
+    Add the messages to the rolling summary of a session
+    """
+    new_lines = "\n".join(f"{msg.type}: {msg.content}" for msg in messages)
+
+    llm = create_model_for_custom_rag()
+    msg = llm.invoke(
+        SUMMARY_PROMPT_TEMPLATE.format(summary=summary or "-", new_lines=new_lines)
+    )
+
+    return msg.content
+
+
+def condense_question(question, chat_history):
+    """
+    Rewrite the question as a standalone question, using the history
+    """
+    condense_chain = (
+        CONTEXT_Q_PROMPT | create_model_for_custom_rag() | StrOutputParser()
+    )
+
+    return condense_chain.invoke({"input": question, "chat_history": chat_history})
+
+
+# shared by all the agents: a thread for each search, bounded by the DB pool
+@lru_cache(maxsize=1)
+def get_search_executor():
+    """
+    The threads for the concurrent searches on several collections
+    """
+    return ThreadPoolExecutor(
+        max_workers=get_config("config.toml").find_key("db_pool_max") or 8,
+        thread_name_prefix="rag_search",
+    )
+
 
 class OCICustomRAGagent:
     """
     This class provide an implementation of a custom RAG agent
     based on Langchain and OCI GenAI
 
-    it also manage the chat history for each session
+    it also manage the chat history for each session:
+    bounded in tokens (older turns are summarized), idle sessions expire
+    and sessions can be shared by processes (history_store: sqlite or redis)
+    (see chat_history, session_store and the history_* settings in config.toml)
+
+    the question is rewritten (with the history) only if it references
+    the conversation (see question_condenser)
+
+    optionally, answers are reused for near questions with the same
+    chunks retrieved (semantic_cache in config.toml); only the answers
+    generated without a history (first turn of a session) are cached
+    and reused: the other answers depend on the conversation
+
+    more chunks are retrieved and reranked locally: only the best ones,
+    within a token budget, are sent to the LLM (rerank_* in config.toml)
+
+    retrieval can be hybrid: keyword (Oracle Text or BM25) + vector search
+    and, for small collections, the vector search can be done in memory
+    (vector_mirror in config.toml)
+
+    several collections can be searched (collection_names), concurrently:
+    the rankings are fused with RRF (the scores of different collections
+    are not comparable), the latency of each collection is in the
+    metadata of the output
+
+    the answer can be streamed (stream_chat, astream_chat): the chunks
+    retrieved are returned before the answer; chat always returns the
+    complete output (should_stream is deprecated and ignored)
     Usage:
 
     """
 
-    def __init__(self, should_stream: bool = False):
+    def __init__(self, should_stream: bool = None):
         """
         Initialize the client
+
+        :param should_stream: deprecated, ignored: use stream_chat to stream
         """
-        self.config = ConfigReader("config.toml")
+        if should_stream is not None:
+            warnings.warn(
+                "should_stream is deprecated and ignored: use stream_chat "
+                "(or astream_chat) to stream the answer",
+                DeprecationWarning,
+                stacklevel=2,
+            )
+
+        self.config = get_config("config.toml")
 
         self.top_k = self.config.find_key("custom_rag_top_k")
         # the name of the DB table
         self.collection_name = self.config.find_key("collection_name")
-        self.should_stream = should_stream
+        # the collections searched (concurrently), default the one above
+        self.collection_names = self.config.find_key("collection_names") or [
+            self.collection_name
+        ]
 
-        # dict to handle all the sessions
-        self.sessions = {}
+        # to handle the history of all the sessions
+        budgeter = create_prompt_budgeter(self.config.find_key("custom_rag_model_id"))
+
+        self.history = ChatHistoryManager(
+            max_tokens=self.config.find_key("history_max_tokens") or 2000,
+            keep_turns=self.config.find_key("history_keep_turns") or 2,
+            summarize_fn=(
+                summarize_history if self.config.find_key("history_summarize") else None
+            ),
+            count_fn=budgeter.count,
+            store=self._create_session_store(),
+        )
+        # rewrite the question only when needed (an LLM call)
+        self.condenser = QuestionCondenser(
+            condense_question,
+            cache_size=self.config.find_key("condense_cache_size") or 256,
+        )
+        self.semantic_cache = self._create_semantic_cache()
+        self.reranker = self._create_reranker(budgeter)
         self.logger = get_console_logger()
 
+    def _create_session_store(self):
+        """
+        Create the store for the sessions (history_store in config):
+        memory, or sqlite/redis to share the sessions between processes
+        """
+        backend = self.config.find_key("history_store") or "memory"
+
+        kwargs = {
+            "max_sessions": self.config.find_key("history_max_sessions") or 1000,
+            "session_ttl": self.config.find_key("history_session_ttl") or 3600,
+        }
+        if backend == "sqlite":
+            kwargs["db_path"] = self.config.find_key("history_store_path")
+        elif backend == "redis":
+            kwargs["url"] = self.config.find_key("history_store_url")
+
+        return create_session_store(backend, **kwargs)
+
+    def _create_semantic_cache(self):
+        """
+        Create the semantic cache of the answers (semantic_cache in config):
+        memory, oracle (shared by the agents), or none if empty
+        """
+        backend = self.config.find_key("semantic_cache")
+
+        if not backend:
+            return None
+
+        kwargs = {
+            "threshold": self.config.find_key("semantic_cache_threshold"),
+            "max_entries": self.config.find_key("semantic_cache_size"),
+            "ttl": self.config.find_key("semantic_cache_ttl"),
+        }
+        if backend == "oracle":
+            kwargs["connection"] = create_db_connection()
+            kwargs["table_name"] = self.config.find_key("semantic_cache_table")
+
+        return create_semantic_cache(backend, **kwargs)
+
     def create_session(self):
         """
         Create a session with the agent
         """
-        # create a unique session id
-        session_id = str(uuid.uuid4())
-        # init session history
-        self.sessions[session_id] = []
+        # create a unique session id, with an empty history
+        session_id = self.history.create_session()
 
         self.logger.info("Session %s created.", session_id)
 
         return session_id
 
-    def _create_rag_chain(self):
+    def _create_reranker(self, budgeter):
         """
-        Create the chain
+        Create the reranker (rerank_method in config), None if empty
         """
-        # actually don't create, get a reference to the vector store
-        v_store = create_vector_store(self.collection_name)
-
-        llm = create_model_for_custom_rag()
+        method = self.config.find_key("rerank_method")
 
-        retriever = v_store.as_retriever(search_kwargs={"k": self.top_k})
+        if not method:
+            return None
 
-        # create the RAG chain using Langchain
-        # the chain is created to handle msg history
-        history_aware_retriever = create_history_aware_retriever(
-            llm, retriever, CONTEXT_Q_PROMPT
+        return Reranker(
+            method=method,
+            top_n=self.config.find_key("rerank_top_n"),
+            max_tokens=self.config.find_key("rerank_max_tokens"),
+            bm25_weight=self.config.find_key("rerank_bm25_weight"),
+            cross_encoder_model=self.config.find_key("rerank_cross_encoder"),
+            count_fn=budgeter.count,
         )
 
-        question_answer_chain = create_stuff_documents_chain(llm, QA_PROMPT)
+    def _search(self, collection_name, question, query_vector, k, filters=None):
+        """
+        Search the k best chunks in a collection: vector or hybrid
+        (retrieval_mode in config)
+
+        filters: on the metadata, e.g. {"source": "manual.pdf"} (see
+            metadata_filter), applied in the SQL before the vector ranking
+        :return: list of (Document, score), higher score is better
+        """
+        if self.config.find_key("retrieval_mode") == "hybrid":
+            with get_db_pool().acquire() as connection:
+                retriever = HybridRetriever(
+                    connection,
+                    collection_name,
+                    keyword_search=self.config.find_key("hybrid_keyword_search"),
+                    bm25_index_dir=self.config.find_key("bm25_index_dir"),
+                    n_candidates=self.config.find_key("hybrid_candidates"),
+                )
+                return retriever.search(question, query_vector, k=k, filters=filters)
 
-        _rag_chain = create_retrieval_chain(
-            history_aware_retriever, question_answer_chain
+        docs_and_distances = None
+
+        if self.config.find_key("vector_mirror"):
+            # None if the collection is too large: search in the DB
+            docs_and_distances = mirror_similarity_search(
+                collection_name, query_vector, k, filters
+            )
+
+        if docs_and_distances is None:
+            with get_db_pool().acquire() as connection:
+                docs_and_distances = filtered_similarity_search(
+                    connection, collection_name, query_vector, k, filters
+                )
+
+        # cosine distance -> similarity
+        return [(doc, 1.0 - distance) for doc, distance in docs_and_distances]
+
+    def _timed_search(self, collection_name, question, query_vector, k, filters):
+        """
+        Search in a collection, returns (docs_and_scores, latency in ms)
+        """
+        start = time.perf_counter()
+
+        docs_and_scores = self._search(
+            collection_name, question, query_vector, k, filters
         )
-        return _rag_chain
 
-    def chat(self, session_id: str, message: str):
+        return docs_and_scores, (time.perf_counter() - start) * 1000
+
+    def _search_collections(self, question, query_vector, k, filters=None):
         """
-        Chat with the agent
+        Search all the collections, concurrently, and fuse the rankings
+
+        The scores of different collections are not comparable (RRF in
+        hybrid mode, cosine similarity in vector mode): with more than one
+        collection the score is the RRF of the rank in its collection
+
+        :return: the k best (Document, score) and the metadata of the
+            search: for each collection latency (ms) and chunks found
         """
-        # get the chat history of the session
-        chat_history = self.sessions[session_id]
+        if len(self.collection_names) == 1:
+            # no need of another thread
+            results = {
+                self.collection_names[0]: self._timed_search(
+                    self.collection_names[0], question, query_vector, k, filters
+                )
+            }
+        else:
+            futures = {
+                collection_name: get_search_executor().submit(
+                    self._timed_search,
+                    collection_name,
+                    question,
+                    query_vector,
+                    k,
+                    filters,
+                )
+                for collection_name in self.collection_names
+            }
+            results = {name: future.result() for name, future in futures.items()}
+
+        metadata = {
+            "collections": {
+                collection_name: {
+                    "latency_ms": round(latency_ms, 1),
+                    "n_chunks": len(collection_results),
+                }
+                for collection_name, (collection_results, latency_ms) in results.items()
+            }
+        }
+
+        if len(results) == 1:
+            docs_and_scores, _ = next(iter(results.values()))
+
+            return docs_and_scores[:k], metadata
+
+        docs = {}
+        rankings = []
+        for collection_name, (collection_results, _) in results.items():
+            ranking = []
 
-        rag_chain = self._create_rag_chain()
+            for rank, (doc, _) in enumerate(collection_results):
+                doc.metadata["collection"] = collection_name
+                docs[(collection_name, rank)] = doc
+                ranking.append((collection_name, rank))
 
-        # invoke llm
-        chain_output = rag_chain.invoke(
-            {"input": message, "chat_history": chat_history}
+            rankings.append(ranking)
+
+        scores = reciprocal_rank_fusion(rankings)
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+
+        return [(docs[key], scores[key]) for key in best], metadata
+
+    def _retrieve(self, question, filters=None):
+        """
+        Embed the question and retrieve the chunks
+
+        :return: the embedding of the question, the chunks and the
+            metadata of the search
+        """
+        # the embedding model is shared (and cached) with the vector store
+        query_vector = create_embedding_model().embed_query(question)
+
+        if self.reranker is None:
+            docs_and_scores, metadata = self._search_collections(
+                question, query_vector, self.top_k, filters
+            )
+
+            return query_vector, [doc for doc, _ in docs_and_scores], metadata
+
+        # more candidates, then only the best are kept
+        docs_and_scores, metadata = self._search_collections(
+            question, query_vector, self.config.find_key("rerank_candidates"), filters
         )
 
+        return (
+            query_vector,
+            self.reranker.rerank(question, docs_and_scores),
+            metadata,
+        )
+
+    def _create_answer_chain(self):
+        """
+        Create the chain that answers using the chunks retrieved
+        """
+        llm = create_model_for_custom_rag()
+
+        return create_stuff_documents_chain(llm, QA_PROMPT)
+
+    def _prepare(self, session_id, message, filters):
+        """
+        The steps before the answer: condense the question (only if needed),
+        embed and retrieve, check the semantic cache
+
+        :return: dict with the inputs of the answer chain, the chunks and
+            the answer, if found in the semantic cache (else None)
+        """
+        # get the chat history of the session (summary and last messages)
+        chat_history = self.history.get_messages(session_id)
+
+        question = self.condenser.condense(message, chat_history)
+
+        query_vector, docs, metadata = self._retrieve(question, filters)
+
+        # with a history the answer depends on the conversation (also if the
+        # question is not rewritten): it can't be shared with other sessions
+        answer, fingerprint = None, None
+        if self.semantic_cache is not None and not chat_history:
+            fingerprint = fingerprint_chunks(docs)
+            answer = self.semantic_cache.lookup(query_vector, fingerprint)
+
+        return {
+            "chain_input": {
+                "input": message,
+                "chat_history": chat_history,
+                "context": docs,
+            },
+            "question": question,
+            "query_vector": query_vector,
+            "fingerprint": fingerprint,
+            "metadata": metadata,
+            "cached_answer": answer,
+        }
+
+    def _complete(self, session_id, prepared, answer):
+        """
+        After the answer: add it to the semantic cache and to the history
+
+        :return: the output (same keys of the Langchain retrieval chain)
+        """
+        if prepared["fingerprint"] is not None and prepared["cached_answer"] is None:
+            self.semantic_cache.add(
+                prepared["question"],
+                prepared["query_vector"],
+                prepared["fingerprint"],
+                answer,
+            )
+
+        chain_input = prepared["chain_input"]
+
         # Update chat history with HumanMessage and AIMessage
-        # be careful, since it is a chain, chain_output is not an AIMSg but a dict
-        chat_history.append(HumanMessage(content=message))
-        chat_history.append(AIMessage(content=chain_output["answer"]))
+        self.history.add_turn(session_id, chain_input["input"], answer)
+
+        return {**chain_input, "answer": answer, "metadata": prepared["metadata"]}
+
+    def chat(self, session_id: str, message: str, filters: dict = None):
+        """
+        Chat with the agent
 
-        return chain_output
+        filters: to restrict the search to some chunks, e.g. to a book:
+            {"source": "manual.pdf"} or {"page": {"gte": 10, "lte": 20}}
+
+        steps: condense the question (only if needed), embed and retrieve,
+        check the semantic cache, answer with the LLM
+
+        to stream the answer, use stream_chat (or astream_chat)
+        """
+        prepared = self._prepare(session_id, message, filters)
+
+        answer = prepared["cached_answer"]
+        if answer is None:
+            # invoke llm
+            answer = self._create_answer_chain().invoke(prepared["chain_input"])
+
+        return self._complete(session_id, prepared, answer)
+
+    @staticmethod
+    def _context_event(prepared):
+        return {
+            "type": "context",
+            "context": prepared["chain_input"]["context"],
+            "metadata": prepared["metadata"],
+            "cached": prepared["cached_answer"] is not None,
+        }
+
+    def stream_chat(self, session_id: str, message: str, filters: dict = None):
+        """
+        Chat with the agent, streaming the answer
+
+        yields events (dict with a type):
+            context: the chunks retrieved and the metadata, before the answer
+            token: a piece of the answer (text)
+            end: the output (as chat), when the answer is complete
+        the history is updated only when the answer is complete
+        """
+        prepared = self._prepare(session_id, message, filters)
+
+        yield self._context_event(prepared)
+
+        answer = prepared["cached_answer"]
+        if answer is not None:
+            yield {"type": "token", "text": answer}
+        else:
+            pieces = []
+
+            for text in self._create_answer_chain().stream(prepared["chain_input"]):
+                pieces.append(text)
+                yield {"type": "token", "text": text}
+
+            answer = "".join(pieces)
+
+        yield {"type": "end", "output": self._complete(session_id, prepared, answer)}
+
+    async def astream_chat(self, session_id: str, message: str, filters: dict = None):
+        """
+        Async version of stream_chat
+
+        the steps before the answer (DB, embeddings) run in a thread
+        """
+        prepared = await asyncio.to_thread(self._prepare, session_id, message, filters)
+
+        yield self._context_event(prepared)
+
+        answer = prepared["cached_answer"]
+        if answer is not None:
+            yield {"type": "token", "text": answer}
+        else:
+            pieces = []
+
+            async for text in self._create_answer_chain().astream(
+                prepared["chain_input"]
+            ):
+                pieces.append(text)
+                yield {"type": "token", "text": text}
+
+            answer = "".join(pieces)
+
+        # the history update can call the LLM (summary)
+        output = await asyncio.to_thread(self._complete, session_id, prepared, answer)
+
+        yield {"type": "end", "output": output}
 
     def close_session(self, session_id: str):
         """
         Close the session cancelling the chat history
         """
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        if self.history.close_session(session_id):
             self.logger.info("Session %s closed.", session_id)
         else:
             self.logger.warning("Session %s does not exist.", session_id)
+
+    def get_stats(self):
+        """
+        Metrics on the sessions and the size of their history
+        """
+        stats = {**self.history.stats(), **self.condenser.stats()}
+
+        if self.semantic_cache is not None:
+            stats.update(self.semantic_cache.stats())
+
+        return stats
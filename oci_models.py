@@ -1,77 +1,150 @@
 """
 Factory for OCI GenAI models
+
+Config and the Langchain client class are loaded on first use,
+and the OCI client is created once for each endpoint (shared by the models),
+to keep the import of this module (and process startup) cheap.
 """
 
-from langchain_community.chat_models import ChatOCIGenAI
-from config_reader import ConfigReader
+from functools import lru_cache
+
+from config_reader import get_config
 from config_private import COMPARTMENT_OCID
+from prompt_budget import PromptBudgeter
 
-config_reader = ConfigReader("config.toml")
+# module level settings, kept for compatibility: read from config on first access
+_SETTINGS = {
+    # general LLM
+    "LLM_MODEL_ID": "llm_model_id",
+    "LLM_ENDPOINT": "llm_model_endpoint",
+    # we're using command-r-plus model for routing
+    "ROUTER_MODEL_ID": "router_model_id",
+    "ROUTER_ENDPOINT": "router_model_endpoint",
+    "CUSTOM_RAG_MODEL_ID": "custom_rag_model_id",
+    "CUSTOM_RAG_ENDPOINT": "custom_rag_model_endpoint",
+    "AD_MODEL_ID": "ad_model_id",
+    "AD_ENDPOINT": "ad_model_endpoint",
+}
 
-# general LLM
-LLM_MODEL_ID = config_reader.find_key("llm_model_id")
-LLM_ENDPOINT = config_reader.find_key("llm_model_endpoint")
 
-# we're using command-r-plus model for routing
-ROUTER_MODEL_ID = config_reader.find_key("router_model_id")
-ROUTER_ENDPOINT = config_reader.find_key("router_model_endpoint")
+def __getattr__(name):
+    """
+    Resolve the settings (LLM_MODEL_ID, ...) lazily
+    """
+    if name in _SETTINGS:
+        return get_config("config.toml").find_key(_SETTINGS[name])
 
-CUSTOM_RAG_MODEL_ID = config_reader.find_key("custom_rag_model_id")
-CUSTOM_RAG_ENDPOINT = config_reader.find_key("custom_rag_model_endpoint")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-AD_MODEL_ID = config_reader.find_key("ad_model_id")
-AD_ENDPOINT = config_reader.find_key("ad_model_endpoint")
 
+@lru_cache(maxsize=None)
+def _create_genai_client(endpoint):
+    """
+    Create (only once for each endpoint) the OCI GenAI inference client
 
-def create_model(model_id=LLM_MODEL_ID, temperature=0.1, max_tokens=1024):
+    The client is shared: it keeps no per-model state
     """
-    Create OCI Model for general task
+    # imported here: the OCI SDK is slow to import
+    import oci
+
+    return oci.generative_ai_inference.GenerativeAiInferenceClient(
+        config=oci.config.from_file(),
+        service_endpoint=endpoint,
+        retry_strategy=oci.retry.DEFAULT_RETRY_STRATEGY,
+        timeout=(10, 240),
+    )
+
+
+def _create_chat_model(model_id, endpoint, temperature, max_tokens):
     """
+    Create the OCI chat model
+
+    A new model for each call (callers can bind or change it),
+    on the shared OCI client of the endpoint
+    """
+    # imported here: langchain_community is slow to import
+    from langchain_community.chat_models import ChatOCIGenAI
+
     llm = ChatOCIGenAI(
+        client=_create_genai_client(endpoint),
         model_id=model_id,
         compartment_id=COMPARTMENT_OCID,
-        service_endpoint=LLM_ENDPOINT,
+        service_endpoint=endpoint,
         model_kwargs={"temperature": temperature, "max_tokens": max_tokens},
     )
     return llm
 
 
+def create_model(model_id=None, temperature=0.1, max_tokens=1024):
+    """
+    Create OCI Model for general task
+    """
+    config = get_config("config.toml")
+
+    return _create_chat_model(
+        model_id or config.find_key("llm_model_id"),
+        config.find_key("llm_model_endpoint"),
+        temperature,
+        max_tokens,
+    )
+
+
 def create_model_for_routing(temperature=0, max_tokens=512):
     """
     Create the OCI Model for routing
     """
-    llm = ChatOCIGenAI(
-        model_id=ROUTER_MODEL_ID,
-        compartment_id=COMPARTMENT_OCID,
-        service_endpoint=ROUTER_ENDPOINT,
-        # for the router we need deterministic output (temp=0)
-        # and we don't need many tokens for output (max_tokens=512)
-        model_kwargs={"temperature": temperature, "max_tokens": max_tokens},
+    # for the router we need deterministic output (temp=0)
+    # and we don't need many tokens for output (max_tokens=512)
+    config = get_config("config.toml")
+
+    return _create_chat_model(
+        config.find_key("router_model_id"),
+        config.find_key("router_model_endpoint"),
+        temperature,
+        max_tokens,
     )
-    return llm
 
 
 def create_model_for_custom_rag(temperature=0.1, max_tokens=1024):
     """
     Create the OCI Model for custom rag
     """
-    llm = ChatOCIGenAI(
-        model_id=CUSTOM_RAG_MODEL_ID,
-        compartment_id=COMPARTMENT_OCID,
-        service_endpoint=CUSTOM_RAG_ENDPOINT,
-        model_kwargs={"temperature": temperature, "max_tokens": max_tokens},
+    config = get_config("config.toml")
+
+    return _create_chat_model(
+        config.find_key("custom_rag_model_id"),
+        config.find_key("custom_rag_model_endpoint"),
+        temperature,
+        max_tokens,
     )
-    return llm
 
 
 def create_model_for_answer_directly(temperature=0.1, max_tokens=2048):
     """
     Create the OCI Model for answering directly (no RAG)
     """
-    llm = ChatOCIGenAI(
-        model_id=AD_MODEL_ID,
-        compartment_id=COMPARTMENT_OCID,
-        service_endpoint=AD_ENDPOINT,
-        model_kwargs={"temperature": temperature, "max_tokens": max_tokens},
+    config = get_config("config.toml")
+
+    return _create_chat_model(
+        config.find_key("ad_model_id"),
+        config.find_key("ad_model_endpoint"),
+        temperature,
+        max_tokens,
+    )
+
+
+def create_prompt_budgeter(model_id=None, max_output_tokens=2048):
+    """
+    Create the token budget for the prompts sent to a model
+    (default: the model for answering directly)
+
+    max_output_tokens must be the max_tokens of the model
+    """
+    config = get_config("config.toml")
+
+    return PromptBudgeter(
+        model_id or config.find_key("ad_model_id"),
+        max_output_tokens=max_output_tokens,
+        tokenizer_file=config.find_key("budget_tokenizer") or None,
+        tokenizer_dir=config.find_key("budget_tokenizer_dir") or "tokenizers",
     )
-    return llm
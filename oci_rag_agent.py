@@ -26,10 +26,13 @@ Warnings:
     This module is in development, may change in future versions.
 """
 
+import asyncio
+
 import oci
 from oci.generative_ai_agent_runtime import GenerativeAiAgentRuntimeClient
 from oci.generative_ai_agent_runtime.models import CreateSessionDetails
 from oci.generative_ai_agent_runtime.models import ChatDetails
+from oci_rag_stream import Citation, aiter_chat_deltas, iter_chat_deltas
 from utils import get_console_logger
 
 
@@ -40,9 +43,13 @@ class OCIRAGAgent:
     Usage:
         you need to provide: agent_id and endpoint
 
-    Limitations:
-        for now, no support for citations in this client.
-        It will be added soon
+    Streaming:
+        stream_chat (and astream_chat) return the answer as typed deltas
+        (TextDelta, CitationDelta, EndOfTurn, see oci_rag_stream)
+
+    Citations:
+        chat_with_citations returns the text and the citations;
+        in streaming, citations are CitationDelta and are in EndOfTurn
     """
 
     def __init__(self, agent_id: str, endpoint: str, should_stream: bool = False):
@@ -84,26 +91,67 @@ class OCIRAGAgent:
 
         return sess_id
 
-    def chat(self, session_id: str, message: str):
-        """
-        Chat with the agent
-        """
-        response = self.client.chat(
+    def _chat(self, session_id: str, message: str, should_stream: bool):
+        return self.client.chat(
             agent_endpoint_id=self.agent_id,
             chat_details=ChatDetails(
                 # to use the message history pass the same sess_id
                 user_message=message,
                 session_id=session_id,
-                should_stream=self.should_stream,
+                should_stream=should_stream,
             ),
         )
 
+    def chat(self, session_id: str, message: str):
+        """
+        Chat with the agent
+
+        :return: the text of the answer, or the raw response if streaming
+        """
+        response = self._chat(session_id, message, self.should_stream)
+
         if not self.should_stream:
             return response.data.message.content.text
 
-        # streaming: should return a generator
+        # streaming: the raw response, see stream_chat for typed deltas
         return response
 
+    def chat_with_citations(self, session_id: str, message: str):
+        """
+        Chat with the agent (not streamed)
+
+        :return: (text of the answer, list of Citation)
+        """
+        content = self._chat(session_id, message, False).data.message.content
+
+        citations = [
+            Citation.from_sdk(citation) for citation in content.citations or []
+        ]
+
+        return content.text, citations
+
+    def stream_chat(self, session_id: str, message: str, text_mode: str = "delta"):
+        """
+        Chat with the agent, streaming
+
+        :param text_mode: the text in the events (see oci_rag_stream.TEXT_MODES)
+        :return: a generator of TextDelta, CitationDelta and, last, EndOfTurn
+        """
+        response = self._chat(session_id, message, True)
+
+        return iter_chat_deltas(response.data, text_mode)
+
+    async def astream_chat(
+        self, session_id: str, message: str, text_mode: str = "delta"
+    ):
+        """
+        Async version of stream_chat
+        """
+        response = await asyncio.to_thread(self._chat, session_id, message, True)
+
+        async for delta in aiter_chat_deltas(response.data, text_mode):
+            yield delta
+
     def close_session(self, session_id: str):
         """
         Close the session
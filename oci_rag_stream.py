@@ -0,0 +1,335 @@
+"""
+Typed events for the streaming responses of the OCI RAG agent
+
+The streamed response is a Server-Sent Events (SSE) stream: every event
+has a JSON payload with the message of the agent. The parser turns the
+stream in typed deltas:
+    TextDelta: new text of the answer
+    CitationDelta: a citation (source of the answer)
+    EndOfTurn: the answer is complete (full text and all the citations)
+
+The SSE stream can be parsed from the bytes (incrementally, the bytes are
+buffered only until the end of the event) or from the events of the SDK.
+
+Usage:
+    for delta in iter_chat_deltas(response.data):
+        if isinstance(delta, TextDelta):
+            print(delta.text, end="")
+"""
+
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+# the end of an SSE event: an empty line
+EVENT_SEPARATORS = (b"\n\n", b"\r\n\r\n")
+
+# the text in the events: only the new text (delta, sent by the OCI agent
+# endpoint) or the text so far (cumulative); auto: guessed from the first two
+# events (opt-in: a delta that starts with the text so far looks cumulative).
+# A cumulative stream whose event doesn't extend the text switches to delta:
+# the text is never dropped
+TEXT_MODES = ("auto", "cumulative", "delta")
+
+
+@dataclass
+class Citation:
+    """
+    A source of the answer
+    """
+
+    source_text: str = ""
+    url: str = ""
+    title: str = ""
+    doc_id: str = ""
+
+    @classmethod
+    def from_dict(cls, values):
+        """
+        From the JSON of the service (camelCase) or of the SDK (snake_case)
+        """
+        location = values.get("sourceLocation") or values.get("source_location") or {}
+
+        return cls(
+            source_text=values.get("sourceText") or values.get("source_text") or "",
+            url=location.get("url") or "",
+            title=values.get("title") or "",
+            doc_id=values.get("docId") or values.get("doc_id") or "",
+        )
+
+    @classmethod
+    def from_sdk(cls, citation):
+        """
+        From a Citation of the OCI SDK (not streamed response)
+        """
+        location = getattr(citation, "source_location", None)
+
+        return cls(
+            source_text=getattr(citation, "source_text", None) or "",
+            url=getattr(location, "url", None) or "",
+            title=getattr(citation, "title", None) or "",
+            doc_id=getattr(citation, "doc_id", None) or "",
+        )
+
+
+@dataclass
+class TextDelta:
+    """
+    New text of the answer
+    """
+
+    text: str
+
+
+@dataclass
+class CitationDelta:
+    """
+    A new citation
+    """
+
+    citation: Citation
+
+
+@dataclass
+class EndOfTurn:
+    """
+    The answer is complete
+    """
+
+    text: str
+    citations: List[Citation] = field(default_factory=list)
+    finish_reason: Optional[str] = None
+
+
+class SSEParser:
+    """
+    Incremental parser of a SSE byte stream: returns the data of the events
+    """
+
+    def __init__(self):
+        # only the bytes of the event not yet complete are kept
+        self.buffer = bytearray()
+        # where to look for the end of the event (the rest was searched)
+        self.scan_from = 0
+
+    def feed(self, chunk):
+        """
+        Add bytes, return the data (str) of the events completed
+        """
+        self.buffer += chunk
+        events = []
+
+        while True:
+            end, sep_len = self._find_separator()
+
+            if end < 0:
+                # a separator can be split between two chunks
+                self.scan_from = max(len(self.buffer) - 3, 0)
+                break
+
+            data = self._event_data(self.buffer[:end])
+            del self.buffer[: end + sep_len]
+            self.scan_from = 0
+
+            if data is not None:
+                events.append(data)
+
+        return events
+
+    def flush(self):
+        """
+        The data of the last event, if the stream ends without an empty line
+        """
+        data = self._event_data(self.buffer) if self.buffer else None
+        self.buffer.clear()
+        self.scan_from = 0
+
+        return [data] if data is not None else []
+
+    def _find_separator(self):
+        positions = [
+            (self.buffer.find(separator, self.scan_from), len(separator))
+            for separator in EVENT_SEPARATORS
+        ]
+        positions = [position for position in positions if position[0] >= 0]
+
+        return min(positions) if positions else (-1, 0)
+
+    @staticmethod
+    def _event_data(event):
+        """
+        The data of an event (data lines joined), None if no data
+        """
+        data_lines = []
+
+        for line in event.splitlines():
+            if line.startswith(b"data:"):
+                data_lines.append(line[5:].lstrip(b" "))
+
+        if not data_lines:
+            return None
+
+        return b"\n".join(data_lines).decode("utf-8")
+
+
+class ChatDeltaParser:
+    """
+    From the JSON payloads of the events to the typed deltas
+    """
+
+    def __init__(self, text_mode="delta"):
+        """
+        text_mode: delta, cumulative or auto (see TEXT_MODES)
+        """
+        if text_mode not in TEXT_MODES:
+            raise ValueError(
+                f"Value {text_mode} is not valid: must be one of {TEXT_MODES}"
+            )
+
+        self.text_mode = None if text_mode == "auto" else text_mode
+        self.text = ""
+        self.citations = []
+        self.finish_reason = None
+        self.citation_keys = set()
+
+    def parse(self, data):
+        """
+        The deltas of an event (JSON payload)
+        """
+        try:
+            payload = json.loads(data)
+        except json.JSONDecodeError:
+            return []
+
+        deltas = []
+        message = payload.get("message") or {}
+        content = message.get("content") or {}
+
+        text = self._new_text(content.get("text"))
+        if text:
+            self.text += text
+            deltas.append(TextDelta(text))
+
+        for values in content.get("citations") or []:
+            citation = Citation.from_dict(values)
+            key = (citation.source_text, citation.url, citation.doc_id)
+
+            if key not in self.citation_keys:
+                self.citation_keys.add(key)
+                self.citations.append(citation)
+                deltas.append(CitationDelta(citation))
+
+        self.finish_reason = (
+            payload.get("finishReason")
+            or payload.get("finish_reason")
+            or self.finish_reason
+        )
+
+        return deltas
+
+    def _new_text(self, text):
+        """
+        The new text in the event, by the text mode of the stream
+        """
+        if not text:
+            return ""
+
+        if self.text_mode is None and self.text:
+            # the second event with text: the mode is guessed for the stream
+            is_cumulative = len(text) > len(self.text) and text.startswith(self.text)
+            self.text_mode = "cumulative" if is_cumulative else "delta"
+
+        if self.text_mode != "cumulative":
+            return text
+
+        if not text.startswith(self.text):
+            # not the text so far: the events have only the new text
+            logger.warning("Text in the stream not cumulative, switched to delta")
+            self.text_mode = "delta"
+            return text
+
+        return text[len(self.text) :]
+
+    def end(self):
+        """
+        The EndOfTurn, when the stream is complete
+        """
+        return EndOfTurn(
+            text=self.text,
+            citations=list(self.citations),
+            finish_reason=self.finish_reason,
+        )
+
+
+def _iter_event_data(source):
+    """
+    The data of the events from the SDK response data (with events())
+    or from an iterable of bytes
+    """
+    if hasattr(source, "events"):
+        for event in source.events():
+            yield event.data
+        return
+
+    parser = SSEParser()
+    for chunk in source:
+        yield from parser.feed(chunk)
+    yield from parser.flush()
+
+
+def iter_chat_deltas(source, text_mode="delta"):
+    """
+    Iterate the typed deltas of a streamed answer
+
+    source: response.data of the OCI SDK, or an iterable of bytes
+    text_mode: delta, cumulative or auto (see TEXT_MODES)
+    """
+    parser = ChatDeltaParser(text_mode)
+
+    for data in _iter_event_data(source):
+        yield from parser.parse(data)
+
+    yield parser.end()
+
+
+async def aiter_chat_deltas(source, text_mode="delta"):
+    """
+    Async version of iter_chat_deltas
+
+    source: an async iterable of bytes (e.g. an aiohttp response content),
+        or a sync source (as in iter_chat_deltas) read in a thread
+    text_mode: delta, cumulative or auto (see TEXT_MODES)
+    """
+    parser = ChatDeltaParser(text_mode)
+
+    if hasattr(source, "__aiter__"):
+        sse_parser = SSEParser()
+
+        async for chunk in source:
+            for data in sse_parser.feed(chunk):
+                for delta in parser.parse(data):
+                    yield delta
+
+        for data in sse_parser.flush():
+            for delta in parser.parse(data):
+                yield delta
+    else:
+        # the SDK is sync: the blocking reads are done in a thread
+        events = _iter_event_data(source)
+        done = object()
+
+        while True:
+            data = await asyncio.to_thread(next, events, done)
+
+            if data is done:
+                break
+
+            for delta in parser.parse(data):
+                yield delta
+
+    yield parser.end()
@@ -2,12 +2,14 @@
 OCI Summarizer
 """
 
-from oci_models import create_model_for_answer_directly
+from oci_models import create_model_for_answer_directly, create_prompt_budgeter
 from utils import get_console_logger
 
 logger = get_console_logger()
 
-PROMPT_SUMMARIZER_TEMPLATE = """
+# instructions and response format are kept apart, to be reused
+# when the document is not in the same message (see doc_analyzer_backend)
+SUMMARIZER_INSTRUCTIONS = """
     You are an expert summarizer with strong analytical skills. 
     Your task is to generate a **clear, concise, and well-structured** summary of the following text.
 
@@ -17,15 +19,23 @@ PROMPT_SUMMARIZER_TEMPLATE = """
     - Maintain **logical flow and coherence** in the summary.
     - Preserve the **original intent and meaning** while using **clear and concise language**.
     - Avoid unnecessary details, repetitions, or excessive examples.
+"""
 
-    ### **Text to Summarize:**
-    {text}
-
+SUMMARIZER_RESPONSE_FORMAT = """
     ### **Expected Response Format:**
     **Summary:**  
     [Well-structured and concise summary, approximately 250-300 words]  
     """
 
+PROMPT_SUMMARIZER_TEMPLATE = (
+    SUMMARIZER_INSTRUCTIONS
+    + """
+    ### **Text to Summarize:**
+    {text}
+"""
+    + SUMMARIZER_RESPONSE_FORMAT
+)
+
 
 class OCISummarizer:
     """
@@ -37,14 +47,18 @@ class OCISummarizer:
         Init
         """
         self.llm = create_model_for_answer_directly()
+        self.budgeter = create_prompt_budgeter()
 
     def summarize(self, text: str) -> str:
         """
         summarize
         """
-        PROMPT_SUMMARIZER = PROMPT_SUMMARIZER_TEMPLATE.format(text=text)
-
         try:
+            # the text is trimmed, if needed, to fit in the context window
+            PROMPT_SUMMARIZER = self.budgeter.fit_template(
+                PROMPT_SUMMARIZER_TEMPLATE, text=text
+            )
+
             msg = self.llm.invoke(PROMPT_SUMMARIZER)
             response = msg.content if msg else "Error: No response from LLM"
         except Exception as e:
@@ -2,12 +2,19 @@
 Factory for the Vector Store based on 23AI
 """
 
+import array
+from functools import lru_cache
+
 import oracledb
 from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_community.embeddings import OCIGenAIEmbeddings
 from langchain_community.vectorstores.oraclevs import OracleVS
 
-from config_reader import ConfigReader
+from embedding_cache import CachedEmbeddings
+from metadata_filter import build_metadata_filter
+from hybrid_retriever import to_document
+from vector_mirror import VectorMirror
+from config_reader import get_config
 from config_private import (
     COMPARTMENT_OCID,
     CONNECT_ARGS,
@@ -15,13 +22,15 @@ from config_private import (
 
 from utils import get_console_logger
 
-config = ConfigReader("config.toml")
-
 
+# only one instance: the embedding cache is shared by all the vector stores
+@lru_cache(maxsize=1)
 def create_embedding_model():
     """
-    Create the Embedding Model
+    Create the Embedding Model (with the embedding cache)
     """
+    config = get_config("config.toml")
+
     embed_model_id = config.find_key("embed_model_id")
     embed_model_endpoint = config.find_key("embed_model_endpoint")
 
@@ -32,7 +41,12 @@ def create_embedding_model():
         compartment_id=COMPARTMENT_OCID,
     )
 
-    return embed_model
+    return CachedEmbeddings(
+        embed_model,
+        model_id=embed_model_id,
+        max_entries=config.find_key("embed_cache_size") or 10000,
+        cache_path=config.find_key("embed_cache_path") or None,
+    )
 
 
 def create_db_connection():
@@ -44,6 +58,19 @@ def create_db_connection():
     return conn
 
 
+# one pool: the searches on several collections are done concurrently
+@lru_cache(maxsize=1)
+def get_db_pool():
+    """
+    The pool of DB connections (size from db_pool_max in config)
+    """
+    config = get_config("config.toml")
+
+    return oracledb.create_pool(
+        **CONNECT_ARGS, min=1, max=config.find_key("db_pool_max") or 8, increment=1
+    )
+
+
 def create_vector_store(collection_name: str):
     """
     Create the Vector Store
@@ -68,3 +95,70 @@ def create_vector_store(collection_name: str):
         logger.error(err_msg)
 
     return v_store
+
+
+def filtered_similarity_search(connection, collection_name, query_vector, k, filters):
+    """
+    Vector search only on the chunks that match the metadata filters
+    (e.g. {"source": "manual.pdf"}, see metadata_filter)
+
+    The filter is in the WHERE clause: only the chunks that match
+    are compared (using the metadata index, if any)
+
+    :return: list of (Document, cosine distance)
+    """
+    condition, binds = build_metadata_filter(filters)
+    where = f"WHERE {condition}" if condition else ""
+
+    sql = f"""
+        SELECT text, metadata,
+            VECTOR_DISTANCE(embedding, :query_vector, COSINE) AS distance
+        FROM {collection_name}
+        {where}
+        ORDER BY distance
+        FETCH FIRST :k ROWS ONLY
+        """
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, query_vector=array.array("f", query_vector), k=k, **binds)
+
+        return [
+            (to_document(text, metadata), float(distance))
+            for text, metadata, distance in cursor
+        ]
+
+
+@lru_cache(maxsize=8)
+def get_vector_mirror(collection_name: str):
+    """
+    The in-process mirror of the collection (one for each collection)
+    """
+    config = get_config("config.toml")
+
+    return VectorMirror(
+        collection_name,
+        mirror_dir=config.find_key("vector_mirror_dir"),
+        max_rows=config.find_key("vector_mirror_max_rows"),
+        refresh_interval=config.find_key("vector_mirror_refresh"),
+    )
+
+
+def mirror_similarity_search(collection_name, query_vector, k, filters=None):
+    """
+    Vector search on the in-process mirror of the collection
+    (refreshed in background if the collection has changed)
+
+    :return: list of (Document, cosine distance), or None if the mirror
+        is not built yet or the collection is too large for the mirror
+        (the search must be done in the DB)
+    """
+    mirror = get_vector_mirror(collection_name)
+
+    # rebuilt in background, with a connection of the pool:
+    # the search uses the current mirror (or the DB, if not built yet)
+    mirror.refresh_in_background(lambda: get_db_pool().acquire())
+
+    if not mirror.available:
+        return None
+
+    return mirror.search(query_vector, k, filters)
@@ -0,0 +1,123 @@
+"""
+Question condenser
+
+Rewriting the question as a standalone question (to retrieve with it)
+costs an LLM call, serial with the rest of the RAG chain. It is done only
+when needed:
+    - never on the first turn (empty history)
+    - only if the question seems to reference the conversation
+      (pronouns as "it", "that", "the previous"..., or very short questions)
+    - condensed forms are cached (same question, same recent history)
+
+Usage:
+    condenser = QuestionCondenser(condense_fn)
+    standalone_question = condenser.condense(question, chat_history)
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+# words that usually refer to something said before
+REFERENCE_PATTERN = re.compile(
+    r"\b("
+    r"it|its|it's|itself|this|that|these|those|they|them|their|theirs|"
+    r"he|him|his|she|her|hers|one|ones|such|"
+    r"previous|previously|above|earlier|before|former|latter|last|same|"
+    r"also|too|again|more|else|other|another|instead|then|"
+    r"what about|how about|and what|and how|why not"
+    r")\b",
+    re.IGNORECASE,
+)
+
+# questions with few words ("why?", "and in 2024?") are often follow-ups
+MIN_STANDALONE_WORDS = 4
+
+
+def has_references(question):
+    """
+    Cheap local check: does the question seem to depend on the history?
+    """
+    if len(question.split()) < MIN_STANDALONE_WORDS:
+        return True
+
+    return REFERENCE_PATTERN.search(question) is not None
+
+
+class QuestionCondenser:
+    """
+    Rewrite the question as standalone only when needed, with a cache
+    """
+
+    def __init__(self, condense_fn, cache_size=256, history_messages=4):
+        """
+        condense_fn: function (question, chat_history) -> standalone question
+        cache_size (int): condensed questions cached (LRU)
+        history_messages (int): last messages of the history in the cache key
+        """
+        self.condense_fn = condense_fn
+        self.cache_size = cache_size
+        self.history_messages = history_messages
+
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.n_skipped = 0
+        self.n_cache_hits = 0
+        self.n_condensed = 0
+
+    def needs_condensation(self, question, chat_history):
+        """
+        True if the question must be rewritten using the history
+        """
+        return bool(chat_history) and has_references(question)
+
+    def _cache_key(self, question, chat_history):
+        recent = chat_history[-self.history_messages :]
+
+        return (
+            " ".join(question.lower().split()),
+            tuple(msg.content for msg in recent),
+        )
+
+    def condense(self, question, chat_history):
+        """
+        Return the standalone question
+        """
+        if not self.needs_condensation(question, chat_history):
+            self.n_skipped += 1
+            return question
+
+        key = self._cache_key(question, chat_history)
+
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.n_cache_hits += 1
+                return self.cache[key]
+
+        standalone_question = self.condense_fn(question, chat_history)
+        self.n_condensed += 1
+
+        logger.info("Question condensed: %s", standalone_question)
+
+        with self.lock:
+            self.cache[key] = standalone_question
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return standalone_question
+
+    def stats(self):
+        """
+        Metrics: how many LLM calls have been avoided
+        """
+        return {
+            "condense_skipped": self.n_skipped,
+            "condense_cache_hits": self.n_cache_hits,
+            "condense_llm_calls": self.n_condensed,
+        }
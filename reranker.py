@@ -0,0 +1,179 @@
+"""
+Reranker of the chunks retrieved
+
+More chunks than needed are retrieved (candidates), scored locally and
+only the best ones, within a token budget, are sent to the LLM.
+
+Methods:
+    fusion: the similarity from the vector search fused with a BM25 score
+        computed on the candidates (no model to load)
+    cross_encoder: a cross-encoder (question, chunk) on CPU, loaded with
+        transformers. If it can't be loaded, fusion is used
+
+Usage:
+    reranker = Reranker(method="fusion", top_n=4, max_tokens=3000)
+    docs = reranker.rerank(question, docs_and_similarities)
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from bm25_index import BM25Index
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+RERANK_METHODS = ("fusion", "cross_encoder")
+
+DEFAULT_CROSS_ENCODER = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# used when no count function is provided
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=2)
+def get_cross_encoder(model_name):
+    """
+    Load (only once) the cross-encoder: (tokenizer, model), or None
+    """
+    try:
+        # imported here: heavy, and needed only for this method
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.eval()
+
+        return torch, tokenizer, model
+    except Exception as e:
+        logger.warning("Cross-encoder %s not loaded, using fusion: %s", model_name, e)
+        return None
+
+
+def min_max(values):
+    """
+    Scale the values in [0, 1]
+    """
+    values = np.asarray(values, dtype=np.float32)
+    value_range = values.max() - values.min()
+
+    if value_range == 0:
+        return np.ones_like(values)
+
+    return (values - values.min()) / value_range
+
+
+class Reranker:
+    """
+    Rerank the candidates and select the best ones within a token budget
+    """
+
+    def __init__(
+        self,
+        method="fusion",
+        top_n=4,
+        max_tokens=3000,
+        bm25_weight=0.3,
+        cross_encoder_model=DEFAULT_CROSS_ENCODER,
+        count_fn=None,
+    ):
+        """
+        method (str): fusion or cross_encoder
+        top_n (int): max chunks returned
+        max_tokens (int): max tokens of the chunks returned
+        bm25_weight (float): weight of BM25 in fusion (the rest: similarity)
+        cross_encoder_model (str): HF name of the cross-encoder
+        count_fn: function (text) -> tokens (default: estimate)
+        """
+        if method not in RERANK_METHODS:
+            raise ValueError(
+                f"Value {method} is not valid: must be one of {RERANK_METHODS}"
+            )
+
+        self.method = method
+        self.top_n = top_n
+        self.max_tokens = max_tokens
+        self.bm25_weight = bm25_weight
+        self.cross_encoder_model = cross_encoder_model
+        self.count_fn = count_fn or (lambda text: len(text) // CHARS_PER_TOKEN)
+
+    def fusion_scores(self, question, docs, similarities):
+        """
+        Weighted sum of the BM25 scores and of the similarities (normalized)
+        """
+        index = BM25Index()
+        index.add(range(len(docs)), [doc.page_content for doc in docs])
+
+        return self.bm25_weight * min_max(index.scores(question)) + (
+            1 - self.bm25_weight
+        ) * min_max(similarities)
+
+    def cross_encoder_scores(self, question, docs):
+        """
+        Scores of the cross-encoder, None if not available
+        """
+        cross_encoder = get_cross_encoder(self.cross_encoder_model)
+
+        if cross_encoder is None:
+            return None
+
+        torch, tokenizer, model = cross_encoder
+
+        features = tokenizer(
+            [question] * len(docs),
+            [doc.page_content for doc in docs],
+            padding=True,
+            truncation=True,
+            max_length=512,
+            return_tensors="pt",
+        )
+        with torch.no_grad():
+            logits = model(**features).logits
+
+        return logits[:, 0].numpy() if logits.dim() > 1 else logits.numpy()
+
+    def rerank(self, question, docs_and_similarities):
+        """
+        Return the best chunks, within top_n and max_tokens
+
+        docs_and_similarities: list of (Document, similarity) from the
+            vector search (higher is more similar)
+        """
+        if not docs_and_similarities:
+            return []
+
+        docs = [doc for doc, _ in docs_and_similarities]
+        similarities = [similarity for _, similarity in docs_and_similarities]
+
+        scores = None
+        if self.method == "cross_encoder":
+            scores = self.cross_encoder_scores(question, docs)
+        if scores is None:
+            scores = self.fusion_scores(question, docs, similarities)
+
+        selected = []
+        n_tokens = 0
+
+        for i in np.argsort(-np.asarray(scores), kind="stable"):
+            doc_tokens = self.count_fn(docs[i].page_content)
+
+            # the best chunk is always kept
+            if selected and n_tokens + doc_tokens > self.max_tokens:
+                continue
+
+            selected.append(docs[i])
+            n_tokens += doc_tokens
+
+            if len(selected) == self.top_n:
+                break
+
+        logger.info(
+            "Reranked %d chunks, %d selected (%d tokens)",
+            len(docs),
+            len(selected),
+            n_tokens,
+        )
+
+        return selected
@@ -10,7 +10,7 @@ A very good guide is this one:
 import oracledb
 
 from sql_agent import SQLAgent
-from config_reader import ConfigReader
+from config_reader import ConfigReader, get_config
 from config_private import CONNECT_ARGS
 from utils import get_console_logger
 
@@ -23,11 +23,13 @@ class SelectAISQLAgent(SQLAgent):
     Implementation of the SQL Agent based on Select AI
     """
 
-    def __init__(self, config: ConfigReader):
+    def __init__(self, config: ConfigReader = None):
         """
         init
+
+        config: if not provided, the shared config (config.toml) is used
         """
-        self.config = config
+        self.config = config or get_config("config.toml")
 
     def get_db_connection(self):
         """
@@ -0,0 +1,327 @@
+"""
+Semantic cache for the answers of the RAG agent
+
+An answer is reused when a new question is near (cosine similarity of the
+embeddings above a threshold) to a question already answered, and the
+set of chunks retrieved is the same (same fingerprint): if the documents in
+the collection change, the cached answer is not used.
+
+Both backends are bounded: at most max_entries answers (the oldest are
+removed) and answers older than ttl secs. are not used (and removed).
+
+Backends:
+    memory: a NumPy matrix in the process (small deployments)
+    oracle: a table in Oracle 23AI, shared by all the instances
+
+Usage:
+    cache = create_semantic_cache("memory", threshold=0.95)
+    fingerprint = fingerprint_chunks(docs)
+    answer = cache.lookup(query_vector, fingerprint)
+    if answer is None:
+        ...
+        cache.add(question, query_vector, fingerprint, answer)
+"""
+
+import array
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from bm25_index import content_key
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_MAX_ENTRIES = 1000
+# secs. (one day)
+DEFAULT_TTL = 86400
+
+
+def fingerprint_chunks(docs):
+    """
+    Fingerprint of the set of chunks retrieved
+
+    The order is not considered (the reranker orders the chunks for each
+    question): a paraphrase retrieving the same chunks has the same fingerprint
+    """
+    hasher = hashlib.sha1()
+
+    for key in sorted({content_key(doc.page_content) for doc in docs}):
+        hasher.update(key.encode("ascii"))
+
+    return hasher.hexdigest()
+
+
+class SemanticCache(ABC):
+    """
+    Interface of the semantic caches
+    """
+
+    def __init__(
+        self,
+        threshold=DEFAULT_THRESHOLD,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        ttl=DEFAULT_TTL,
+    ):
+        """
+        threshold (float): min cosine similarity to reuse an answer
+        max_entries (int): max answers in the cache
+        ttl (float): secs. after which an answer is not used (None: never)
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self.n_hits = 0
+        self.n_misses = 0
+
+    @abstractmethod
+    def _search(self, query_vector, fingerprint):
+        """
+        Return (answer, similarity) of the nearest entry with the fingerprint
+        """
+
+    @abstractmethod
+    def add(self, question, query_vector, fingerprint, answer):
+        """
+        Add an answer to the cache
+        """
+
+    def lookup(self, query_vector, fingerprint):
+        """
+        Return the cached answer, or None
+        """
+        answer, similarity = self._search(query_vector, fingerprint)
+
+        if answer is not None and similarity >= self.threshold:
+            self.n_hits += 1
+            logger.info("Semantic cache hit, similarity: %.3f", similarity)
+            return answer
+
+        self.n_misses += 1
+        return None
+
+    def stats(self):
+        """
+        Metrics on the cache
+        """
+        return {
+            "semantic_cache_hits": self.n_hits,
+            "semantic_cache_misses": self.n_misses,
+        }
+
+
+class InMemorySemanticCache(SemanticCache):
+    """
+    Semantic cache in a NumPy matrix (the oldest entries are replaced)
+    """
+
+    def __init__(
+        self,
+        threshold=DEFAULT_THRESHOLD,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        ttl=DEFAULT_TTL,
+    ):
+        super().__init__(threshold, max_entries, ttl)
+
+        # normalized vectors (allocated with the first entry), fingerprints,
+        # answers and when they were added
+        self.vectors = None
+        self.fingerprints = np.empty(max_entries, dtype=object)
+        self.answers = [None] * max_entries
+        self.created = np.zeros(max_entries, dtype=np.float64)
+
+        self.n_entries = 0
+        # where the next entry is written (ring buffer)
+        self.next_pos = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+
+        return vector / norm if norm > 0 else vector
+
+    def _search(self, query_vector, fingerprint):
+        query_vector = self._normalize(query_vector)
+
+        with self.lock:
+            if self.n_entries == 0:
+                return None, 0.0
+
+            mask = self.fingerprints[: self.n_entries] == fingerprint
+            if self.ttl is not None:
+                mask &= self.created[: self.n_entries] >= time.time() - self.ttl
+
+            candidates = np.flatnonzero(mask)
+            if len(candidates) == 0:
+                return None, 0.0
+
+            similarities = self.vectors[candidates] @ query_vector
+            best = int(np.argmax(similarities))
+
+            return self.answers[candidates[best]], float(similarities[best])
+
+    def add(self, question, query_vector, fingerprint, answer):
+        query_vector = self._normalize(query_vector)
+
+        with self.lock:
+            if self.vectors is None:
+                self.vectors = np.zeros(
+                    (self.max_entries, len(query_vector)), dtype=np.float32
+                )
+
+            self.vectors[self.next_pos] = query_vector
+            self.fingerprints[self.next_pos] = fingerprint
+            self.answers[self.next_pos] = answer
+            self.created[self.next_pos] = time.time()
+
+            self.next_pos = (self.next_pos + 1) % self.max_entries
+            self.n_entries = min(self.n_entries + 1, self.max_entries)
+
+    def clear(self):
+        """
+        Remove all the entries
+        """
+        with self.lock:
+            self.n_entries = 0
+            self.next_pos = 0
+
+
+class OracleSemanticCache(SemanticCache):
+    """
+    Semantic cache in a table of Oracle 23AI, shared by the agents
+    """
+
+    def __init__(
+        self,
+        connection,
+        table_name="RAG_SEMANTIC_CACHE",
+        threshold=DEFAULT_THRESHOLD,
+        max_entries=DEFAULT_MAX_ENTRIES,
+        ttl=DEFAULT_TTL,
+        evict_every=100,
+    ):
+        """
+        connection: an oracledb connection
+        table_name: the table (created if it doesn't exist)
+        evict_every: the old entries are removed every evict_every adds
+        """
+        super().__init__(threshold, max_entries, ttl)
+
+        self.connection = connection
+        self.table_name = table_name
+        self.evict_every = evict_every
+        self.n_adds = 0
+        self.lock = threading.Lock()
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"""CREATE TABLE IF NOT EXISTS {table_name} (
+                    id NUMBER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                    question CLOB,
+                    embedding VECTOR,
+                    fingerprint VARCHAR2(64) NOT NULL,
+                    answer CLOB,
+                    created_at TIMESTAMP DEFAULT SYSTIMESTAMP)"""
+            )
+            # the search is done only on the entries with the same chunks
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table_name}_fp_idx "
+                f"ON {table_name} (fingerprint)"
+            )
+
+    def _search(self, query_vector, fingerprint):
+        with self.lock, self.connection.cursor() as cursor:
+            # no ttl: all the entries (the interval of 1e9 secs. is ~30 years)
+            cursor.execute(
+                f"""SELECT answer,
+                    1 - VECTOR_DISTANCE(embedding, :query_vector, COSINE)
+                FROM {self.table_name}
+                WHERE fingerprint = :fingerprint
+                AND created_at >= SYSTIMESTAMP - NUMTODSINTERVAL(:ttl, 'SECOND')
+                ORDER BY VECTOR_DISTANCE(embedding, :query_vector, COSINE)
+                FETCH FIRST 1 ROWS ONLY""",
+                query_vector=array.array("f", query_vector),
+                fingerprint=fingerprint,
+                ttl=self.ttl if self.ttl is not None else 1e9,
+            )
+            row = cursor.fetchone()
+
+            if row is None:
+                return None, 0.0
+
+            answer = row[0].read() if hasattr(row[0], "read") else row[0]
+
+        return answer, float(row[1])
+
+    def add(self, question, query_vector, fingerprint, answer):
+        with self.lock, self.connection.cursor() as cursor:
+            cursor.execute(
+                f"""INSERT INTO {self.table_name}
+                    (question, embedding, fingerprint, answer)
+                VALUES (:question, :embedding, :fingerprint, :answer)""",
+                question=question,
+                embedding=array.array("f", query_vector),
+                fingerprint=fingerprint,
+                answer=answer,
+            )
+            self.connection.commit()
+
+            self.n_adds += 1
+            if self.n_adds % self.evict_every == 0:
+                self._evict(cursor)
+
+    def _evict(self, cursor):
+        """
+        Remove the expired entries and the oldest above max_entries
+        """
+        n_deleted = 0
+
+        if self.ttl is not None:
+            cursor.execute(
+                f"""DELETE FROM {self.table_name}
+                WHERE created_at < SYSTIMESTAMP - NUMTODSINTERVAL(:ttl, 'SECOND')""",
+                ttl=self.ttl,
+            )
+            n_deleted += cursor.rowcount
+
+        # the ids are increasing: the oldest entries have the lowest ids
+        cursor.execute(
+            f"""DELETE FROM {self.table_name}
+            WHERE id <= (SELECT id FROM {self.table_name} ORDER BY id DESC
+                OFFSET :max_entries ROWS FETCH FIRST 1 ROWS ONLY)""",
+            max_entries=self.max_entries,
+        )
+        n_deleted += cursor.rowcount
+        self.connection.commit()
+
+        if n_deleted:
+            logger.info("Semantic cache: %d entries removed", n_deleted)
+
+    def clear(self):
+        """
+        Remove all the entries
+        """
+        with self.lock, self.connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE TABLE {self.table_name}")
+
+
+def create_semantic_cache(backend="memory", **kwargs):
+    """
+    Create a semantic cache
+
+    :param backend: "memory" or "oracle"
+    :param kwargs: passed to the cache (e.g. connection for oracle)
+    """
+    if backend == "memory":
+        return InMemorySemanticCache(**kwargs)
+    if backend == "oracle":
+        return OracleSemanticCache(**kwargs)
+
+    raise ValueError(f"Value {backend} is not valid: must be memory or oracle")
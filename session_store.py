@@ -0,0 +1,597 @@
+"""
+Session stores for the chat history
+
+The history of the sessions can be kept:
+    memory: in the process (LRU + TTL)
+    sqlite: in a SQLite file, shared by the processes on the same host
+    redis: in Redis, shared by all the workers behind a load balancer
+        (TTL handled by Redis). Without a server, an in-process stand-in
+        with the same interface can be used (for tests and benchmarks)
+
+Sessions are serialized in a compact form: JSON with short keys,
+zlib compressed when larger than 1 KB.
+
+update (read, change, write) is atomic in the store, also between
+processes: a lock (memory), a BEGIN IMMEDIATE transaction (sqlite),
+WATCH/MULTI with retries (redis).
+
+Usage:
+    store = create_session_store("sqlite", db_path="sessions.db")
+    manager = ChatHistoryManager(store=store)
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+# serialized sessions larger than this are compressed
+COMPRESS_MIN_BYTES = 1024
+
+# message type <-> code used in the serialization
+MESSAGE_CODES = {"human": "h", "ai": "a", "system": "s"}
+MESSAGE_CLASSES = {"h": HumanMessage, "a": AIMessage, "s": SystemMessage}
+
+
+@dataclass
+class SessionHistory:
+    """
+    The history of a session
+    """
+
+    messages: list = field(default_factory=list)
+    summary: str = ""
+    n_tokens: int = 0
+    n_turns: int = 0
+    last_access: float = field(default_factory=time.time)
+
+
+def dumps_session(history: SessionHistory) -> bytes:
+    """
+    Serialize a session (compact JSON, compressed if large)
+    """
+    data = json.dumps(
+        {
+            "m": [[MESSAGE_CODES[msg.type], msg.content] for msg in history.messages],
+            "s": history.summary,
+            "k": history.n_tokens,
+            "t": history.n_turns,
+            "a": history.last_access,
+        },
+        separators=(",", ":"),
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+    if len(data) > COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(data)
+
+    return b"j" + data
+
+
+def loads_session(data: bytes) -> SessionHistory:
+    """
+    Deserialize a session
+    """
+    data = bytes(data)
+    payload = zlib.decompress(data[1:]) if data[:1] == b"z" else data[1:]
+    values = json.loads(payload)
+
+    return SessionHistory(
+        messages=[
+            MESSAGE_CLASSES[code](content=content) for code, content in values["m"]
+        ],
+        summary=values["s"],
+        n_tokens=values["k"],
+        n_turns=values["t"],
+        last_access=values["a"],
+    )
+
+
+class SessionStore(ABC):
+    """
+    Interface of the session stores
+    """
+
+    def __init__(self, max_sessions=1000, session_ttl=3600):
+        """
+        max_sessions (int): above, the least recently used sessions are evicted
+        session_ttl (float): secs. of inactivity after which a session expires
+        """
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.n_evicted = 0
+
+    @abstractmethod
+    def get(self, session_id):
+        """
+        Return the SessionHistory, or None if it doesn't exist (or is expired)
+        """
+
+    @abstractmethod
+    def put(self, session_id, history):
+        """
+        Save the SessionHistory
+        """
+
+    @abstractmethod
+    def update(self, session_id, update_fn):
+        """
+        Atomic read-change-write of a session
+
+        update_fn: function (SessionHistory or None) -> SessionHistory to save
+        (it can be called more than once: no side effects)
+        :return: the SessionHistory saved
+        """
+
+    @abstractmethod
+    def delete(self, session_id):
+        """
+        Remove the session. Returns True if it existed
+        """
+
+    @abstractmethod
+    def histories(self):
+        """
+        Return all the (not expired) SessionHistory, for metrics
+        """
+
+    def evict(self):
+        """
+        Remove the expired sessions (and the LRU, if too many)
+        """
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Sessions in the process, LRU ordered
+    """
+
+    def __init__(self, max_sessions=1000, session_ttl=3600):
+        super().__init__(max_sessions, session_ttl)
+
+        # session_id -> serialized session, least recently used first
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        with self.lock:
+            data = self.sessions.get(session_id)
+
+            if data is None:
+                return None
+
+            self.sessions.move_to_end(session_id)
+
+        history = loads_session(data)
+
+        if time.time() - history.last_access > self.session_ttl:
+            self.delete(session_id)
+            return None
+
+        return history
+
+    def put(self, session_id, history):
+        data = dumps_session(history)
+
+        with self.lock:
+            self.sessions[session_id] = data
+            self.sessions.move_to_end(session_id)
+
+        self.evict()
+
+    def update(self, session_id, update_fn):
+        with self.lock:
+            data = self.sessions.get(session_id)
+            history = loads_session(data) if data is not None else None
+
+            if history and time.time() - history.last_access > self.session_ttl:
+                history = None
+
+            history = update_fn(history)
+            self.sessions[session_id] = dumps_session(history)
+            self.sessions.move_to_end(session_id)
+
+        self.evict()
+
+        return history
+
+    def delete(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def evict(self):
+        with self.lock:
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.n_evicted += 1
+
+        # LRU order: the expired sessions are at the beginning
+        while True:
+            with self.lock:
+                if not self.sessions:
+                    return
+                session_id, data = next(iter(self.sessions.items()))
+
+            if time.time() - loads_session(data).last_access <= self.session_ttl:
+                return
+
+            if self.delete(session_id):
+                self.n_evicted += 1
+
+    def histories(self):
+        self.evict()
+
+        with self.lock:
+            values = list(self.sessions.values())
+
+        return [loads_session(data) for data in values]
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a SQLite file, shared by the processes on the host
+    """
+
+    def __init__(
+        self,
+        db_path="sessions.db",
+        max_sessions=1000,
+        session_ttl=3600,
+        evict_every=100,
+        timeout=30.0,
+    ):
+        """
+        db_path: path of the SQLite file
+        evict_every: eviction is done every evict_every writes
+        timeout: max wait (sec.) for the lock on the database
+        """
+        super().__init__(max_sessions, session_ttl)
+
+        self.db_path = db_path
+        self.timeout = timeout
+        self.evict_every = evict_every
+        self.n_puts = 0
+        self.local = threading.local()
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS sessions_access_idx ON sessions (last_access)"
+        )
+
+    def _connection(self):
+        """
+        Return the connection for the current thread
+        """
+        conn = getattr(self.local, "conn", None)
+
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path, timeout=self.timeout, isolation_level=None
+            )
+            self.local.conn = conn
+
+        return conn
+
+    def get(self, session_id):
+        row = (
+            self._connection()
+            .execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND last_access >= ?",
+                (session_id, time.time() - self.session_ttl),
+            )
+            .fetchone()
+        )
+
+        return loads_session(row[0]) if row else None
+
+    def put(self, session_id, history):
+        self._write(self._connection(), session_id, history)
+        self._count_put()
+
+    def update(self, session_id, update_fn):
+        conn = self._connection()
+
+        # the write lock is taken at the beginning: no other process can
+        # change the session between the read and the write
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND last_access >= ?",
+                (session_id, time.time() - self.session_ttl),
+            ).fetchone()
+
+            history = update_fn(loads_session(row[0]) if row else None)
+            self._write(conn, session_id, history)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        conn.execute("COMMIT")
+        self._count_put()
+
+        return history
+
+    @staticmethod
+    def _write(conn, session_id, history):
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, last_access) "
+            "VALUES (?, ?, ?)",
+            (session_id, dumps_session(history), history.last_access),
+        )
+
+    def _count_put(self):
+        self.n_puts += 1
+        if self.n_puts % self.evict_every == 0:
+            self.evict()
+
+    def delete(self, session_id):
+        cursor = self._connection().execute(
+            "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+        )
+
+        return cursor.rowcount > 0
+
+    def evict(self):
+        conn = self._connection()
+
+        cursor = conn.execute(
+            "DELETE FROM sessions WHERE last_access < ?",
+            (time.time() - self.session_ttl,),
+        )
+        self.n_evicted += cursor.rowcount
+
+        cursor = conn.execute(
+            "DELETE FROM sessions WHERE session_id IN ("
+            "SELECT session_id FROM sessions ORDER BY last_access DESC "
+            "LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+        self.n_evicted += cursor.rowcount
+
+    def histories(self):
+        rows = self._connection().execute(
+            "SELECT data FROM sessions WHERE last_access >= ?",
+            (time.time() - self.session_ttl,),
+        )
+
+        return [loads_session(row[0]) for row in rows]
+
+
+class WatchError(Exception):
+    """
+    A watched key changed before the transaction (as redis.WatchError)
+    """
+
+
+class InProcessRedis:
+    """
+    Stand-in for a Redis client (the few commands used), in the process.
+
+    Only to run tests and benchmarks without a Redis server.
+    """
+
+    def __init__(self):
+        # key -> (value, expire time or None)
+        self.data = {}
+        # key -> number of changes (for WATCH)
+        self.versions = {}
+        self.lock = threading.Lock()
+
+    def _alive(self, key):
+        entry = self.data.get(key)
+
+        if entry is not None and entry[1] is not None and entry[1] < time.time():
+            self._remove(key)
+            return None
+
+        return entry
+
+    def _store(self, key, value, ex=None):
+        self.data[key] = (value, time.time() + ex if ex else None)
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def _remove(self, key):
+        if self.data.pop(key, None) is None:
+            return False
+
+        self.versions[key] = self.versions.get(key, 0) + 1
+        return True
+
+    def get(self, key):
+        with self.lock:
+            entry = self._alive(key)
+            return entry[0] if entry else None
+
+    def set(self, key, value, ex=None):
+        with self.lock:
+            self._store(key, value, ex)
+        return True
+
+    def delete(self, *keys):
+        with self.lock:
+            return sum(self._remove(key) for key in keys)
+
+    def pipeline(self):
+        return InProcessPipeline(self)
+
+    def scan_iter(self, match=None):
+        prefix = match.rstrip("*") if match else ""
+
+        with self.lock:
+            keys = [key for key in self.data if key.startswith(prefix)]
+
+        return iter([key for key in keys if self.get(key) is not None])
+
+
+class InProcessPipeline:
+    """
+    Pipeline of InProcessRedis: WATCH, MULTI, SET, EXECUTE (as redis-py)
+    """
+
+    def __init__(self, client):
+        self.client = client
+        # key -> version when watched
+        self.watched = {}
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def watch(self, *keys):
+        with self.client.lock:
+            for key in keys:
+                self.client._alive(key)
+                self.watched[key] = self.client.versions.get(key, 0)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def multi(self):
+        self.commands = []
+
+    def set(self, key, value, ex=None):
+        self.commands.append((key, value, ex))
+
+    def execute(self):
+        try:
+            with self.client.lock:
+                for key, version in self.watched.items():
+                    self.client._alive(key)
+                    if self.client.versions.get(key, 0) != version:
+                        raise WatchError(f"Watched key {key} changed")
+
+                for key, value, ex in self.commands:
+                    self.client._store(key, value, ex)
+
+            return [True] * len(self.commands)
+        finally:
+            self.reset()
+
+    def reset(self):
+        self.watched = {}
+        self.commands = []
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Sessions in Redis: TTL is set on every write (and expiration done by Redis)
+
+    max_sessions is not enforced: configure maxmemory-policy (e.g. allkeys-lru)
+    """
+
+    def __init__(
+        self,
+        client=None,
+        url="redis://localhost:6379/0",
+        prefix="rag:session:",
+        max_sessions=1000,
+        session_ttl=3600,
+    ):
+        """
+        client: a redis client (redis.Redis or InProcessRedis), default from url
+        url: the URL of the Redis server
+        prefix: prefix of the keys
+        """
+        super().__init__(max_sessions, session_ttl)
+
+        if client is None:
+            # imported here: redis is needed only for this store
+            import redis
+
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self.prefix = prefix
+
+        try:
+            from redis.exceptions import WatchError as RedisWatchError
+
+            self.watch_errors = (WatchError, RedisWatchError)
+        except ImportError:
+            self.watch_errors = (WatchError,)
+
+    def get(self, session_id):
+        data = self.client.get(self.prefix + session_id)
+
+        return loads_session(data) if data is not None else None
+
+    def put(self, session_id, history):
+        self.client.set(
+            self.prefix + session_id,
+            dumps_session(history),
+            ex=int(self.session_ttl),
+        )
+
+    def update(self, session_id, update_fn):
+        key = self.prefix + session_id
+
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    # the transaction fails if the key changes after the watch
+                    pipe.watch(key)
+                    data = pipe.get(key)
+
+                    history = update_fn(
+                        loads_session(data) if data is not None else None
+                    )
+
+                    pipe.multi()
+                    pipe.set(key, dumps_session(history), ex=int(self.session_ttl))
+                    pipe.execute()
+
+                    return history
+                except self.watch_errors:
+                    logger.debug("Session %s changed, update retried", session_id)
+
+    def delete(self, session_id):
+        return self.client.delete(self.prefix + session_id) > 0
+
+    def histories(self):
+        histories = []
+
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            data = self.client.get(key)
+
+            if data is not None:
+                histories.append(loads_session(data))
+
+        return histories
+
+
+def create_session_store(backend="memory", **kwargs):
+    """
+    Create a session store
+
+    :param backend: "memory", "sqlite" or "redis"
+    :param kwargs: passed to the store (e.g. db_path for sqlite, url for redis)
+    """
+    if backend == "memory":
+        return InMemorySessionStore(**kwargs)
+    if backend == "sqlite":
+        return SQLiteSessionStore(**kwargs)
+    if backend == "redis":
+        return RedisSessionStore(**kwargs)
+
+    raise ValueError(f"Value {backend} is not valid: must be memory, sqlite or redis")
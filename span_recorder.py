@@ -0,0 +1,418 @@
+"""
+Local span recorder and latency histograms
+
+An alternative to OCI APM for offline profiling: spans produced by
+py-zipkin (and therefore by every BaseAgentNode) are kept in a ring buffer
+and, optionally, appended to a local JSONL file.
+Latencies are aggregated per node in HDR-style histograms (p50/p95/p99).
+
+Usage:
+    as transport handler:
+        with zipkin_span(..., transport_handler=SpanRecorder("spans.jsonl")):
+            ...
+
+    from command line, to analyze a recorded run:
+        python span_recorder.py spans.jsonl
+        python span_recorder.py spans.jsonl --trace <trace_id>
+        python span_recorder.py spans.jsonl --folded > run.folded
+"""
+
+import argparse
+import json
+import math
+import threading
+from collections import Counter, defaultdict, deque
+
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+# width (in chars) of the bars in the flame-style breakdown
+BAR_WIDTH = 40
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram for latencies (values in microseconds)
+
+    Values are stored in log-linear buckets: the relative error of
+    any reported percentile is bounded by the number of significant figures.
+    Memory is proportional to the number of distinct buckets used.
+    """
+
+    def __init__(self, significant_figures=2):
+        """
+        significant_figures (int): precision of the recorded values (1-5)
+        """
+        if not 1 <= significant_figures <= 5:
+            raise ValueError("significant_figures must be between 1 and 5")
+
+        # number of sub buckets needed to get the requested precision
+        largest_single_unit = 2 * 10**significant_figures
+        self.sub_bucket_magnitude = math.ceil(math.log2(largest_single_unit))
+        self.sub_bucket_count = 1 << self.sub_bucket_magnitude
+        self.sub_bucket_half_magnitude = self.sub_bucket_magnitude - 1
+        self.sub_bucket_half_count = self.sub_bucket_count >> 1
+
+        self.counts = Counter()
+        self.total_count = 0
+        self.min_value = None
+        self.max_value = None
+        self.total_value = 0
+
+    def _counts_index(self, value):
+        """
+        Index of the bucket for value
+        """
+        bucket_index = max(0, value.bit_length() - self.sub_bucket_magnitude)
+        sub_bucket_index = value >> bucket_index
+
+        return ((bucket_index + 1) << self.sub_bucket_half_magnitude) + (
+            sub_bucket_index - self.sub_bucket_half_count
+        )
+
+    def _value_from_index(self, index):
+        """
+        Representative (mid-point) value for the bucket at index
+        """
+        if index < self.sub_bucket_count:
+            bucket_index = 0
+            sub_bucket_index = index
+        else:
+            bucket_index = (index >> self.sub_bucket_half_magnitude) - 1
+            sub_bucket_index = (
+                index & (self.sub_bucket_half_count - 1)
+            ) + self.sub_bucket_half_count
+
+        lowest = sub_bucket_index << bucket_index
+        size = 1 << bucket_index
+
+        return lowest + (size >> 1)
+
+    def record(self, value, count=1):
+        """
+        Record a latency (in microseconds)
+        """
+        value = max(0, int(value))
+
+        self.counts[self._counts_index(value)] += count
+        self.total_count += count
+        self.total_value += value * count
+
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+
+    def merge(self, other):
+        """
+        Add all the values recorded in another histogram (same precision)
+        """
+        if other.sub_bucket_magnitude != self.sub_bucket_magnitude:
+            raise ValueError("Cannot merge histograms with different precision")
+
+        self.counts.update(other.counts)
+        self.total_count += other.total_count
+        self.total_value += other.total_value
+
+        for value in (other.min_value, other.max_value):
+            if value is not None:
+                self.min_value = (
+                    value if self.min_value is None else min(self.min_value, value)
+                )
+                self.max_value = (
+                    value if self.max_value is None else max(self.max_value, value)
+                )
+
+    def percentile(self, pct):
+        """
+        Return the value at the given percentile (0-100)
+        """
+        if self.total_count == 0:
+            return 0
+
+        target = max(1, math.ceil(pct / 100.0 * self.total_count))
+
+        cumulative = 0
+        for index in sorted(self.counts):
+            cumulative += self.counts[index]
+            if cumulative >= target:
+                # never report outside the recorded range
+                value = self._value_from_index(index)
+                return min(max(value, self.min_value), self.max_value)
+
+        return self.max_value
+
+    def mean(self):
+        """
+        Mean of the recorded values
+        """
+        if self.total_count == 0:
+            return 0.0
+        return self.total_value / self.total_count
+
+
+def decode_spans(encoded_span):
+    """
+    Decode the payload produced by py-zipkin (Encoding.V2_JSON)
+
+    Returns:
+        list[dict]: the list of spans
+    """
+    if isinstance(encoded_span, (bytes, bytearray)):
+        encoded_span = encoded_span.decode("utf-8")
+
+    spans = json.loads(encoded_span)
+
+    if isinstance(spans, dict):
+        spans = [spans]
+
+    return spans
+
+
+class SpanRecorder:
+    """
+    Transport handler that records spans locally
+
+    Spans are kept in a bounded ring buffer (the oldest are dropped)
+    and, if a file is given, appended to it in JSONL format (one span per line),
+    so that they can be analyzed later with the CLI.
+    """
+
+    def __init__(self, file_path=None, buffer_size=10000):
+        """
+        file_path (str): optional JSONL file where spans are appended
+        buffer_size (int): max number of spans kept in memory
+        """
+        self.file_path = file_path
+        self.spans = deque(maxlen=buffer_size)
+        # transport can be called from several threads (parallel nodes)
+        self.lock = threading.Lock()
+
+    def __call__(self, encoded_span):
+        """
+        Transport handler interface, as expected by py-zipkin
+        """
+        try:
+            spans = decode_spans(encoded_span)
+        except (ValueError, UnicodeDecodeError) as e:
+            logger.error("Unable to decode spans: %s", str(e))
+            return
+
+        with self.lock:
+            self.spans.extend(spans)
+
+            if self.file_path:
+                try:
+                    with open(self.file_path, "a", encoding="utf-8") as f:
+                        for span in spans:
+                            f.write(json.dumps(span) + "\n")
+                except OSError as e:
+                    logger.error("Unable to write spans to file: %s", str(e))
+
+    def get_spans(self):
+        """
+        Return a copy of the spans in the buffer
+        """
+        with self.lock:
+            return list(self.spans)
+
+    def clear(self):
+        """
+        Clear the in-memory buffer (the file is not changed)
+        """
+        with self.lock:
+            self.spans.clear()
+
+
+def load_spans(file_path):
+    """
+    Read spans from a JSONL file written by SpanRecorder
+    """
+    spans = []
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                spans.append(json.loads(line))
+
+    return spans
+
+
+def latency_by_node(spans, significant_figures=2):
+    """
+    Aggregate the durations of spans by name (node_<ClassName>, ...)
+
+    Returns:
+        dict: span name -> LatencyHistogram
+    """
+    histograms = defaultdict(lambda: LatencyHistogram(significant_figures))
+
+    for span in spans:
+        if "duration" in span:
+            histograms[span.get("name", "unknown")].record(span["duration"])
+
+    return dict(histograms)
+
+
+def group_by_trace(spans):
+    """
+    Group spans by traceId, traces ordered by start time
+    """
+    traces = defaultdict(list)
+
+    for span in spans:
+        traces[span.get("traceId")].append(span)
+
+    return dict(
+        sorted(
+            traces.items(),
+            key=lambda item: min(s.get("timestamp", 0) for s in item[1]),
+        )
+    )
+
+
+def _build_tree(spans):
+    """
+    Return (roots, children) for the spans of a single trace
+    """
+    ids = {span.get("id") for span in spans}
+    children = defaultdict(list)
+    roots = []
+
+    for span in sorted(spans, key=lambda s: s.get("timestamp", 0)):
+        parent_id = span.get("parentId")
+
+        if parent_id and parent_id in ids:
+            children[parent_id].append(span)
+        else:
+            roots.append(span)
+
+    return roots, children
+
+
+def format_latency_report(spans):
+    """
+    Format a table with per node latencies (ms)
+    """
+    histograms = latency_by_node(spans)
+
+    lines = [
+        f"{'span':<40} {'count':>7} {'mean':>10} {'p50':>10} "
+        f"{'p95':>10} {'p99':>10} {'max':>10}"
+    ]
+
+    for name, hist in sorted(
+        histograms.items(), key=lambda item: item[1].total_value, reverse=True
+    ):
+        lines.append(
+            f"{name:<40} {hist.total_count:>7} {hist.mean() / 1000:>10.1f} "
+            f"{hist.percentile(50) / 1000:>10.1f} {hist.percentile(95) / 1000:>10.1f} "
+            f"{hist.percentile(99) / 1000:>10.1f} {hist.max_value / 1000:>10.1f}"
+        )
+
+    return "\n".join(lines)
+
+
+def format_flame(spans):
+    """
+    Format a flame-style (indented tree) breakdown of a single trace
+    """
+    roots, children = _build_tree(spans)
+
+    if not roots:
+        return ""
+
+    total = max(span.get("duration", 0) for span in roots) or 1
+    lines = []
+
+    def visit(span, depth):
+        duration = span.get("duration", 0)
+        share = duration / total
+        label = "  " * depth + span.get("name", "unknown")
+        bar = "█" * max(1, round(share * BAR_WIDTH))
+
+        lines.append(f"{label:<50} {duration / 1000:>10.1f} ms {share:>7.1%} {bar}")
+
+        for child in children.get(span.get("id"), []):
+            visit(child, depth + 1)
+
+    for root in roots:
+        visit(root, 0)
+
+    return "\n".join(lines)
+
+
+def folded_stacks(spans):
+    """
+    Compute folded stacks (self time, in microseconds) for all the traces,
+    in the format used by flamegraph.pl and speedscope
+    """
+    folded = Counter()
+
+    for trace_spans in group_by_trace(spans).values():
+        roots, children = _build_tree(trace_spans)
+
+        def visit(span, path):
+            path = path + [span.get("name", "unknown")]
+            kids = children.get(span.get("id"), [])
+            self_time = span.get("duration", 0) - sum(
+                kid.get("duration", 0) for kid in kids
+            )
+            folded[";".join(path)] += max(0, self_time)
+
+            for kid in kids:
+                visit(kid, path)
+
+        for root in roots:
+            visit(root, [])
+
+    return folded
+
+
+def main():
+    """
+    CLI to print the analysis of recorded spans
+    """
+    parser = argparse.ArgumentParser(description="Analyze locally recorded spans.")
+
+    parser.add_argument("spans_file", type=str, help="JSONL file with the spans.")
+    parser.add_argument(
+        "--trace", type=str, default=None, help="trace id (default: last trace)."
+    )
+    parser.add_argument(
+        "--folded",
+        action="store_true",
+        help="print folded stacks for flamegraph tools.",
+    )
+
+    args = parser.parse_args()
+
+    spans = load_spans(args.spans_file)
+
+    if args.folded:
+        for stack, self_time in sorted(folded_stacks(spans).items()):
+            print(f"{stack} {self_time}")
+        return
+
+    traces = group_by_trace(spans)
+
+    print("")
+    print(f"Spans: {len(spans)}, traces: {len(traces)}")
+    print("")
+    print("Latency by span (ms):")
+    print(format_latency_report(spans))
+
+    if traces:
+        trace_id = args.trace or list(traces)[-1]
+
+        print("")
+        print(f"Breakdown of trace {trace_id}:")
+        print(format_flame(traces.get(trace_id, [])))
+
+    print("")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Test local_anonymizer: phone numbers vs dates, times, years and amounts
+
+Run with: python -m pytest test_local_anonymizer.py
+"""
+
+import pytest
+
+from local_anonymizer import LocalAnonymizer
+
+
+def anonymize(text):
+    """
+    Anonymize with a new anonymizer (placeholders start from 1)
+    """
+    return LocalAnonymizer().anonymize(text)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # ISO dates and times
+        "2024-01-15 10:30",
+        "From 2023-01-01 to 2024-12-31",
+        "15/01/2024 10:30",
+        "on 15.01.2024, 10:30",
+        # runs of years
+        "Years 2023 2024 2025",
+        # amounts, also next to a number in parentheses
+        "Revenue (2023) 1.234.567 EUR",
+        "Revenue 123.456.789 EUR",
+        "Total 1,234,567,890",
+        # codes without phone-style groups
+        "Order 12345678901",
+        "ISBN 978-3-16-148410-0",
+    ],
+)
+def test_not_phone(text):
+    assert anonymize(text) == text
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Call +39 06 1234 5678 now", "Call [PHONE_1] now"),
+        ("Call 0039 333 1234567.", "Call [PHONE_1]."),
+        ("Call +1 (555) 123-4567", "Call [PHONE_1]"),
+        ("Tel +447911123456", "Tel [PHONE_1]"),
+        ("Tel (555) 123-4567", "Tel [PHONE_1]"),
+        ("Tel 333 1234567", "Tel [PHONE_1]"),
+        ("Tel 02-1234-5678", "Tel [PHONE_1]"),
+    ],
+)
+def test_phone(text, expected):
+    assert anonymize(text) == expected
+
+
+def test_phone_and_date_in_the_same_text():
+    text = "On 2024-01-15 10:30 call +39 06 1234 5678"
+
+    assert anonymize(text) == "On 2024-01-15 10:30 call [PHONE_1]"
@@ -2,15 +2,15 @@
 Test oci_rag_agent
 """
 
-import json
 from oci_rag_agent import OCIRAGAgent
+from oci_rag_stream import EndOfTurn, TextDelta
 
-from config_reader import ConfigReader
+from config_reader import get_config
 from config_private import AGENT_ID
 
 SHOULD_STREAM = False
 
-config_reader = ConfigReader("config.toml")
+config_reader = get_config("config.toml")
 
 ENDPOINT = config_reader.find_key("rag_endpoint")
 
@@ -22,11 +22,14 @@ def print_response(_response):
     if not SHOULD_STREAM:
         print(_response)
     else:
-        # manage streaming
-        for event in _response.data.events():
-            if "message" in json.loads(event.data):
-                # print(event.data)
-                print(json.loads(event.data)["message"]["content"]["text"])
+        # manage streaming: typed deltas
+        for delta in _response:
+            if isinstance(delta, TextDelta):
+                print(delta.text, end="", flush=True)
+            elif isinstance(delta, EndOfTurn):
+                print("")
+                for citation in delta.citations:
+                    print("Source: ", citation.url or citation.title)
 
 
 rag_client = OCIRAGAgent(AGENT_ID, ENDPOINT, should_stream=SHOULD_STREAM)
@@ -43,7 +46,10 @@ for question in questions:
     print("Question: ", question)
     print("")
 
-    response = rag_client.chat(sess_id, question)
+    if SHOULD_STREAM:
+        response = rag_client.stream_chat(sess_id, question)
+    else:
+        response = rag_client.chat(sess_id, question)
 
     print_response(response)
     print("")
@@ -0,0 +1,90 @@
+"""
+Test oci_rag_stream: the text of the answer from the streamed events
+
+Run with: python -m pytest test_oci_rag_stream.py
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from oci_rag_stream import EndOfTurn, TextDelta, aiter_chat_deltas, iter_chat_deltas
+
+
+def sse_bytes(texts):
+    """
+    The SSE stream (bytes) of events with the texts, split in small chunks
+    """
+    events = b"".join(
+        b"data: "
+        + json.dumps({"message": {"content": {"text": text}}}).encode("utf-8")
+        + b"\n\n"
+        for text in texts
+    )
+
+    return [events[i : i + 7] for i in range(0, len(events), 7)]
+
+
+def stream_text(texts, text_mode="delta"):
+    """
+    The text of the TextDeltas and of the EndOfTurn (must be the same)
+    """
+    deltas = list(iter_chat_deltas(sse_bytes(texts), text_mode))
+
+    assert isinstance(deltas[-1], EndOfTurn)
+
+    text = "".join(delta.text for delta in deltas if isinstance(delta, TextDelta))
+    assert text == deltas[-1].text
+
+    return text
+
+
+@pytest.mark.parametrize(
+    "texts, expected",
+    [
+        # a delta that starts with the text so far is not a cumulative text
+        (["I", "In", " the", " end"], "IIn the end"),
+        (["ab", "ab"], "abab"),
+        (["Hello", " world", "!"], "Hello world!"),
+    ],
+)
+def test_delta_is_the_default(texts, expected):
+    assert stream_text(texts) == expected
+
+
+def test_cumulative():
+    assert stream_text(["Hel", "Hello", "Hello world"], "cumulative") == "Hello world"
+
+
+def test_cumulative_not_extended_switches_to_delta():
+    texts = ["Hello", "Hello world", "!", " Bye"]
+
+    assert stream_text(texts, "cumulative") == "Hello world! Bye"
+
+
+def test_auto_ambiguous_prefix_keeps_the_text():
+    # guessed cumulative from "I", "In": the next deltas are not dropped
+    assert stream_text(["I", "In", " the", " end"], "auto") == "In the end"
+
+
+def test_auto_delta():
+    assert stream_text(["The", " end"], "auto") == "The end"
+
+
+def test_not_valid_text_mode():
+    with pytest.raises(ValueError):
+        list(iter_chat_deltas([], "incremental"))
+
+
+def test_async_same_text():
+    async def byte_chunks():
+        for chunk in sse_bytes(["I", "In", " the", " end"]):
+            yield chunk
+
+    async def collect():
+        return [delta async for delta in aiter_chat_deltas(byte_chunks())]
+
+    deltas = asyncio.run(collect())
+
+    assert deltas[-1].text == "IIn the end"
@@ -3,9 +3,9 @@ Test SelectAI SQL Agent
 """
 
 from select_ai_sql_agent import SelectAISQLAgent
-from config_reader import ConfigReader
+from config_reader import get_config
 
-config = ConfigReader("config.toml")
+config = get_config("config.toml")
 
 sql_agent = SelectAISQLAgent(config)
 
@@ -4,13 +4,17 @@ to enable tracing to APM
 """
 
 import requests
-from config_reader import ConfigReader
+from config_reader import get_config
+from span_recorder import SpanRecorder
 from utils import get_console_logger
 
 from config_private import APM_PUBLIC_KEY
 
 logger = get_console_logger()
 
+# the recorder used by local_transport, created on first use
+_span_recorder = None
+
 
 def http_transport(encoded_span):
     """
@@ -23,8 +27,8 @@ def http_transport(encoded_span):
         requests.Response or None: The response from the APM service or None if tracing is disabled.
     """
     try:
-        # Load config inside the function to avoid global dependency issues
-        config = ConfigReader("config.toml")
+        # shared config: the file is parsed only once in the process
+        config = get_config("config.toml")
 
         base_url = config.find_key("apm_base_url")
         content_type = config.find_key("apm_content_type")
@@ -59,3 +63,57 @@ def http_transport(encoded_span):
     except Exception as e:
         logger.error("Unexpected error in http_transport: %s", str(e))
         return None
+
+
+def get_span_recorder():
+    """
+    Return the (process-wide) recorder used by local_transport.
+
+    File and buffer size are read from config.toml
+    """
+    global _span_recorder
+
+    if _span_recorder is None:
+        config = get_config("config.toml")
+
+        _span_recorder = SpanRecorder(
+            file_path=config.find_key("spans_file"),
+            buffer_size=config.find_key("spans_buffer_size") or 10000,
+        )
+
+    return _span_recorder
+
+
+def local_transport(encoded_span):
+    """
+    Records tracing data locally (ring buffer + JSONL file), no APM needed.
+
+    Args:
+        encoded_span (bytes): The encoded span data to record.
+
+    Returns:
+        None
+    """
+    try:
+        # as for APM: if tracing is disabled, nothing is recorded
+        if not get_config("config.toml").find_key("enable_tracing"):
+            return None
+
+        get_span_recorder()(encoded_span)
+    except Exception as e:
+        logger.error("Unexpected error in local_transport: %s", str(e))
+
+
+def get_transport_handler():
+    """
+    Return the transport handler selected with tracing_backend in config.toml
+
+    Returns:
+        callable: http_transport (apm) or local_transport (local)
+    """
+    config = get_config("config.toml")
+
+    if config.find_key("tracing_backend") == "local":
+        return local_transport
+
+    return http_transport
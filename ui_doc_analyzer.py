@@ -1,30 +1,91 @@
 """
 UI for the Dc Analyzer
+
+Streamlit re-runs this script on every interaction: the compiled workflow is
+cached (st.cache_resource), text extraction is cached by file content
+(st.cache_data) and the analysis is kept in the session, keyed by the hash of
+the uploaded file, so it is computed only once for each file.
+
+With "Stream each section" every analysis is streamed in its own section,
+anonymized locally sentence by sentence, as soon as its tokens arrive; the
+LLM anonymization pass (if enabled) is done once per section at the end.
+With "Anonymize the document first" the text is anonymized once, before the
+analysis, and the output doesn't need another anonymization pass; the
+original names can be restored in the report (not with streamed sections).
 """
 
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
 import pdfplumber
-from doc_analyzer_backend import build_workflow
+from config_reader import get_config
+from doc_analyzer_backend import SECTIONS, build_workflow, format_header, format_section
+from notification_queue import hub
+from oci_anonymizer import IncrementalAnonymizer, OCIAnonymizer, create_local_anonymizer
+
 
+@st.cache_resource
+def get_workflow(anonymize_output=True, anonymize_source=False, restore_fields=()):
+    """Build the workflow (only once for the process)."""
+    return build_workflow(
+        anonymize_output=anonymize_output,
+        anonymize_source=anonymize_source,
+        restore_fields=restore_fields,
+    )
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from a PDF using pdfplumber."""
+
+@st.cache_data(max_entries=32)
+def extract_text_from_pdf(pdf_bytes):
+    """Extract text from a PDF (its content) using pdfplumber."""
     text = ""
-    with pdfplumber.open(pdf_file) as pdf:
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
         for page in pdf.pages:
             text += page.extract_text() + "\n\n"
     return text
 
 
-def stream_output(_iterator):
+def show_progress(channel, progress_placeholder, completed):
+    """
+    Show the nodes completed, reading the events of the run
+    """
+    events = channel.drain()
+
+    for event in events:
+        if event.kind == "node_finished":
+            completed.append(f"{event.node}: {event.elapsed_ms / 1000:.1f} sec.")
+
+    if events:
+        progress_placeholder.markdown("Completed: " + ", ".join(completed))
+
+
+def stream_output(_iterator, channel):
     """
     Utility to support streaming of output from last node
+
+    _iterator: stream with stream_mode=["messages", "updates"]. The tokens
+    of the anonymizer node are shown as they arrive; its final output is
+    used when there are no tokens (LLM pass disabled or skipped)
     """
-    # Placeholder for streaming output
+    # Placeholders for progress and streaming output
+    progress_placeholder = st.empty()
     output_placeholder = st.empty()
 
+    completed = []
     accumulated_response = ""
-    for message, metadata in _iterator:
+    final_output = None
+    for mode, payload in _iterator:
+        show_progress(channel, progress_placeholder, completed)
+
+        if mode == "updates":
+            node_output = payload.get("anonymizer")
+            if node_output and node_output.get("final_output"):
+                final_output = node_output["final_output"]
+            continue
+
+        message, metadata = payload
+
         # only the output from the final node
         if metadata.get("langgraph_node") == "anonymizer":
             # Append new content
@@ -32,34 +93,184 @@ def stream_output(_iterator):
             # Update the placeholder with the accumulated content
             output_placeholder.markdown(accumulated_response, unsafe_allow_html=True)
 
+    show_progress(channel, progress_placeholder, completed)
+
+    if final_output is not None and final_output != accumulated_response:
+        accumulated_response = final_output
+        output_placeholder.markdown(accumulated_response, unsafe_allow_html=True)
+
+    return accumulated_response
+
+
+def wait_output(_iterator, channel):
+    """
+    Show the progress and return the report when the workflow is completed
+
+    For the workflow without the anonymizer node (source anonymized):
+    the report is the combined_output of the aggregator (or of restore)
+    """
+    progress_placeholder = st.empty()
+
+    completed = []
+    analysis = ""
+    for update in _iterator:
+        show_progress(channel, progress_placeholder, completed)
+
+        for node_output in update.values():
+            if node_output and node_output.get("combined_output"):
+                analysis = node_output["combined_output"]
+
+    show_progress(channel, progress_placeholder, completed)
+    st.markdown(analysis, unsafe_allow_html=True)
+
+    return analysis
+
+
+def stream_sections(_iterator, channel, file_name, anonymize=True):
+    """
+    Stream every analysis in its own section, anonymized incrementally
+
+    The chunks streamed are anonymized locally (deterministic, in ms):
+    the LLM pass, if enabled, is done once per section at the end,
+    for all the sections in parallel.
+
+    anonymize: False if the source has already been anonymized
+    """
+    progress_placeholder = st.empty()
+    st.markdown(format_header(file_name))
+
+    # shared: the same entity gets the same placeholder in all the sections
+    local_anonymizer = create_local_anonymizer()
+    anonymize_fn = local_anonymizer.anonymize if anonymize else lambda text: text
+
+    placeholders = {}
+    anonymizers = {}
+    texts = {}
+    for node, title, _ in SECTIONS:
+        st.markdown(f"### {title}:")
+        placeholders[node] = st.empty()
+        anonymizers[node] = IncrementalAnonymizer(anonymize_fn)
+        texts[node] = ""
+
+    completed = []
+    for message, metadata in _iterator:
+        show_progress(channel, progress_placeholder, completed)
+
+        node = metadata.get("langgraph_node")
+
+        if node in anonymizers:
+            ready = anonymizers[node].feed(message.content)
+
+            if ready:
+                texts[node] += ready
+                placeholders[node].markdown(texts[node], unsafe_allow_html=True)
+
+    show_progress(channel, progress_placeholder, completed)
+
+    # the end of every section
+    for node, _, _ in SECTIONS:
+        texts[node] += anonymizers[node].flush()
+        placeholders[node].markdown(texts[node], unsafe_allow_html=True)
+
+    if anonymize and get_config("config.toml").find_key("anonymizer_use_llm"):
+        # the LLM pass for the residual entities: one call for each section
+        llm_anonymizer = OCIAnonymizer(use_llm=True, local_anonymizer=local_anonymizer)
+
+        with st.spinner("Anonymizing..."):
+            with ThreadPoolExecutor(max_workers=len(SECTIONS)) as executor:
+                results = executor.map(
+                    llm_anonymizer.anonymize, [texts[node] for node, _, _ in SECTIONS]
+                )
+
+                for (node, _, _), text in zip(SECTIONS, results):
+                    texts[node] = text
+                    placeholders[node].markdown(text, unsafe_allow_html=True)
+
+    analysis = format_header(file_name)
+    for node, title, _ in SECTIONS:
+        analysis += format_section(title, texts[node])
+
+    return analysis
+
 
 # Streamlit UI
 st.title("AI Document Analyzer")
 
+# analysis of the files processed in this session, by file hash
+if "analyses" not in st.session_state:
+    st.session_state.analyses = {}
+
 
 # Move file uploader to the sidebar
 with st.sidebar:
     st.header("Upload PDF File")
     uploaded_file = st.file_uploader("Choose a PDF file", type=["pdf"])
+    stream_each_section = st.toggle("Stream each section", value=False)
+    anonymize_first = st.toggle("Anonymize the document first", value=False)
+    # the streamed sections are shown as they arrive, before the restore node
+    restore_names = st.toggle(
+        "Restore the original names in the report",
+        value=False,
+        disabled=not anonymize_first or stream_each_section,
+        help="Only with the document anonymized first and sections not streamed",
+    )
+    restore_names = restore_names and anonymize_first and not stream_each_section
 
 # Process the uploaded file
 if uploaded_file is not None:
-    extracted_text = extract_text_from_pdf(uploaded_file)
+    file_bytes = uploaded_file.getvalue()
+    # the analysis depends on the file and on where it is anonymized
+    file_hash = hashlib.sha256(file_bytes).hexdigest()
+    analysis_key = (file_hash, anonymize_first, restore_names)
     f_name = uploaded_file.name
 
-    if extracted_text.strip():
+    extracted_text = extract_text_from_pdf(file_bytes)
+
+    if analysis_key in st.session_state.analyses:
+        # already processed: only re-render
+        st.markdown(st.session_state.analyses[analysis_key], unsafe_allow_html=True)
+
+    elif extracted_text.strip():
         # we have text to process
-        # instantiate the agent
-        workflow = build_workflow()
+        # the agent (compiled once)
+        # streaming sections: anonymization is done here, not in the workflow
+        # with the source anonymized, the output doesn't need the LLM pass
+        workflow = get_workflow(
+            anonymize_output=not (stream_each_section or anonymize_first),
+            anonymize_source=anonymize_first,
+            restore_fields=("combined_output",) if restore_names else (),
+        )
+
+        # a notification channel for this run (this session)
+        channel = hub.open_channel()
 
         # inputs to the agent
-        inputs = {"file_name": f_name, "file_text": extracted_text}
+        inputs = {
+            "file_name": f_name,
+            "file_text": extracted_text,
+            "run_id": channel.run_id,
+        }
 
         # invoke the agent
         st.info("Processing file..")
-        _iter = workflow.stream(inputs, stream_mode="messages")
+        try:
+            if stream_each_section:
+                _iter = workflow.stream(inputs, stream_mode="messages")
+                analysis = stream_sections(
+                    _iter, channel, f_name, anonymize=not anonymize_first
+                )
+            elif anonymize_first:
+                # no anonymizer node to stream: the report at the end
+                _iter = workflow.stream(inputs, stream_mode="updates")
+                analysis = wait_output(_iter, channel)
+            else:
+                _iter = workflow.stream(inputs, stream_mode=["messages", "updates"])
+                analysis = stream_output(_iter, channel)
 
-        stream_output(_iter)
+            if analysis:
+                st.session_state.analyses[analysis_key] = analysis
+        finally:
+            hub.close_channel(channel.run_id)
 
     else:
         st.warning(
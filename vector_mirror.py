@@ -0,0 +1,397 @@
+"""
+In-process mirror of a 23AI collection, for low-latency retrieval
+
+The embeddings of the collection are copied in a memory-mapped float32
+NumPy matrix (rows L2 normalized) with the arrays of the chunk ids and
+of the chunks (text, metadata). A top-k cosine query is a single matmul
+plus argpartition, without a round trip to the DB.
+
+Only for small and medium collections: above max_rows the mirror is not
+built and the search must be done in the DB (available is False).
+
+The mirror is refreshed when the collection changes: the signature
+(number of rows and max ORA_ROWSCN) is checked at most every
+refresh_interval seconds. With refresh_in_background the rebuild is done
+in a thread, while the search keeps using the current data.
+
+Metadata filters are checked on NumPy columns of the metadata, built
+when the mirror is loaded.
+
+Every build is written in its own directory (<collection>.<build id>) and
+published with an atomic replace of a pointer file
+(<collection>.current.json, with the build id and the signature): the
+readers, also in other processes, load a complete build or the previous
+one, never a mix. The builds older than the previous are removed.
+
+Usage:
+    mirror = VectorMirror("BOOKS", mirror_dir="vector_mirror")
+    mirror.refresh(connection)
+    if mirror.available:
+        docs_and_distances = mirror.search(query_vector, k=10)
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+
+from metadata_filter import filter_mask, metadata_columns
+from utils import get_console_logger
+
+logger = get_console_logger()
+
+SIGNATURE_SQL = "SELECT COUNT(*), MAX(ORA_ROWSCN) FROM {table}"
+
+CHUNKS_SQL = "SELECT RAWTOHEX(id), text, metadata, embedding FROM {table}"
+
+
+class VectorMirror:
+    """
+    Memory-mapped NumPy copy of the embeddings of a collection
+    """
+
+    def __init__(
+        self,
+        collection_name,
+        mirror_dir="vector_mirror",
+        max_rows=200000,
+        refresh_interval=60,
+    ):
+        """
+        collection_name (str): the table of the collection
+        mirror_dir (str): where the files of the mirror are saved
+        max_rows (int): above, the mirror is not built (search in the DB)
+        refresh_interval (float): min secs. between checks for changes
+        """
+        self.collection_name = collection_name
+        self.mirror_dir = mirror_dir
+        self.max_rows = max_rows
+        self.refresh_interval = refresh_interval
+
+        # (vectors, ids, chunks, metadata columns for the filters),
+        # replaced at once when the mirror is rebuilt
+        self.data = None
+        self.signature = None
+        self.last_check = 0.0
+        self.lock = threading.Lock()
+
+        self._load()
+
+    @property
+    def available(self):
+        """
+        True if the mirror can be used for the search
+        """
+        return self.data is not None
+
+    def _path(self, suffix):
+        return os.path.join(self.mirror_dir, f"{self.collection_name}.{suffix}")
+
+    def _build_path(self, build_id, file_name):
+        return os.path.join(self._path(build_id), file_name)
+
+    def _load(self):
+        """
+        Load the build published (if any)
+        """
+        try:
+            with open(self._path("current.json"), "r", encoding="utf-8") as f:
+                current = json.load(f)
+        except FileNotFoundError:
+            return
+
+        build_id = current["build"]
+
+        try:
+            with open(
+                self._build_path(build_id, "meta.json"), "r", encoding="utf-8"
+            ) as f:
+                meta = json.load(f)
+
+            # the build must be the one published (same collection version)
+            if meta["build"] != build_id or meta["signature"] != current["signature"]:
+                logger.warning(
+                    "Mirror %s: build %s doesn't match the pointer, not loaded",
+                    self.collection_name,
+                    build_id,
+                )
+                return
+
+            with open(
+                self._build_path(build_id, "chunks.json"), "r", encoding="utf-8"
+            ) as f:
+                chunks = json.load(f)
+
+            if meta["n_rows"] == 0:
+                vectors = np.zeros((0, meta["dim"]), dtype=np.float32)
+            else:
+                vectors = np.memmap(
+                    self._build_path(build_id, "vectors.f32"),
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(meta["n_rows"], meta["dim"]),
+                )
+
+            ids = np.load(self._build_path(build_id, "ids.npy"))
+        except FileNotFoundError:
+            # replaced and removed by another process meanwhile
+            logger.warning(
+                "Mirror %s: build %s removed, not loaded",
+                self.collection_name,
+                build_id,
+            )
+            return
+
+        columns = metadata_columns([metadata for _, metadata in chunks])
+
+        self.data = (vectors, ids, chunks, columns)
+        self.signature = meta["signature"]
+
+    def _get_signature(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(SIGNATURE_SQL.format(table=self.collection_name))
+            n_rows, max_scn = cursor.fetchone()
+
+        return [int(n_rows), int(max_scn or 0)]
+
+    def needs_refresh(self):
+        """
+        True if it's time to check the collection for changes
+        """
+        return time.time() - self.last_check >= self.refresh_interval
+
+    def refresh(self, connection, force=False):
+        """
+        Rebuild the mirror if the collection has changed
+
+        :return: True if the mirror has been rebuilt
+        """
+        if not force and not self.needs_refresh():
+            return False
+
+        with self.lock:
+            return self._refresh(connection, force)
+
+    def refresh_in_background(self, connect):
+        """
+        Rebuild the mirror, if the collection has changed, in a thread:
+        meanwhile the search uses the current data
+
+        connect: function returning a connection (a context manager)
+        :return: the thread, or None if not needed or already running
+        """
+        if not self.needs_refresh() or not self.lock.acquire(blocking=False):
+            return None
+
+        # the other requests don't start another refresh
+        self.last_check = time.time()
+
+        def run():
+            try:
+                with connect() as connection:
+                    self._refresh(connection, force=False)
+            except Exception as e:
+                logger.error("Refresh of mirror %s failed: %s", self.collection_name, e)
+            finally:
+                self.lock.release()
+
+        thread = threading.Thread(
+            target=run, name=f"mirror-{self.collection_name}", daemon=True
+        )
+        thread.start()
+
+        return thread
+
+    def _refresh(self, connection, force):
+        """
+        The refresh (the caller holds the lock)
+        """
+        self.last_check = time.time()
+        signature = self._get_signature(connection)
+
+        if not force and signature == self.signature:
+            return False
+
+        if signature[0] > self.max_rows:
+            logger.info(
+                "Collection %s has %d rows, no mirror (max %d)",
+                self.collection_name,
+                signature[0],
+                self.max_rows,
+            )
+            self.data, self.signature = None, signature
+            return False
+
+        self._build(connection, signature)
+
+        return True
+
+    def _build(self, connection, signature):
+        """
+        Copy the embeddings and the chunks of the collection in the files
+        """
+        start = time.perf_counter()
+
+        ids, chunks, vectors = [], [], []
+
+        with connection.cursor() as cursor:
+            cursor.arraysize = 1000
+            cursor.execute(CHUNKS_SQL.format(table=self.collection_name))
+
+            for chunk_id, text, metadata, embedding in cursor:
+                if hasattr(text, "read"):
+                    text = text.read()
+                if hasattr(metadata, "read"):
+                    metadata = metadata.read()
+                if isinstance(metadata, (str, bytes)):
+                    metadata = json.loads(metadata)
+
+                ids.append(chunk_id)
+                chunks.append([text, metadata or {}])
+                vectors.append(np.asarray(embedding, dtype=np.float32))
+
+        self.save(ids, chunks, vectors, signature)
+
+        logger.info(
+            "Mirror of %s built: %d rows in %.1f sec.",
+            self.collection_name,
+            len(ids),
+            time.perf_counter() - start,
+        )
+
+    def save(self, ids, chunks, vectors, signature=None):
+        """
+        Save the mirror (rows normalized) and load it
+
+        ids: list of chunk ids
+        chunks: list of [text, metadata]
+        vectors: list (or 2D array) of embeddings
+        """
+        # unique (also between processes) and in order of creation
+        build_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self._path(build_id))
+
+        if len(ids) > 0:
+            matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms > 0, norms, 1.0)
+
+        # the build is written in its own directory, not yet visible
+        matrix.tofile(self._build_path(build_id, "vectors.f32"))
+        np.save(self._build_path(build_id, "ids.npy"), np.asarray(ids, dtype=str))
+        with open(
+            self._build_path(build_id, "chunks.json"), "w", encoding="utf-8"
+        ) as f:
+            json.dump(chunks, f)
+        with open(self._build_path(build_id, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "build": build_id,
+                    "n_rows": len(ids),
+                    "dim": matrix.shape[1],
+                    "signature": signature,
+                },
+                f,
+            )
+
+        # published with a single atomic replace of the pointer
+        tmp_path = self._path(f"current.json.{build_id}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"build": build_id, "signature": signature}, f)
+        os.replace(tmp_path, self._path("current.json"))
+
+        self._load()
+        self._remove_old_builds(build_id)
+
+    def _remove_old_builds(self, build_id, keep=1):
+        """
+        Remove the builds before build_id, except the last keep
+        (a reader can be still loading the previous one)
+        """
+        prefix = f"{self.collection_name}."
+
+        def created(build):
+            return int(build.split("-")[0])
+
+        builds = sorted(
+            (
+                name[len(prefix) :]
+                for name in os.listdir(self.mirror_dir)
+                if name.startswith(prefix)
+                and os.path.isdir(os.path.join(self.mirror_dir, name))
+            ),
+            key=created,
+        )
+        old_builds = [build for build in builds if created(build) < created(build_id)]
+
+        for build in old_builds[: len(old_builds) - keep]:
+            # on Linux the files mapped by the readers stay valid
+            shutil.rmtree(self._path(build), ignore_errors=True)
+
+    def _top_k(self, data, query_vector, k, filters):
+        vectors, _, chunks, columns = data
+
+        if len(vectors) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+
+        similarities = vectors @ query_vector
+
+        if filters:
+            mask = filter_mask(columns, len(chunks), filters)
+            similarities = np.where(mask, similarities, -np.inf)
+
+        k = min(k, len(similarities))
+        best = np.argpartition(-similarities, k - 1)[:k]
+        best = best[np.argsort(-similarities[best])]
+        best = best[similarities[best] > -np.inf]
+
+        return best, similarities[best]
+
+    def search_ids(self, query_vector, k=10, filters=None):
+        """
+        Ids and cosine similarities of the k nearest chunks, nearest first
+        """
+        data = self.data
+
+        if data is None:
+            return [], []
+
+        positions, similarities = self._top_k(data, query_vector, k, filters)
+
+        return [str(chunk_id) for chunk_id in data[1][positions]], [
+            float(similarity) for similarity in similarities
+        ]
+
+    def search(self, query_vector, k=10, filters=None):
+        """
+        The k nearest chunks (cosine)
+
+        filters: on the metadata (see metadata_filter)
+        :return: list of (Document, cosine distance), nearest first
+        """
+        data = self.data
+
+        if data is None:
+            return []
+
+        positions, similarities = self._top_k(data, query_vector, k, filters)
+        chunks = data[2]
+
+        return [
+            (
+                Document(page_content=chunks[i][0], metadata=dict(chunks[i][1])),
+                1.0 - float(similarity),
+            )
+            for i, similarity in zip(positions, similarities)
+        ]